@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Search Backend Benchmark
+Compare the search backends on the same OCR text corpus
+
+Each backend builds an index of the text store with the same layout; the
+build time, index size and p50/p99 latency of a query set (run through
+SearchCore, snippets included) are reported side by side, together with how
+much of each backend's top 10 agrees with the first backend's.
+"""
+
+import os
+import sys
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+from ocr_processor import PDFOCRProcessor
+from index_store import IndexStore
+from search_backend import BACKENDS, get_backend
+from search_core import SearchCore
+from benchmark_index import dir_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERIES = [
+    "kennedy", "sirhan", "president", "investigation", "los angeles",
+    '"federal bureau"', '"senator kennedy"', "sirhan OR oswald", "kennedy AND california",
+    "president NOT kennedy", "attorn*", "wash*", "*ington", "bureau~2", "investigation~1 report",
+]
+
+
+def percentile(samples, percent):
+    """Return the nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build(backend_name, text_dir, work_dir, pages, slim):
+    """
+    Build an index of the text store with one backend
+
+    Returns:
+        tuple: (index root, documents indexed, build seconds, index bytes)
+    """
+    index_dir = os.path.join(work_dir, backend_name)
+    processor = PDFOCRProcessor(input_dir="downloads", output_dir=text_dir, index_dir=None)
+    processor.backend = get_backend(backend_name)
+    processor.index_pages = pages
+    processor.index_store_content = not slim
+    store = IndexStore(index_dir)
+    processor.index_store = store
+    documents = list(processor.iter_processed())  # Read text up front so only indexing is timed
+
+    staging_dir = store.stage(processor.backend, **processor.index_layout())
+    count, elapsed = processor.bulk_index(documents, index_dir=staging_dir)
+    store.publish(staging_dir)
+    return index_dir, count, elapsed, dir_size(staging_dir)
+
+
+def run_queries(core, queries, repeat):
+    """
+    Run every query `repeat` times after a warm-up round
+
+    Returns:
+        tuple: (list of latencies in ms, {query: top 10 filenames})
+    """
+    top = {}
+    for query in queries:  # Warm-up: opens the index, fills caches, builds trigram indexes
+        top[query] = [result["filename"] for result in core.search(query)["results"]]
+
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            core.search(query)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples, top
+
+
+def overlap(top, reference):
+    """Mean share of the reference top 10 also found in another top 10"""
+    shares = [len(set(top[query]) & set(hits)) / len(hits) for query, hits in reference.items() if hits]
+    return sum(shares) / len(shares) if shares else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare search backends on the same corpus")
+    parser.add_argument("--text-dir", default="ocr_text", help="OCR text corpus to index")
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS),
+                        help="Backend to compare (can be used multiple times; default: all)")
+    parser.add_argument("--index-pages", action="store_true", help="Index one document per page")
+    parser.add_argument("--slim-index", action="store_true", help="Don't store OCR text in the index")
+    parser.add_argument("--queries", help="File with one query per line (default: a built-in set)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds over the query set")
+    parser.add_argument("--keep", action="store_true", help="Keep the built indexes")
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    work_dir = tempfile.mkdtemp(prefix="backend_bench_")
+    results = []
+    try:
+        for name in args.backend or list(BACKENDS):
+            index_dir, count, elapsed, size = build(name, args.text_dir, work_dir, args.index_pages, args.slim_index)
+            core = SearchCore(index_dir, text_dir=args.text_dir)
+            samples, top = run_queries(core, queries, args.repeat)
+            results.append({
+                "backend": name,
+                "documents": count,
+                "seconds": elapsed,
+                "index_bytes": size,
+                "p50": percentile(samples, 50),
+                "p99": percentile(samples, 99),
+                "top": top,
+            })
+    finally:
+        if args.keep:
+            print(f"Indexes kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    layout = f"one document per {'page' if args.index_pages else 'PDF'}, {'slim' if args.slim_index else 'stored text'}"
+    print(f"{len(queries)} queries x {args.repeat} rounds, {layout}")
+    print(f"{'backend':<10}{'docs':>6}{'build s':>9}{'index MB':>10}{'p50 ms':>9}{'p99 ms':>9}{'top10 agree':>13}")
+    for r in results:
+        print(f"{r['backend']:<10}{r['documents']:>6}{r['seconds']:>9.2f}{r['index_bytes'] / 1e6:>10.2f}"
+              f"{r['p50']:>9.1f}{r['p99']:>9.1f}{overlap(r['top'], results[0]['top']):>12.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Fuzzy Search Benchmark
+Compare trigram-expanded fuzzy and wildcard queries with Whoosh's own
+
+For each query the terms and documents found through the trigram index are
+compared with those of Whoosh's FuzzyTerm / Wildcard (taken as the reference),
+as precision and recall, together with the time to find the terms and to run
+the whole search.
+"""
+
+import sys
+import time
+import argparse
+import logging
+from whoosh.query import FuzzyTerm, Wildcard
+from index_store import IndexStore
+from term_trigrams import TrigramIndex, expand_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORDS = [
+    "investigation", "bureau", "attorney", "federal", "president", "assassination",
+    "washington", "department", "government", "communist", "testimony", "commission",
+]
+DEFAULT_PATTERNS = ["*tion", "*ment*", "inv*ion", "*ss?ss*", "c?mm*", "*ington"]
+
+
+def precision_recall(found, reference):
+    """Return (precision, recall) of a result set against a reference set"""
+    found, reference = set(found), set(reference)
+    if not found:
+        return (1.0 if not reference else 0.0), (1.0 if not reference else 0.0)
+    hits = len(found & reference)
+    return hits / len(found), (hits / len(reference) if reference else 1.0)
+
+
+def term_texts(query, reader):
+    """Return the terms a multi-term query expands to, as strings"""
+    return {t.decode("utf-8") if isinstance(t, bytes) else t for t in query._btexts(reader)}
+
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return (best milliseconds, last result)"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(searcher, reference_query, lookup, repeat):
+    """
+    Run one query through Whoosh and through the trigram index
+
+    Returns:
+        dict: Term and document counts, precision/recall and timings
+    """
+    reader = searcher.reader()
+
+    whoosh_terms_ms, whoosh_terms = timed(lambda: term_texts(reference_query, reader), repeat)
+    whoosh_ms, whoosh_docs = timed(lambda: set(searcher.search(reference_query, limit=None).docs()), repeat)
+
+    trigram_terms_ms, expanded = timed(lambda: expand_query(reference_query, lookup), repeat)
+    trigram_terms = term_texts(expanded, reader)
+    trigram_ms, trigram_docs = timed(
+        lambda: set(searcher.search(expand_query(reference_query, lookup), limit=None).docs()), repeat)
+
+    term_p, term_r = precision_recall(trigram_terms, whoosh_terms)
+    doc_p, doc_r = precision_recall(trigram_docs, whoosh_docs)
+    return {
+        "query": str(reference_query.text) + (f"~{reference_query.maxdist}" if isinstance(reference_query, FuzzyTerm) else ""),
+        "terms": len(whoosh_terms),
+        "docs": len(whoosh_docs),
+        "term_precision": term_p, "term_recall": term_r,
+        "doc_precision": doc_p, "doc_recall": doc_r,
+        "whoosh_terms_ms": whoosh_terms_ms, "trigram_terms_ms": trigram_terms_ms,
+        "whoosh_ms": whoosh_ms, "trigram_ms": trigram_ms,
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'query':<18}{'terms':>7}{'docs':>6}{'term P/R':>12}{'doc P/R':>12}"
+          f"{'expand ms':>19}{'search ms':>19}")
+    print(f"{'':<55}{'whoosh':>10}{'trigram':>9}{'whoosh':>10}{'trigram':>9}")
+    for r in rows:
+        print(f"{r['query']:<18}{r['terms']:>7}{r['docs']:>6}"
+              f"{r['term_precision']:>6.2f}/{r['term_recall']:<5.2f}{r['doc_precision']:>6.2f}/{r['doc_recall']:<5.2f}"
+              f"{r['whoosh_terms_ms']:>10.1f}{r['trigram_terms_ms']:>9.1f}{r['whoosh_ms']:>10.1f}{r['trigram_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trigram-expanded fuzzy and wildcard search")
+    parser.add_argument("--index-dir", default="search_index", help="Search index to query")
+    parser.add_argument("--field", default="content", help="Field to search")
+    parser.add_argument("--word", action="append", help="Word for fuzzy queries (can be used multiple times)")
+    parser.add_argument("--pattern", action="append", help="Wildcard pattern (can be used multiple times)")
+    parser.add_argument("--maxdist", type=int, action="append", help="Edit distance (default: 1 and 2)")
+    parser.add_argument("--prefix", type=int, default=0, help="Prefix length that must match exactly")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query (best time is reported)")
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    store = IndexStore(args.index_dir)
+    if not store.exists():
+        print(f"No search index found in {args.index_dir}")
+        return 1
+
+    if store.backend().name != "whoosh":
+        print("The fuzzy search benchmark compares against Whoosh and needs a Whoosh index")
+        return 1
+
+    ix = store.open().ix
+    with ix.searcher() as searcher:
+        started = time.perf_counter()
+        index = TrigramIndex.from_reader(searcher.reader(), args.field)
+        build_ms = (time.perf_counter() - started) * 1000
+        print(f"Trigram index: {len(index)} terms, {len(index.postings)} trigrams, built in {build_ms:.0f} ms")
+
+        def lookup(fieldname):
+            return index if fieldname == args.field else None
+
+        for maxdist in args.maxdist or [1, 2]:
+            rows = [compare(searcher, FuzzyTerm(args.field, word, maxdist=maxdist, prefixlength=args.prefix),
+                            lookup, args.repeat)
+                    for word in args.word or DEFAULT_WORDS]
+            print_table(f"Fuzzy, maxdist={maxdist}, prefix={args.prefix}", rows)
+
+        rows = [compare(searcher, Wildcard(args.field, pattern), lookup, args.repeat)
+                for pattern in args.pattern or DEFAULT_PATTERNS]
+        print_table("Wildcard", rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
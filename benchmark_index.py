@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Index Benchmark
+Compare search index build strategies on an OCR text corpus
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+from whoosh.index import create_in, open_dir
+from ocr_processor import PDFOCRProcessor, schema
+
+logger = logging.getLogger(__name__)
+
+
+def dir_size(path):
+    """Total size of the files in a directory, in bytes"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+def build_loop(processor, documents):
+    """Original strategy: open the index and commit once per document"""
+    count = 0
+    for pdf_path, text in documents:
+        processor.index_document(pdf_path, text)
+        count += 1
+    return count
+
+
+def build_bulk(processor, documents):
+    """Single writer with a RAM buffer, batched commits and a final optimize"""
+    count, _ = processor.bulk_index(documents)
+    return count
+
+
+def build_parallel(processor, documents):
+    """Bulk build split across one indexing process per CPU, merged on commit"""
+    count, _ = processor.bulk_index(documents, procs=max(2, os.cpu_count() or 1))
+    return count
+
+
+def build_parallel_segments(processor, documents):
+    """Bulk build across one process per CPU, keeping per-process segments"""
+    count, _ = processor.bulk_index(documents, procs=max(2, os.cpu_count() or 1), keep_segments=True)
+    return count
+
+
+STRATEGIES = {
+    "loop": build_loop,
+    "bulk": build_bulk,
+    "parallel": build_parallel,
+    "segments": build_parallel_segments,
+}
+
+
+def run_strategy(name, text_dir, work_dir, repeat=1):
+    """
+    Build an index from scratch with one strategy
+
+    Returns:
+        dict: Timing and size figures for the best of `repeat` runs
+    """
+    best = None
+    for _ in range(repeat):
+        index_dir = os.path.join(work_dir, name)
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.makedirs(index_dir)
+        create_in(index_dir, schema)
+
+        processor = PDFOCRProcessor(input_dir="downloads", output_dir=text_dir, index_dir=index_dir)
+        documents = list(processor.iter_processed())  # Read text up front so only indexing is timed
+
+        started = time.perf_counter()
+        count = STRATEGIES[name](processor, documents)
+        elapsed = time.perf_counter() - started
+
+        ix = open_dir(index_dir)
+        result = {
+            "strategy": name,
+            "documents": count,
+            "seconds": elapsed,
+            "docs_per_sec": count / elapsed if elapsed else 0,
+            "index_bytes": dir_size(index_dir),
+            "segments": len(ix._segments()),
+        }
+        ix.close()
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search index build strategies")
+    parser.add_argument("--text-dir", default="ocr_text", help="OCR text corpus to index")
+    parser.add_argument("--strategy", action="append", choices=sorted(STRATEGIES),
+                        help="Strategy to run (can be used multiple times; default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per strategy (best time is reported)")
+    parser.add_argument("--keep", action="store_true", help="Keep the built indexes")
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix="index_bench_")
+    try:
+        results = [run_strategy(name, args.text_dir, work_dir, args.repeat)
+                   for name in (args.strategy or list(STRATEGIES))]
+    finally:
+        if args.keep:
+            print(f"Indexes kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]["seconds"]
+    print(f"{'strategy':<12}{'docs':>6}{'seconds':>10}{'docs/sec':>10}{'speedup':>9}{'index MB':>10}{'segments':>10}")
+    for r in results:
+        print(f"{r['strategy']:<12}{r['documents']:>6}{r['seconds']:>10.2f}{r['docs_per_sec']:>10.1f}"
+              f"{baseline / r['seconds']:>8.1f}x{r['index_bytes'] / 1e6:>10.2f}{r['segments']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
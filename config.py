@@ -3,6 +3,9 @@ Configuration file for PDF Downloader
 Define website configurations here for easy switching
 """
 
+# Each site can pick an OCR profile ("fast", "balanced" or "accurate") with the
+# "ocr_profile" key; see ocr_profiles.py for what each profile does.
+
 # Website configurations
 WEBSITE_CONFIGS = {
     "rfk": {
@@ -10,21 +13,24 @@ WEBSITE_CONFIGS = {
         "description": "Robert F. Kennedy Assassination Archives",
         "output_dir": "downloads/rfk",
         "depth": 3,
-        "delay": 1.0
+        "delay": 1.0,
+        "ocr_profile": "balanced"
     },
     "jfk": {
         "url": "https://www.archives.gov/research/jfk",
         "description": "JFK Assassination Records",
         "output_dir": "downloads/jfk",
         "depth": 3,
-        "delay": 1.0
+        "delay": 1.0,
+        "ocr_profile": "balanced"
     },
     "911": {
         "url": "https://www.archives.gov/research/9-11",
         "description": "9/11 Commission Records",
         "output_dir": "downloads/911",
         "depth": 3,
-        "delay": 1.0
+        "delay": 1.0,
+        "ocr_profile": "balanced"
     }
 }
 
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Document Metadata Module
+Parse the structured metadata encoded in document filenames
+
+The released files are named after what they contain, e.g.
+
+    166-12c-1_serial_2_62_hq_587_section_4-la-report_8.7.68-part_4_of_7
+    173-wfo-135_volume_1_sub_d-part_1_of_2
+    pol_6-2_us_kennedy_06_18_1968_senator_robert_f._kennedy-part_5_of_5
+
+parse_filename() pulls out the file number, serial, volume, section,
+part / part count and document date. They are indexed as typed, sortable
+fields next to the free-text title, so searches can be filtered and sorted
+by them with index lookups instead of text queries.
+
+Filters and sorting are written into the query (split off by split_filters()
+before the text is parsed):
+
+    file:166-12c-1            exact file number
+    section:4   part:1..3     numbers or inclusive ranges (serial, volume, section, part)
+    date:1968-06              a year, month or day ...
+    date:1968-06-05..1968-07  ... or an inclusive range, open on either side ("date:..1968")
+    sort:date  sort:-date  sort:file
+"""
+
+import re
+import sys
+import datetime
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the parsing rules change, so indexes built with older rules are rebuilt
+METADATA_VERSION = 1
+
+# Indexed metadata fields
+METADATA_FIELDS = ("file_number", "serial", "volume", "section", "part", "part_of", "doc_date")
+
+# FBI file numbers: classification-office-case ("166-12c-1", "173-wfo-135", "44-bh-1772");
+# State Department subject codes ("pol_6-2")
+FILE_NUMBER = re.compile(r"^(\d+-[a-z0-9]+-\d+|pol_\d+(?:-\d+)?)(?![a-z0-9])")
+NUMBERED = {
+    "serial": re.compile(r"(?:^|_)serial_(\d+)"),
+    "volume": re.compile(r"(?:^|_)volume_(\d+)"),
+    "section": re.compile(r"(?:^|_)section_(\d+)"),
+}
+PART = re.compile(r"part_(\d+)_of_(\d+)")
+
+MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+# "8.7.68" (month.day.year)
+DOTTED_DATE = re.compile(r"(?<![\d.])(\d{1,2})\.(\d{1,2})\.(\d{2}|\d{4})(?![\d.])")
+# "06_18_1968" (month_day_year)
+UNDERSCORE_DATE = re.compile(r"(?<!\d)(\d{2})_(\d{2})_(\d{4})(?!\d)")
+# "jan1970" (month and year only: the first of the month)
+MONTH_YEAR = re.compile(r"(?<![a-z])(" + "|".join(MONTHS) + r")[a-z]*_?(\d{4})(?!\d)")
+# Two-digit years below this are 20xx, the rest 19xx
+TWO_DIGIT_YEAR_PIVOT = 30
+
+FILTER_TOKEN = re.compile(r"(?<!\S)(file|serial|volume|section|part|date|sort):(\S+)", re.IGNORECASE)
+NUMBER_FIELDS = ("serial", "volume", "section", "part")
+FILTER_DATE = re.compile(r"^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$")
+SORT_ORDERS = ("date", "-date", "file")
+
+
+def make_date(year, month, day):
+    """Return a date as a YYYYMMDD integer, or None if it does not exist"""
+    if year < 100:
+        year += 2000 if year < TWO_DIGIT_YEAR_PIVOT else 1900
+    try:
+        value = datetime.date(year, month, day)
+    except ValueError:
+        return None
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def parse_date(name):
+    """Return the first document date found in a filename, as a YYYYMMDD integer"""
+    for pattern, order in ((DOTTED_DATE, "mdy"), (UNDERSCORE_DATE, "mdy"), (MONTH_YEAR, "my")):
+        for match in pattern.finditer(name):
+            if order == "mdy":
+                month, day, year = (int(group) for group in match.groups())
+            else:
+                month, day, year = MONTHS.index(match.group(1)) + 1, 1, int(match.group(2))
+            value = make_date(year, month, day)
+            if value is not None:
+                return value
+    return None
+
+
+def parse_filename(filename):
+    """
+    Parse the metadata encoded in a document filename
+
+    Args:
+        filename (str): PDF or text filename, with or without extension
+
+    Returns:
+        dict: METADATA_FIELDS, None where the filename does not say. Numbers
+        are ints; doc_date is a YYYYMMDD int.
+    """
+    name = re.sub(r"\.(pdf|txt(\.zst)?)$", "", filename.lower())
+    metadata = dict.fromkeys(METADATA_FIELDS)
+
+    match = FILE_NUMBER.match(name)
+    if match:
+        metadata["file_number"] = match.group(1)
+    for field, pattern in NUMBERED.items():
+        match = pattern.search(name)
+        if match:
+            metadata[field] = int(match.group(1))
+    match = PART.search(name)
+    if match:
+        metadata["part"], metadata["part_of"] = int(match.group(1)), int(match.group(2))
+    metadata["doc_date"] = parse_date(name)
+    return metadata
+
+
+def format_date(value):
+    """Format a YYYYMMDD integer as YYYY-MM-DD"""
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}" if value else None
+
+
+def date_bound(text, end=False):
+    """
+    Turn "1968", "1968-06" or "1968-06-05" into a YYYYMMDD integer
+
+    Args:
+        text (str): Year, month or day
+        end (bool): Return the last day covered instead of the first
+    """
+    match = FILTER_DATE.match(text)
+    if not match:
+        raise ValueError(f"Invalid date in filter: {text} (use YYYY, YYYY-MM or YYYY-MM-DD)")
+    year, month, day = (int(group) if group else None for group in match.groups())
+    if end:
+        # Month and day 31 sort after every real day, so they bound any month
+        return year * 10000 + (month or 12) * 100 + (day or 31)
+    return year * 10000 + (month or 1) * 100 + (day or 1)
+
+
+def parse_range(text, parse_low, parse_high):
+    """Parse "a", "a..b", "a.." or "..b" into an inclusive (low, high) pair"""
+    if ".." not in text:
+        return parse_low(text), parse_high(text)
+    low, high = text.split("..", 1)
+    return (parse_low(low) if low else None), (parse_high(high) if high else None)
+
+
+def split_filters(query_text):
+    """
+    Split metadata filters and the sort order off a query
+
+    Args:
+        query_text (str): Search query, possibly with file:, serial:, volume:,
+            section:, part:, date: and sort: terms
+
+    Returns:
+        tuple: (remaining query text, filters, sort order or None). Filters map
+        "file_number" to a file number and the numeric fields (doc_date for
+        "date:") to inclusive (low, high) bounds, either of which may be None.
+
+    Raises:
+        ValueError: If a filter value cannot be parsed
+    """
+    filters, sort = {}, None
+    for key, value in FILTER_TOKEN.findall(query_text):
+        key, value = key.lower(), value.lower()
+        if key == "file":
+            filters["file_number"] = value
+        elif key == "date":
+            filters["doc_date"] = parse_range(value, date_bound, lambda text: date_bound(text, end=True))
+        elif key == "sort":
+            if value not in SORT_ORDERS:
+                raise ValueError(f"Unknown sort order: {value} (use {', '.join(SORT_ORDERS)})")
+            sort = value
+        else:
+            try:
+                filters[key] = parse_range(value, int, int)
+            except ValueError:
+                raise ValueError(f"Invalid {key} filter: {value}")
+    return FILTER_TOKEN.sub("", query_text).strip(), filters, sort
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the metadata parsed from document filenames")
+    parser.add_argument("names", nargs="*", help="Filenames (default: every document in --text-dir)")
+    parser.add_argument("--text-dir", default="ocr_text", help="OCR text store")
+    parser.add_argument("--missing", choices=METADATA_FIELDS, help="Only list names without this field")
+
+    args = parser.parse_args()
+    names = args.names
+    if not names:
+        from text_store import TextStore
+        names = TextStore(args.text_dir).names()
+
+    for name in names:
+        metadata = parse_filename(name)
+        if args.missing and metadata[args.missing] is not None:
+            continue
+        metadata["doc_date"] = format_date(metadata["doc_date"])
+        fields = ", ".join(f"{key}={value}" for key, value in metadata.items() if value is not None)
+        print(f"{name}: {fields or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
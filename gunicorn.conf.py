@@ -0,0 +1,46 @@
+"""
+GovDocHarvester - Gunicorn Configuration
+Production server settings for web_app.py, read by gunicorn from the working directory
+
+The app is preloaded (GUNICORN_PRELOAD=0 turns it off): the master imports
+web_app once, which opens the search index, the PDF catalog and the PDF
+content hashes, then runs the warm-up queries (see web_app.warmup_queries),
+which build the trigram indexes of fuzzy and wildcard terms and load the
+Whoosh segments into memory. It then closes what workers must not share:
+database connections, and file handles (a Whoosh searcher reading
+memory-mapped segments has none and is kept, see
+search_backend.WhooshIndex.close_handles). gc.freeze() sets everything
+allocated so far aside from the garbage collector, whose full passes in the
+workers would otherwise write to (and so copy) the pages they share with
+the master, and the workers are forked.
+
+Each worker runs the warm-up queries again before accepting requests
+(post_worker_init), opening its own connections and reading the index
+through the shared searcher. This has to finish within gunicorn's worker
+timeout (30 seconds by default).
+
+Workers: WEB_CONCURRENCY (default 1); port: PORT (both read by gunicorn itself).
+"""
+
+import os
+import gc
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def when_ready(server):
+    """Warm up the preloaded app in the master, before the workers are forked"""
+    if not server.cfg.preload_app:
+        return
+    import web_app
+    web_app.warm_up()
+    # Workers must not share the master's file offsets and SQLite connections
+    web_app.search_app.close_handles()
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Warm up this worker before it takes requests"""
+    import web_app
+    web_app.warm_up()
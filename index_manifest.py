@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Index Manifest Module
+Track which OCR text documents are in the search index, and in which version
+
+The manifest is a JSON file kept inside the index directory. For every indexed
+document it records the indexed PDF path, the size and modification time of
+the text store file, and a hash of the text itself. Comparing it with the text
+store tells an incremental update exactly which documents to add, update or
+delete. Size and mtime are checked first, so only files that were touched are
+read and hashed. The hash is taken over the text rather than the file bytes,
+so compressing a .txt document into an .ocrz one does not cause a re-index.
+
+The manifest also records the settings the indexed text was prepared with
+(e.g. the text normalization rules), so a change of settings can trigger a
+rebuild.
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def text_hash(text):
+    """Return the content hash recorded for a document's text"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def file_signature(path):
+    """Return (size, mtime) of a file"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+class IndexManifest:
+    def __init__(self, index_dir):
+        """
+        Load the manifest of an index directory (empty if there is none)
+
+        Args:
+            index_dir (str): Search index directory
+        """
+        self.path = os.path.join(index_dir, MANIFEST_FILENAME)
+        self.entries = {}
+        self.settings = {}
+        self.exists = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data["documents"]
+                    self.settings = data.get("settings", {})
+                    self.exists = True
+                else:
+                    logger.warning(f"Ignoring index manifest with unknown version: {self.path}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable index manifest {self.path}: {e}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, name, pdf_path, file_path, text):
+        """
+        Record the indexed version of a document
+
+        Args:
+            name (str): Text store document name
+            pdf_path (str): PDF path stored in the index
+            file_path (str): Text store file the text was read from
+            text (str): Indexed text
+        """
+        size, mtime = file_signature(file_path)
+        self.entries[name] = {
+            "path": pdf_path,
+            "size": size,
+            "mtime": mtime,
+            "hash": text_hash(text),
+        }
+
+    def forget(self, name):
+        self.entries.pop(name, None)
+
+    def unchanged(self, name, file_path):
+        """True if a document's file has the size and mtime it had when it was indexed"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+        try:
+            return (entry["size"], entry["mtime"]) == file_signature(file_path)
+        except OSError:
+            return False
+
+    def save(self):
+        """Write the manifest atomically"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "documents": self.entries}, f)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Index Store Module
+Versioned search index directories with atomic publishing
+
+Full rebuilds are written into a fresh directory under "generations/" and only
+become visible once a one-line CURRENT file in the index root is replaced to
+point at them (os.replace, atomic on every platform, no symlink privileges
+needed on Windows). Searchers keep using the generation they opened until they
+notice CURRENT has changed, so a rebuild never exposes a missing or half-built
+index:
+
+    search_index/
+        CURRENT                 "gen-20240101-120000-1a2b"
+        generations/
+            gen-20240101-120000-1a2b/   index files + manifest.json
+            gen-20231231-090000-3c4d/   previous generation, removed later
+
+An index root without a CURRENT file is read as a single, unversioned index
+(the layout used before generations were introduced).
+
+Each generation holds the files of one search backend (see search_backend.py),
+recognized when it is opened.
+"""
+
+import os
+import time
+import shutil
+import logging
+from search_backend import detect_backend
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+GENERATIONS_DIRNAME = "generations"
+
+# Generations kept after publishing, including the new one, so searchers that
+# have not refreshed yet can finish on the previous index
+KEEP_GENERATIONS = 2
+
+
+class IndexStore:
+    def __init__(self, root="search_index"):
+        """
+        Args:
+            root (str): Index root directory
+        """
+        self.root = root
+        self.generations_dir = os.path.join(root, GENERATIONS_DIRNAME)
+        self.current_file = os.path.join(root, CURRENT_FILENAME)
+
+    def current_generation(self):
+        """Return the name of the published generation, or None for an unversioned root"""
+        try:
+            with open(self.current_file, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_dir(self):
+        """Return the directory of the index searchers should use"""
+        generation = self.current_generation()
+        if generation is None:
+            return self.root
+        return os.path.join(self.generations_dir, generation)
+
+    def backend(self):
+        """Return the search backend of the published index"""
+        return detect_backend(self.current_dir())
+
+    def exists(self):
+        """True if a searchable index has been published"""
+        directory = self.current_dir()
+        return os.path.isdir(directory) and detect_backend(directory).exists(directory)
+
+    def open(self, **options):
+        """Open the published index for searching (options go to the backend's open())"""
+        directory = self.current_dir()
+        return detect_backend(directory).open(directory, **options)
+
+    def ensure(self, backend, **layout):
+        """Create and publish an empty index if there is none yet"""
+        if not self.exists():
+            path = self.stage(backend, **layout)
+            self.publish(path)
+
+    def stage(self, backend, **layout):
+        """
+        Create an empty index in a new, unpublished generation directory
+
+        Args:
+            backend (search_backend.SearchBackend): Backend of the new index
+            **layout: pages and store_content, passed to backend.create()
+
+        Returns:
+            str: Path of the staging directory
+        """
+        name = f"gen-{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}"
+        path = os.path.join(self.generations_dir, name)
+        os.makedirs(path)
+        backend.create(path, **layout)
+        return path
+
+    def publish(self, path):
+        """
+        Atomically make a staged generation the current index
+
+        Args:
+            path (str): Directory returned by stage()
+        """
+        name = os.path.basename(os.path.normpath(path))
+        temp_file = self.current_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(name + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.current_file)
+        logger.info(f"Published search index generation {name}")
+        self.cleanup()
+
+    def discard(self, path):
+        """Remove a staged generation that will not be published"""
+        shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup(self, keep=KEEP_GENERATIONS):
+        """
+        Remove old generations and any unversioned index left in the root
+
+        Files still held open by a searcher (e.g. on Windows) are skipped and
+        retried on the next publish.
+        """
+        current = self.current_generation()
+        if current is None:
+            return
+
+        if os.path.isdir(self.generations_dir):
+            names = sorted((n for n in os.listdir(self.generations_dir) if n != current), reverse=True)
+            for name in names[max(keep - 1, 0):]:
+                shutil.rmtree(os.path.join(self.generations_dir, name), ignore_errors=True)
+
+        # Files of an index built before generations were used
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isfile(path) and (name.startswith(("_MAIN_", "MAIN_")) or name == "manifest.json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class LiveIndex:
+    def __init__(self, root="search_index", **options):
+        """
+        Keep the published index open and switch to a new generation once it appears
+
+        Checking for a new generation costs one stat() of the CURRENT file, so
+        it is done on every request.
+
+        Args:
+            root (str): Index root directory
+            **options: Passed to the backend's open() (e.g. trigrams)
+        """
+        self.store = IndexStore(root)
+        self.options = options
+        self.index = None
+        self.directory = None
+        self._signature = None
+
+    def _current_signature(self):
+        try:
+            stat = os.stat(self.store.current_file)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def get(self):
+        """Return the current index, reopening it if a new generation was published (None if missing)"""
+        signature = self._current_signature()
+        if self.index is not None and signature == self._signature:
+            return self.index
+
+        directory = self.store.current_dir()
+        if self.index is not None and directory == self.directory:
+            self._signature = signature
+            return self.index
+
+        try:
+            backend = detect_backend(directory)
+            if not backend.exists(directory):
+                logger.error(f"No search index found in {directory}")
+                return self.index
+            self.index = backend.open(directory, **self.options)
+        except Exception as e:
+            logger.error(f"Failed to open search index in {directory}: {e}")
+            return self.index
+
+        if self.directory is not None:
+            logger.info(f"Switched to new search index generation in {directory}")
+        else:
+            logger.info(f"Search index opened from {directory} ({backend.name})")
+        self.directory = directory
+        self._signature = signature
+        return self.index
@@ -0,0 +1,726 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Distributed OCR Module
+Coordinator and pull workers for spreading OCR across several machines
+
+The coordinator keeps a job ledger (SQLite) of documents or page ranges and
+serves them over a small HTTP/JSON protocol:
+
+    POST /lease       {"worker": id}                      -> {"job": {...} | null, "finished": bool}
+    POST /heartbeat   {"job_id": n, "lease": token}       -> {"ok": true}  (409 if the lease was lost)
+    POST /complete    {"job_id", "lease", "text", "boxes"} -> {"ok": true}
+    POST /fail        {"job_id", "lease", "error"}         -> {"ok": true}
+    GET  /pdf/<id>    PDF bytes for a job
+    GET  /status      job counts
+
+Workers pull jobs, download the PDF, OCR the page range and post the text back;
+the coordinator writes finished documents to its ocr_text directory and
+updates the search index once the ledger is drained. Leases expire if a worker
+stops heartbeating, and the job goes back on the queue.
+
+Run everything on one box with:
+    python ocr_cluster.py coordinator --site rfk --local-workers 3
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import socket
+import shutil
+import sqlite3
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import WEBSITE_CONFIGS
+from ocr_processor import PDFOCRProcessor, DEFAULT_WORKERS, MAX_MEMORY, WORD_BOXES
+from ocr_profiles import OCR_PROFILES, DEFAULT_OCR_PROFILE
+from word_boxes import sidecar_path, read_page_records, write_word_boxes
+
+logger = logging.getLogger(__name__)
+
+# Seconds a leased job stays assigned without a heartbeat
+DEFAULT_LEASE_SECONDS = 120
+# How many times a job is handed out before it is marked failed
+DEFAULT_MAX_ATTEMPTS = 3
+# Pages per job; 0 hands out whole documents
+DEFAULT_PAGES_PER_JOB = 0
+DEFAULT_PORT = 8765
+# Seconds a terminated local worker gets to exit before it is killed
+WORKER_STOP_SECONDS = 10
+
+
+class JobLedger:
+    def __init__(self, db_path):
+        """
+        Persistent job ledger shared by the coordinator's request threads
+
+        Args:
+            db_path (str): SQLite database file
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.claimed = set()  # Documents being written out (see claim())
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    pdf_path TEXT NOT NULL,
+                    first_page INTEGER NOT NULL,
+                    last_page INTEGER,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    text TEXT,
+                    boxes BLOB,
+                    error TEXT,
+                    UNIQUE (pdf_path, first_page)
+                )
+            """)
+
+    def add(self, pdf_path, first_page=1, last_page=None):
+        """Queue a document or page range (ignored if already in the ledger)"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (pdf_path, first_page, last_page) VALUES (?, ?, ?)",
+                (pdf_path, first_page, last_page))
+
+    def requeue_expired(self, max_attempts):
+        """
+        Put jobs whose lease has expired back on the queue, or fail them
+
+        Returns:
+            list: PDF paths of the documents that had a job failed
+        """
+        now = time.time()
+        failed = []
+        with self.lock, self.conn:
+            expired = self.conn.execute(
+                "SELECT id, pdf_path, worker, attempts FROM jobs WHERE status = 'leased' AND lease_expires < ?",
+                (now,)).fetchall()
+            for job in expired:
+                status = 'failed' if job["attempts"] >= max_attempts else 'pending'
+                logger.warning(f"Lease expired for job {job['id']} ({os.path.basename(job['pdf_path'])}) "
+                               f"on worker {job['worker']}, marking {status}")
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, lease = NULL, lease_expires = NULL, "
+                    "error = 'lease expired' WHERE id = ?", (status, job["id"]))
+                if status == 'failed':
+                    failed.append(job["pdf_path"])
+        return failed
+
+    def lease(self, worker, lease_seconds):
+        """
+        Hand the next pending job to a worker
+
+        Returns:
+            dict: The job row plus its lease token, or None if nothing is pending
+        """
+        token = uuid.uuid4().hex
+        with self.lock, self.conn:
+            job = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if job is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, token, time.time() + lease_seconds, job["id"]))
+        return {
+            "job_id": job["id"],
+            "lease": token,
+            "filename": os.path.basename(job["pdf_path"]),
+            "first_page": job["first_page"],
+            "last_page": job["last_page"],
+            "lease_seconds": lease_seconds,
+        }
+
+    def _check_lease(self, job_id, token):
+        job = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None or job["status"] != 'leased' or job["lease"] != token:
+            return None
+        return job
+
+    def heartbeat(self, job_id, token, lease_seconds):
+        """Extend a lease; returns False if the worker no longer holds it"""
+        with self.lock, self.conn:
+            if self._check_lease(job_id, token) is None:
+                return False
+            self.conn.execute("UPDATE jobs SET lease_expires = ? WHERE id = ?",
+                              (time.time() + lease_seconds, job_id))
+            return True
+
+    def complete(self, job_id, token, text, boxes=None):
+        """Store a finished job's result; returns the PDF path or None if the lease was lost"""
+        with self.lock, self.conn:
+            job = self._check_lease(job_id, token)
+            if job is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'done', text = ?, boxes = ?, lease = NULL, lease_expires = NULL "
+                "WHERE id = ?", (text, boxes, job_id))
+            return job["pdf_path"]
+
+    def fail(self, job_id, token, error, max_attempts):
+        """Record a worker-reported failure, re-queueing the job if it has attempts left"""
+        with self.lock, self.conn:
+            job = self._check_lease(job_id, token)
+            if job is None:
+                return None
+            status = 'failed' if job["attempts"] >= max_attempts else 'pending'
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease = NULL, lease_expires = NULL, error = ? "
+                "WHERE id = ?", (status, error, job_id))
+            return job["pdf_path"]
+
+    def pdf_path(self, job_id):
+        """Return the PDF path of a job"""
+        with self.lock:
+            job = self.conn.execute("SELECT pdf_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return job["pdf_path"] if job else None
+
+    def claim(self, pdf_path):
+        """
+        Take a document whose jobs have all ended, so only one thread writes it out
+
+        Returns:
+            tuple: ("done", jobs in page order) if every job is done, ("failed",
+            jobs) if one failed and none is pending or leased, or None if jobs
+            are still running or another thread already claimed the document
+        """
+        with self.lock:
+            if pdf_path in self.claimed:
+                return None
+            jobs = self.conn.execute(
+                "SELECT * FROM jobs WHERE pdf_path = ? ORDER BY first_page", (pdf_path,)).fetchall()
+            statuses = {job["status"] for job in jobs}
+            if not jobs or statuses & {"pending", "leased"}:
+                return None
+            self.claimed.add(pdf_path)
+            return ("done" if statuses == {"done"} else "failed"), jobs
+
+    def forget(self, pdf_path):
+        """Drop a document's jobs once its result has been written out"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM jobs WHERE pdf_path = ?", (pdf_path,))
+            self.claimed.discard(pdf_path)
+
+    def counts(self):
+        """Return the number of jobs in each status"""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class OCRCoordinator:
+    def __init__(self, processor, ledger_path=None, pages_per_job=DEFAULT_PAGES_PER_JOB,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS, token=None):
+        """
+        Hand out OCR jobs to remote workers and collect their results
+
+        Args:
+            processor (PDFOCRProcessor): Processor that owns ocr_text, the progress file and the index
+            ledger_path (str): SQLite job ledger (default: <output_dir>/.ocr_jobs.db)
+            pages_per_job (int): Split documents into page ranges of this size (0 = whole documents)
+            lease_seconds (int): Lease length; workers heartbeat well before it runs out
+            max_attempts (int): Times a job is handed out before it is marked failed
+            token (str): Shared secret workers must send in the X-Cluster-Token header
+        """
+        self.processor = processor
+        self.pages_per_job = pages_per_job
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.token = token
+        self.ledger = JobLedger(ledger_path or os.path.join(processor.output_dir, ".ocr_jobs.db"))
+        self.finished = threading.Event()
+        # Request threads finish different documents at once; the progress file is written whole
+        self.progress_lock = threading.Lock()
+        self.server = None
+
+    def queue_documents(self):
+        """Add every unprocessed PDF in the input directory to the ledger"""
+        queued = 0
+        for pdf_path in self.processor.find_unprocessed():
+            if self.pages_per_job:
+                try:
+                    num_pages = self.processor.get_page_count(pdf_path)
+                except Exception as e:
+                    logger.error(f"Could not read page count of {pdf_path}, queueing it whole: {e}")
+                    num_pages = None
+                if num_pages:
+                    for first in range(1, num_pages + 1, self.pages_per_job):
+                        self.ledger.add(pdf_path, first, min(first + self.pages_per_job - 1, num_pages))
+                    queued += 1
+                    continue
+            self.ledger.add(pdf_path)
+            queued += 1
+        logger.info(f"Queued {queued} documents, ledger now holds {self.ledger.counts()}")
+
+    def job_settings(self):
+        """OCR settings sent to workers with every job"""
+        return {
+            "profile": self.processor.profile["name"],
+            "word_boxes": self.processor.word_boxes,
+        }
+
+    def requeue_expired(self):
+        """Re-queue jobs with expired leases, giving up on documents whose job ran out of attempts"""
+        for pdf_path in self.ledger.requeue_expired(self.max_attempts):
+            self._finish_document(pdf_path)
+
+    def lease(self, worker):
+        """Lease the next job to a worker"""
+        self.requeue_expired()
+        job = self.ledger.lease(worker, self.lease_seconds)
+        if job is None:
+            counts = self.ledger.counts()
+            if not counts.get("pending") and not counts.get("leased"):
+                self.finished.set()
+            return None
+        job.update(self.job_settings())
+        logger.info(f"Leased job {job['job_id']} ({job['filename']} pages {job['first_page']}-"
+                    f"{job['last_page'] or 'end'}) to {worker}")
+        return job
+
+    def complete(self, job_id, token, text, boxes=None):
+        """Store a job result and write out its document if every range is done"""
+        pdf_path = self.ledger.complete(job_id, token, text, boxes)
+        if pdf_path is None:
+            return False
+        self._finish_document(pdf_path)
+        return True
+
+    def fail(self, job_id, token, error):
+        """Record a failed job"""
+        pdf_path = self.ledger.fail(job_id, token, error, self.max_attempts)
+        if pdf_path is None:
+            return False
+        logger.error(f"Job {job_id} ({os.path.basename(pdf_path)}) failed: {error}")
+        self._finish_document(pdf_path)
+        return True
+
+    def _finish_document(self, pdf_path):
+        """Assemble a document once all of its jobs are done (or give up if one failed)"""
+        claimed = self.ledger.claim(pdf_path)
+        if claimed is None:
+            return
+        outcome, jobs = claimed
+
+        if outcome == "failed":
+            with self.progress_lock:
+                self.processor.error_files.append(pdf_path)
+                self.processor.save_progress()
+            self.ledger.forget(pdf_path)
+            return
+
+        text_path = self.processor.text_path_for(pdf_path)
+        if any(job["boxes"] for job in jobs):
+            pages = []
+            for job in jobs:
+                if job["boxes"]:
+                    with tempfile.NamedTemporaryFile(suffix=".boxes", delete=False) as f:
+                        f.write(job["boxes"])
+                    try:
+                        pages.extend(read_page_records(f.name))
+                    finally:
+                        os.unlink(f.name)
+            write_word_boxes(sidecar_path(text_path), pages)
+
+        self.processor.text_store.write(self.processor.doc_name(pdf_path), "".join(job["text"] for job in jobs))
+
+        with self.progress_lock:
+            self.processor.processed_files.append(pdf_path)
+            self.processor.save_progress()
+        self.ledger.forget(pdf_path)
+        logger.info(f"Saved OCR text for {os.path.basename(pdf_path)} from {len(jobs)} job(s)")
+
+    def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Start the HTTP server in a background thread"""
+        handler = type("CoordinatorHandler", (CoordinatorHandler,), {"coordinator": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        logger.info(f"OCR coordinator listening on http://{host}:{self.server.server_port}")
+        return self.server.server_port
+
+    def wait(self, poll_interval=5):
+        """Block until the ledger is drained, re-queueing expired leases as we go"""
+        while not self.finished.is_set():
+            self.requeue_expired()
+            counts = self.ledger.counts()
+            if not counts.get("pending") and not counts.get("leased"):
+                self.finished.set()
+                break
+            self.finished.wait(poll_interval)
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        self.ledger.close()
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    coordinator = None
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.coordinator.token
+        if token and self.headers.get("X-Cluster-Token") != token:
+            self._send_json({"error": "unauthorized"}, 403)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/status":
+            self._send_json({"jobs": self.coordinator.ledger.counts(),
+                             "finished": self.coordinator.finished.is_set()})
+        elif self.path.startswith("/pdf/"):
+            try:
+                pdf_path = self.coordinator.ledger.pdf_path(int(self.path[len("/pdf/"):]))
+            except ValueError:
+                pdf_path = None
+            if not pdf_path or not os.path.exists(pdf_path):
+                self._send_json({"error": "not found"}, 404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(os.path.getsize(pdf_path)))
+            self.end_headers()
+            with open(pdf_path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+
+        coordinator = self.coordinator
+        try:
+            if self.path == "/lease":
+                job = coordinator.lease(request.get("worker", self.address_string()))
+                self._send_json({"job": job, "finished": coordinator.finished.is_set()})
+            elif self.path == "/heartbeat":
+                ok = coordinator.ledger.heartbeat(request["job_id"], request["lease"], coordinator.lease_seconds)
+                self._send_json({"ok": ok}, 200 if ok else 409)
+            elif self.path == "/complete":
+                boxes = base64.b64decode(request["boxes"]) if request.get("boxes") else None
+                ok = coordinator.complete(request["job_id"], request["lease"], request["text"], boxes)
+                self._send_json({"ok": ok}, 200 if ok else 409)
+            elif self.path == "/fail":
+                ok = coordinator.fail(request["job_id"], request["lease"], request.get("error", "unknown error"))
+                self._send_json({"ok": ok}, 200 if ok else 409)
+            else:
+                self._send_json({"error": "not found"}, 404)
+        except KeyError as e:
+            self._send_json({"error": f"missing field {e}"}, 400)
+        except Exception as e:
+            logger.error(f"Coordinator error handling {self.path}: {e}")
+            self._send_json({"error": str(e)}, 500)
+
+
+class OCRWorker:
+    def __init__(self, coordinator_url, worker_id=None, token=None, scratch_dir=None,
+                 max_memory_percent=MAX_MEMORY, poll_interval=5, exit_when_finished=True):
+        """
+        Pull OCR jobs from a coordinator until it runs out of work
+
+        Args:
+            coordinator_url (str): Base URL of the coordinator, e.g. http://host:8765
+            worker_id (str): Name reported to the coordinator (default: host-pid)
+            token (str): Shared secret matching the coordinator's --token
+            scratch_dir (str): Where downloaded PDFs are kept while they are OCR'd
+            max_memory_percent (int): Memory limit passed to the OCR processor
+            poll_interval (float): Seconds to wait when no job is available
+            exit_when_finished (bool): Stop once the coordinator reports the ledger is drained
+        """
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.token = token
+        self.owns_scratch = scratch_dir is None
+        self.scratch_dir = scratch_dir or tempfile.mkdtemp(prefix="ocr_worker_")
+        self.max_memory_percent = max_memory_percent
+        self.poll_interval = poll_interval
+        self.exit_when_finished = exit_when_finished
+        self.processors = {}
+
+    def _request(self, path, payload=None, timeout=60):
+        """POST a JSON payload (or GET when payload is None) and decode the JSON reply"""
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.coordinator_url + path, data=data)
+        request.add_header("Content-Type", "application/json")
+        if self.token:
+            request.add_header("X-Cluster-Token", self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                return {"ok": False}
+            raise
+
+    def _download(self, job):
+        """Fetch a job's PDF into the scratch directory"""
+        pdf_path = os.path.join(self.scratch_dir, job["filename"])
+        request = urllib.request.Request(f"{self.coordinator_url}/pdf/{job['job_id']}")
+        if self.token:
+            request.add_header("X-Cluster-Token", self.token)
+        with urllib.request.urlopen(request, timeout=300) as response, open(pdf_path, "wb") as f:
+            shutil.copyfileobj(response, f)
+        return pdf_path
+
+    def _processor(self, job):
+        """Return an OCR-only processor matching the job's settings"""
+        key = (job["profile"], job["word_boxes"])
+        if key not in self.processors:
+            self.processors[key] = PDFOCRProcessor(
+                input_dir=self.scratch_dir,
+                output_dir=self.scratch_dir,
+                index_dir=None,
+                num_workers=1,
+                max_memory_percent=self.max_memory_percent,
+                profile=job["profile"],
+                word_boxes=job["word_boxes"])
+        return self.processors[key]
+
+    def _heartbeat(self, job, stop):
+        """Keep a lease alive until stop is set"""
+        interval = max(job["lease_seconds"] / 3.0, 1)
+        while not stop.wait(interval):
+            try:
+                reply = self._request("/heartbeat", {"job_id": job["job_id"], "lease": job["lease"]})
+                if not reply.get("ok"):
+                    logger.warning(f"Lost lease on job {job['job_id']}, result will be discarded")
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job['job_id']} failed: {e}")
+
+    def run_job(self, job):
+        """Download, OCR and report one job"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        heartbeat.start()
+        pdf_path = None
+        try:
+            pdf_path = self._download(job)
+            processor = self._processor(job)
+            text, page_boxes = processor.extract_text(pdf_path, job["first_page"], job["last_page"])
+
+            boxes = None
+            if page_boxes is not None:
+                boxes_path = sidecar_path(pdf_path)
+                write_word_boxes(boxes_path, page_boxes)
+                with open(boxes_path, "rb") as f:
+                    boxes = base64.b64encode(f.read()).decode("ascii")
+                os.remove(boxes_path)
+
+            stop.set()
+            self._request("/complete", {"job_id": job["job_id"], "lease": job["lease"],
+                                        "text": text, "boxes": boxes}, timeout=300)
+        except Exception as e:
+            stop.set()
+            logger.error(f"Job {job['job_id']} failed: {e}")
+            try:
+                self._request("/fail", {"job_id": job["job_id"], "lease": job["lease"], "error": str(e)})
+            except Exception as report_error:
+                # The lease expires and the coordinator re-queues the job
+                logger.error(f"Could not report the failure of job {job['job_id']}: {report_error}")
+        finally:
+            stop.set()
+            if pdf_path and os.path.exists(pdf_path):
+                os.remove(pdf_path)
+
+    def run(self):
+        """Lease and process jobs until the coordinator has no more work"""
+        logger.info(f"OCR worker {self.worker_id} pulling jobs from {self.coordinator_url}")
+        while True:
+            try:
+                reply = self._request("/lease", {"worker": self.worker_id})
+            except Exception as e:
+                logger.warning(f"Coordinator unreachable ({e}), retrying in {self.poll_interval}s")
+                time.sleep(self.poll_interval)
+                continue
+
+            job = reply.get("job")
+            if job:
+                self.run_job(job)
+            elif reply.get("finished") and self.exit_when_finished:
+                logger.info(f"Coordinator has no more work, worker {self.worker_id} exiting")
+                if self.owns_scratch:
+                    shutil.rmtree(self.scratch_dir, ignore_errors=True)
+                return
+            else:
+                time.sleep(self.poll_interval)
+
+
+def start_local_workers(count, coordinator_url, token=None):
+    """Start worker processes on this machine (for single-box runs and testing)"""
+    workers = []
+    for i in range(count):
+        cmd = [sys.executable, os.path.abspath(__file__), "worker",
+               "--coordinator", coordinator_url, "--id", f"local-{i + 1}"]
+        if token:
+            cmd += ["--token", token]
+        workers.append(subprocess.Popen(cmd))
+    return workers
+
+
+def stop_local_workers(workers, timeout):
+    """
+    Wait for local workers to exit, terminating those still running after timeout seconds
+
+    A worker exits once the coordinator has no jobs left; one stuck on a
+    document past its lease would otherwise keep the run from finishing.
+    """
+    deadline = time.monotonic() + timeout
+    for worker in workers:
+        try:
+            worker.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Worker process {worker.pid} still running after {timeout}s; terminating it")
+            worker.terminate()
+            try:
+                worker.wait(timeout=WORKER_STOP_SECONDS)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                worker.wait()
+
+
+def run_coordinator(args):
+    input_dir = args.input
+    profile = DEFAULT_OCR_PROFILE
+    if args.site:
+        if args.site not in WEBSITE_CONFIGS:
+            print(f"Error: Site '{args.site}' not found in configurations.")
+            return 1
+        input_dir = WEBSITE_CONFIGS[args.site]["output_dir"]
+        profile = WEBSITE_CONFIGS[args.site].get("ocr_profile", DEFAULT_OCR_PROFILE)
+    if not input_dir:
+        print("Error: Either --input or --site must be specified")
+        return 1
+
+    processor = PDFOCRProcessor(
+        input_dir=input_dir,
+        output_dir=args.output,
+        index_dir=args.index,
+        num_workers=DEFAULT_WORKERS,
+        profile=args.profile or profile,
+        word_boxes=args.word_boxes if args.word_boxes is not None else WORD_BOXES
+    )
+    coordinator = OCRCoordinator(
+        processor,
+        ledger_path=args.ledger,
+        pages_per_job=args.pages_per_job,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        token=args.token
+    )
+    coordinator.queue_documents()
+    port = coordinator.serve(args.host, args.port)
+
+    workers = []
+    if args.local_workers:
+        workers = start_local_workers(args.local_workers, f"http://127.0.0.1:{port}", args.token)
+
+    try:
+        coordinator.wait()
+        logger.info(f"All jobs finished: {coordinator.ledger.counts() or 'ledger empty'}")
+        stop_local_workers(workers, coordinator.lease_seconds)
+    except KeyboardInterrupt:
+        logger.warning("Coordinator interrupted; leased jobs will be re-queued on the next run")
+        for worker in workers:
+            worker.terminate()
+        return 1
+    finally:
+        coordinator.shutdown()
+
+    logger.info("Updating search index...")
+    processor.update_index()
+    return 0
+
+
+def run_worker(args):
+    worker = OCRWorker(
+        args.coordinator,
+        worker_id=args.id,
+        token=args.token,
+        scratch_dir=args.scratch,
+        max_memory_percent=args.memory_limit if args.memory_limit is not None else MAX_MEMORY,
+        exit_when_finished=not args.keep_running
+    )
+    worker.run()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed OCR: a coordinator and pull workers")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    coord = subparsers.add_parser("coordinator", help="Serve OCR jobs from a shared ledger")
+    coord.add_argument("--input", "-i", help="Input directory containing PDF files")
+    coord.add_argument("--site", "-s", help="Site ID from config (alternative to --input)")
+    coord.add_argument("--output", "-o", default="ocr_text", help="Output directory for extracted text")
+    coord.add_argument("--index", default="search_index", help="Directory for search index")
+    coord.add_argument("--profile", "-p", choices=sorted(OCR_PROFILES), default=None, help="OCR profile for all jobs")
+    coord.add_argument("--word-boxes", action="store_true", default=None, help="Have workers return word boxes")
+    coord.add_argument("--ledger", default=None, help="Job ledger database (default: <output>/.ocr_jobs.db)")
+    coord.add_argument("--pages-per-job", type=int, default=DEFAULT_PAGES_PER_JOB,
+                       help="Split documents into page ranges of this size (0 = whole documents)")
+    coord.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS, help="Job lease length")
+    coord.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Attempts before a job fails")
+    coord.add_argument("--host", default="127.0.0.1", help="Interface to listen on (0.0.0.0 for remote workers)")
+    coord.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    coord.add_argument("--token", default=None, help="Shared secret workers must present")
+    coord.add_argument("--local-workers", type=int, default=0, help="Also start this many workers on this machine")
+
+    work = subparsers.add_parser("worker", help="Pull and OCR jobs from a coordinator")
+    work.add_argument("--coordinator", "-c", required=True, help="Coordinator URL, e.g. http://host:8765")
+    work.add_argument("--id", default=None, help="Worker name reported to the coordinator")
+    work.add_argument("--token", default=None, help="Shared secret matching the coordinator's --token")
+    work.add_argument("--scratch", default=None, help="Scratch directory for downloaded PDFs")
+    work.add_argument("--memory-limit", "-m", type=int, default=None, help="Maximum memory usage percentage")
+    work.add_argument("--keep-running", action="store_true", help="Keep polling after the coordinator runs dry")
+
+    args = parser.parse_args()
+    if args.mode == "coordinator":
+        return run_coordinator(args)
+    return run_worker(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,4 +13,31 @@ POPPLER_PATH = r"C:\Program Files\poppler\bin"
 OCR_WORKERS = 2
 
 # Maximum memory usage percentage before pausing (75% is a safe default)
-MAX_MEMORY_PERCENT = 75
\ No newline at end of file
+MAX_MEMORY_PERCENT = 75
+
+# Save word boxes and confidences to a compact .boxes sidecar next to each text file
+OCR_WORD_BOXES = False
+
+# Save OCR text as compressed .ocrz files (zstd if installed, else zlib) with random access by page
+OCR_COMPRESS_TEXT = False
+
+# Index writer RAM buffer in MB and documents per commit when (re)building the search index
+INDEX_LIMIT_MB = 256
+INDEX_BATCH_SIZE = 1000
+
+# Processes used to build the search index (1 = single process; set to your core count for big rebuilds)
+INDEX_PROCS = 1
+
+# Index one document per OCR page so search hits report page numbers (same as --index-pages)
+INDEX_PAGES = False
+
+# Store the OCR text in the search index (False = slim index, snippets read from ocr_text; same as --slim-index)
+INDEX_STORE_CONTENT = True
+
+# Clean OCR text before indexing: join hyphenated line breaks, drop junk tokens, collapse whitespace
+INDEX_NORMALIZE = True
+# Optional word list (one word per line) used to judge unknown words during normalization
+NORMALIZE_DICTIONARY = None
+
+# Search backend: "whoosh" or "sqlite" (SQLite FTS5; same as --backend). Switching rebuilds the index
+INDEX_BACKEND = "whoosh"
@@ -7,7 +7,8 @@ Extract text from scanned PDF documents
 import os
 import sys
 import pytesseract
-from pdf2image import convert_from_path
+from pytesseract import Output
+from pdf2image import convert_from_path, pdfinfo_from_path
 import argparse
 from tqdm import tqdm
 import logging
@@ -17,12 +18,17 @@ import time
 import json
 import gc
 import psutil
-import tempfile
 from config import WEBSITE_CONFIGS
-from whoosh.index import create_in, open_dir
-from whoosh.fields import Schema, TEXT, ID, STORED
-from whoosh.qparser import QueryParser
-import shutil
+from ocr_profiles import (OCR_PROFILES, DEFAULT_OCR_PROFILE, get_profile, analyze_probe,
+                          choose_dpi, preprocess, data_to_text, mean_confidence)
+from word_boxes import page_record, write_word_boxes, sidecar_path
+from text_store import TextStore, split_pages, PAGE_MARKER
+from ocr_watcher import PDFWatcher
+from index_manifest import IndexManifest, text_hash
+from index_store import IndexStore
+from text_normalize import normalize_text, load_dictionary, NORMALIZE_VERSION
+from doc_metadata import parse_filename, METADATA_VERSION
+from search_backend import BACKENDS, DEFAULT_BACKEND, get_backend, make_schema
 
 # Import local OCR configuration if available
 try:
@@ -56,6 +62,24 @@ except ImportError:
                 pytesseract.pytesseract.tesseract_cmd = path
                 break
 
+# Optional settings that older ocr_config.py files may not define
+try:
+    import ocr_config
+except ImportError:
+    ocr_config = None
+WORD_BOXES = getattr(ocr_config, "OCR_WORD_BOXES", False)
+COMPRESS_TEXT = getattr(ocr_config, "OCR_COMPRESS_TEXT", False)
+INDEX_LIMIT_MB = getattr(ocr_config, "INDEX_LIMIT_MB", 256)
+INDEX_BATCH_SIZE = getattr(ocr_config, "INDEX_BATCH_SIZE", 1000)
+INDEX_PROCS = getattr(ocr_config, "INDEX_PROCS", 1)
+INDEX_PAGES = getattr(ocr_config, "INDEX_PAGES", False)
+INDEX_STORE_CONTENT = getattr(ocr_config, "INDEX_STORE_CONTENT", True)
+INDEX_NORMALIZE = getattr(ocr_config, "INDEX_NORMALIZE", True)
+NORMALIZE_DICTIONARY = getattr(ocr_config, "NORMALIZE_DICTIONARY", None)
+INDEX_BACKEND = getattr(ocr_config, "INDEX_BACKEND", DEFAULT_BACKEND)
+# Documents per job file handed to each indexing process
+INDEX_MP_BATCH = 20
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -68,30 +92,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Define schema for search index
-schema = Schema(
-    path=ID(stored=True),
-    filename=STORED,
-    title=TEXT(stored=True),
-    content=TEXT(stored=True)
-)
+schema = make_schema()
 
 class PDFOCRProcessor:
-    def __init__(self, input_dir, output_dir="ocr_text", index_dir="search_index", num_workers=DEFAULT_WORKERS, max_memory_percent=MAX_MEMORY):
+    def __init__(self, input_dir, output_dir="ocr_text", index_dir="search_index", num_workers=DEFAULT_WORKERS, max_memory_percent=MAX_MEMORY,
+                 profile=DEFAULT_OCR_PROFILE, word_boxes=WORD_BOXES, compress_text=COMPRESS_TEXT):
         """
         Initialize the OCR processor
         
         Args:
             input_dir (str): Directory containing PDFs to process
             output_dir (str): Directory to save extracted text
-            index_dir (str): Directory for search index
+            index_dir (str): Directory for search index (None for OCR-only use, e.g. cluster workers)
             num_workers (int): Number of parallel OCR workers
             max_memory_percent (int): Maximum memory usage percentage before pausing
+            profile (str): Name of the OCR profile (see ocr_profiles.OCR_PROFILES)
+            word_boxes (bool): Also save word boxes and confidences to a .boxes sidecar
+            compress_text (bool): Save OCR text as compressed, page-framed .ocrz files
         """
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.index_dir = index_dir
+        self.index_store = IndexStore(index_dir) if index_dir else None
+        self.backend = get_backend(INDEX_BACKEND)
         self.num_workers = num_workers
         self.max_memory_percent = max_memory_percent
+        self.profile = get_profile(profile)
+        self.word_boxes = word_boxes
+        self.text_store = TextStore(output_dir, compress=compress_text)
+        self.index_limit_mb = INDEX_LIMIT_MB
+        self.index_batch_size = INDEX_BATCH_SIZE
+        self.index_procs = INDEX_PROCS
+        self.index_pages = INDEX_PAGES
+        self.index_store_content = INDEX_STORE_CONTENT
+        self.normalize = INDEX_NORMALIZE
+        self.normalize_dictionary = NORMALIZE_DICTIONARY
+        self._dictionary = None
+        self.poppler_path = self._resolve_poppler_path()
         self.work_queue = queue.Queue()
         self.processed_files = []
         self.error_files = []
@@ -99,11 +136,11 @@ class PDFOCRProcessor:
         
         # Create output directories if they don't exist
         os.makedirs(output_dir, exist_ok=True)
-        os.makedirs(index_dir, exist_ok=True)
-        
-        # Create search index if it doesn't exist
-        if not os.path.exists(os.path.join(index_dir, "MAIN_WRITELOCK")):
-            create_in(index_dir, schema)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+            
+            # Create search index if it doesn't exist
+            self.index_store.ensure(self.backend, **self.index_layout())
             
         # Load previously saved progress if it exists
         self.load_progress()
@@ -164,13 +201,12 @@ class PDFOCRProcessor:
         """
         try:
             base_filename = os.path.basename(pdf_path)
-            text_filename = os.path.splitext(base_filename)[0] + ".txt"
-            text_path = os.path.join(self.output_dir, text_filename)
+            name = self.doc_name(pdf_path)
             
             # Skip if already processed
-            if os.path.exists(text_path):
+            if self.text_store.exists(name):
                 logger.info(f"Skipping already processed file: {base_filename}")
-                return self.read_text_file(text_path)
+                return self.read_text(name)
             
             # Skip if in processed list
             if pdf_path in self.processed_files:
@@ -182,7 +218,7 @@ class PDFOCRProcessor:
                 logger.info(f"Skipping previously failed file: {base_filename}")
                 return ""
             
-            logger.info(f"Processing {base_filename}")
+            logger.info(f"Processing {base_filename} (profile: {self.profile['name']})")
             
             # Check memory usage before processing
             if self.check_memory_usage():
@@ -194,110 +230,17 @@ class PDFOCRProcessor:
                     self.save_progress()
                     return ""
             
-            # Create a temporary directory for this PDF processing
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Convert PDF to images
-                try:
-                    # Try with poppler path from config if available
-                    try:
-                        poppler_path = POPPLER_PATH
-                        if os.path.exists(poppler_path):
-                            # Use lower dpi and memory-efficient settings
-                            images = convert_from_path(pdf_path, 
-                                                      poppler_path=poppler_path, 
-                                                      dpi=200,  # Lower DPI
-                                                      output_folder=temp_dir,  # Save images to temp folder
-                                                      fmt='jpeg',  # Use JPEG format (smaller size)
-                                                      use_pdftocairo=True)  # More memory efficient
-                        else:
-                            # Fall back to default if config path doesn't exist
-                            images = convert_from_path(pdf_path, 
-                                                      dpi=200, 
-                                                      output_folder=temp_dir,
-                                                      fmt='jpeg',
-                                                      use_pdftocairo=True)
-                    except NameError:
-                        # No config file available, use default
-                        images = convert_from_path(pdf_path, 
-                                                dpi=200, 
-                                                output_folder=temp_dir,
-                                                fmt='jpeg',
-                                                use_pdftocairo=True)
-                except Exception as e:
-                    logger.warning(f"Error with default pdf2image settings: {e}")
-                    
-                    # If failed, try with explicit poppler path for Windows
-                    if os.name == 'nt':  # Windows
-                        try:
-                            # Try to find poppler in common locations
-                            poppler_path = None
-                            common_poppler_paths = [
-                                os.path.join(os.environ.get('PROGRAMFILES', 'C:\\Program Files'), 'poppler', 'bin'),
-                                os.path.join(os.environ.get('PROGRAMFILES(X86)', 'C:\\Program Files (x86)'), 'poppler', 'bin'),
-                                os.path.join(os.path.expanduser('~'), 'poppler', 'bin'),
-                                os.path.join(os.path.expanduser('~'), 'Downloads', 'poppler', 'bin'),
-                                os.path.join(os.path.expanduser('~'), 'Downloads', 'poppler-windows', 'bin'),
-                            ]
-                            
-                            for path in common_poppler_paths:
-                                if os.path.exists(path):
-                                    poppler_path = path
-                                    break
-                            
-                            if poppler_path:
-                                logger.info(f"Trying with poppler path: {poppler_path}")
-                                # Try with lower quality settings
-                                images = convert_from_path(pdf_path, 
-                                                        poppler_path=poppler_path, 
-                                                        dpi=150,  # Even lower DPI
-                                                        output_folder=temp_dir,
-                                                        fmt='jpeg',
-                                                        use_pdftocairo=True)
-                            else:
-                                raise Exception("Poppler not found in common locations")
-                        except Exception as inner_e:
-                            logger.error(f"Failed to convert PDF with explicit poppler path: {inner_e}")
-                            self.error_files.append(pdf_path)
-                            self.save_progress()
-                            raise
-                    else:
-                        self.error_files.append(pdf_path)
-                        self.save_progress()
-                        raise
-                
-                # Extract text from each page
-                full_text = ""
-                num_images = len(images)
-                
-                for i, image in enumerate(images):
-                    try:
-                        # Check memory again before processing each page
-                        if self.check_memory_usage():
-                            logger.warning(f"Memory usage too high, pausing for 5 seconds during page processing")
-                            time.sleep(5)
-                        
-                        # Log progress on large documents
-                        if num_images > 10 and i % 5 == 0:
-                            logger.info(f"Processing page {i+1}/{num_images} of {base_filename}")
-                            
-                        text = pytesseract.image_to_string(image)
-                        full_text += f"\n--- Page {i+1} ---\n{text}\n"
-                        
-                        # Explicitly delete the image reference to free memory
-                        del image
-                        if i % 5 == 0:  # Run garbage collection periodically
-                            gc.collect()
-                            
-                    except Exception as page_error:
-                        logger.error(f"Error processing page {i+1} of {pdf_path}: {page_error}")
-                        full_text += f"\n--- Page {i+1} ---\n[OCR ERROR: {str(page_error)}]\n"
-                
-                # Force cleanup before saving
-                gc.collect()
+            full_text, page_boxes = self.extract_text(pdf_path)
+            
+            # Force cleanup before saving
+            gc.collect()
+            
+            # Save word boxes first so a text file never exists without its sidecar
+            if page_boxes is not None:
+                write_word_boxes(sidecar_path(self.text_path_for(pdf_path)), page_boxes)
             
             # Save extracted text
-            with open(text_path, 'w', encoding='utf-8') as f:
-                f.write(full_text)
+            self.text_store.write(name, full_text)
             
             # Add to processed files list
             self.processed_files.append(pdf_path)
@@ -311,13 +254,174 @@ class PDFOCRProcessor:
             self.save_progress()
             return ""
     
-    def read_text_file(self, text_path):
-        """Read a text file with proper error handling"""
+    def _resolve_poppler_path(self):
+        """Return the Poppler bin directory from ocr_config.py, or None to use PATH"""
+        try:
+            if os.path.exists(POPPLER_PATH):
+                return POPPLER_PATH
+        except NameError:
+            pass  # No config file available
+        return None
+    
+    def _find_windows_poppler(self):
+        """Try to find Poppler in common Windows install locations"""
+        common_poppler_paths = [
+            os.path.join(os.environ.get('PROGRAMFILES', 'C:\\Program Files'), 'poppler', 'bin'),
+            os.path.join(os.environ.get('PROGRAMFILES(X86)', 'C:\\Program Files (x86)'), 'poppler', 'bin'),
+            os.path.join(os.path.expanduser('~'), 'poppler', 'bin'),
+            os.path.join(os.path.expanduser('~'), 'Downloads', 'poppler', 'bin'),
+            os.path.join(os.path.expanduser('~'), 'Downloads', 'poppler-windows', 'bin'),
+        ]
+        for path in common_poppler_paths:
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def _call_poppler(self, func, *args, **kwargs):
+        """
+        Call a pdf2image function, falling back to common Poppler locations on Windows
+        
+        Args:
+            func (callable): convert_from_path or pdfinfo_from_path
+        """
         try:
-            with open(text_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return func(*args, poppler_path=self.poppler_path, **kwargs)
         except Exception as e:
-            logger.error(f"Error reading text file {text_path}: {e}")
+            if os.name != 'nt' or self.poppler_path:
+                raise
+            logger.warning(f"Error with default pdf2image settings: {e}")
+            poppler_path = self._find_windows_poppler()
+            if not poppler_path:
+                raise Exception("Poppler not found in common locations")
+            logger.info(f"Trying with poppler path: {poppler_path}")
+            self.poppler_path = poppler_path
+            return func(*args, poppler_path=poppler_path, **kwargs)
+    
+    def get_page_count(self, pdf_path):
+        """Return the number of pages in a PDF"""
+        return int(self._call_poppler(pdfinfo_from_path, pdf_path)["Pages"])
+    
+    def render_page(self, pdf_path, page_num, dpi):
+        """
+        Render a single PDF page to a grayscale image
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            page_num (int): 1-based page number
+            dpi (int): Rendering resolution
+        
+        Returns:
+            PIL.Image: Rendered page
+        """
+        images = self._call_poppler(convert_from_path, pdf_path,
+                                    dpi=dpi,
+                                    first_page=page_num,
+                                    last_page=page_num,
+                                    grayscale=True,
+                                    use_pdftocairo=True)  # More memory efficient
+        return images[0]
+    
+    def _ocr_image(self, pdf_path, page_num, dpi, probe, force_binarize=False):
+        """Render, preprocess and OCR one page, returning image_to_data() output and the image size"""
+        image = self.render_page(pdf_path, page_num, dpi)
+        image = preprocess(image, self.profile, probe, force_binarize=force_binarize)
+        try:
+            return pytesseract.image_to_data(image, output_type=Output.DICT), image.size
+        finally:
+            del image
+    
+    def ocr_page(self, pdf_path, page_num):
+        """
+        OCR a single page using the processor's profile
+        
+        A low-resolution probe picks the DPI and preprocessing; pages whose mean
+        word confidence falls below the profile threshold are retried once at the
+        profile's retry DPI with binarization forced on.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            page_num (int): 1-based page number
+        
+        Returns:
+            dict: Page text, the DPI used, the mean word confidence and, when
+                word boxes are enabled, a word_boxes.page_record()
+        """
+        profile = self.profile
+        probe = analyze_probe(self.render_page(pdf_path, page_num, profile["probe_dpi"]))
+        dpi = choose_dpi(profile, probe)
+        
+        data, size = self._ocr_image(pdf_path, page_num, dpi, probe)
+        confidence = mean_confidence(data)
+        
+        retry_dpi = profile["retry_dpi"]
+        if (profile["min_confidence"] and retry_dpi and retry_dpi >= dpi
+                and confidence is not None and confidence < profile["min_confidence"]):
+            logger.info(f"Low OCR confidence ({confidence:.0f}) on page {page_num} of "
+                        f"{os.path.basename(pdf_path)}, retrying at {retry_dpi} DPI")
+            retry_data, retry_size = self._ocr_image(pdf_path, page_num, retry_dpi, probe, force_binarize=True)
+            retry_confidence = mean_confidence(retry_data)
+            if retry_confidence is not None and retry_confidence > confidence:
+                data, size, dpi, confidence = retry_data, retry_size, retry_dpi, retry_confidence
+        
+        return {
+            "text": data_to_text(data),
+            "dpi": dpi,
+            "confidence": confidence,
+            "boxes": page_record(page_num, size, dpi, data) if self.word_boxes else None,
+        }
+    
+    def extract_text(self, pdf_path, first_page=None, last_page=None):
+        """
+        OCR the pages of a PDF, one page at a time
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            first_page (int): First page to OCR (default: 1)
+            last_page (int): Last page to OCR (default: the last page)
+        
+        Returns:
+            tuple: Extracted text with "--- Page N ---" markers, and the list of
+                page word boxes (None unless word boxes are enabled)
+        """
+        base_filename = os.path.basename(pdf_path)
+        num_pages = self.get_page_count(pdf_path)
+        full_text = ""
+        page_boxes = [] if self.word_boxes else None
+        
+        first_page = first_page or 1
+        last_page = min(last_page or num_pages, num_pages)
+        
+        for page_num in range(first_page, last_page + 1):
+            try:
+                # Check memory again before processing each page
+                if self.check_memory_usage():
+                    logger.warning(f"Memory usage too high, pausing for 5 seconds during page processing")
+                    time.sleep(5)
+                
+                # Log progress on large documents
+                if num_pages > 10 and (page_num - 1) % 5 == 0:
+                    logger.info(f"Processing page {page_num}/{num_pages} of {base_filename}")
+                
+                page = self.ocr_page(pdf_path, page_num)
+                full_text += f"\n--- Page {page_num} ---\n{page['text']}\n"
+                if page["boxes"] is not None:
+                    page_boxes.append(page["boxes"])
+                
+                if page_num % 5 == 0:  # Run garbage collection periodically
+                    gc.collect()
+                    
+            except Exception as page_error:
+                logger.error(f"Error processing page {page_num} of {pdf_path}: {page_error}")
+                full_text += f"\n--- Page {page_num} ---\n[OCR ERROR: {str(page_error)}]\n"
+        
+        return full_text, page_boxes
+    
+    def read_text(self, name):
+        """Read a document from the text store with proper error handling"""
+        try:
+            return self.text_store.read(name)
+        except Exception as e:
+            logger.error(f"Error reading OCR text for {name}: {e}")
             return ""
     
     def worker(self):
@@ -338,56 +442,130 @@ class PDFOCRProcessor:
             except Exception as e:
                 logger.error(f"Critical worker error: {e}")
     
-    def index_document(self, pdf_path, text_content):
+    def index_text(self, text):
+        """Return OCR text as it goes into the index (normalized unless disabled)"""
+        if not self.normalize:
+            return text
+        if self.normalize_dictionary and self._dictionary is None:
+            self._dictionary = load_dictionary(self.normalize_dictionary)
+        return normalize_text(text, self._dictionary)
+    
+    def index_settings(self):
+        """Return the settings that decide what text goes into the index, for the manifest"""
+        return {
+            "normalize": NORMALIZE_VERSION if self.normalize else 0,
+            "dictionary": os.path.basename(self.normalize_dictionary) if self.normalize and self.normalize_dictionary else None,
+            "metadata": METADATA_VERSION,
+        }
+    
+    def document_fields(self, pdf_path, text_content):
+        """Return the index fields for a document, with the metadata parsed from its filename"""
+        filename = os.path.basename(pdf_path)
+        title = os.path.splitext(filename)[0].replace('_', ' ')
+        
+        return {
+            "path": pdf_path,
+            "filename": filename,
+            "title": title,
+            "content": self.index_text(text_content),
+            **parse_filename(filename),
+        }
+    
+    def index_layout(self):
+        """Return the layout of newly built indexes (per page or per PDF, with or without stored text)"""
+        return {"pages": bool(self.index_pages), "store_content": bool(self.index_store_content)}
+    
+    def index_layout_matches(self, manifest):
+        """True if the published index has the backend, layout and settings a rebuild would give it"""
+        backend = self.index_store.backend()
+        return (backend.name == self.backend.name
+                and backend.layout(self.index_store.current_dir()) == self.index_layout()
+                and manifest.settings == self.index_settings())
+    
+    def page_fields(self, pdf_path, text_content):
+        """Return the index fields for each non-empty page of a document"""
+        fields = self.document_fields(pdf_path, "")
+        pages = []
+        for page_num, section in split_pages(text_content):
+            content = self.index_text(PAGE_MARKER.sub("", section, count=1)).strip()
+            if content:
+                pages.append(dict(fields, page=page_num, content=content))
+        return pages
+    
+    def add_to_writer(self, writer, pdf_path, text_content, replace=False):
+        """
+        Add a document to an open index writer, in the layout of that index
+        
+        Args:
+            writer: Search backend writer (see search_backend.SearchBackend.writer)
+            pdf_path (str): Path to the PDF file
+            text_content (str): Extracted text content
+            replace (bool): Replace any existing entries for the same path
+        """
+        if replace:
+            writer.delete(pdf_path)
+        if writer.paged:
+            for fields in self.page_fields(pdf_path, text_content):
+                writer.add(fields)
+        else:
+            writer.add(self.document_fields(pdf_path, text_content))
+    
+    def index_document(self, pdf_path, text_content, replace=False):
         """
         Index a document in the search index
         
         Args:
             pdf_path (str): Path to the PDF file
             text_content (str): Extracted text content
+            replace (bool): Remove any existing entry for the same path first
         """
         try:
-            ix = open_dir(self.index_dir)
-            writer = ix.writer()
-            
-            filename = os.path.basename(pdf_path)
-            title = os.path.splitext(filename)[0].replace('_', ' ')
-            
-            writer.add_document(
-                path=pdf_path,
-                filename=filename,
-                title=title,
-                content=text_content
-            )
+            writer = self.index_store.backend().writer(self.index_store.current_dir())
             
+            self.add_to_writer(writer, pdf_path, text_content, replace=replace)
             writer.commit()
             
         except Exception as e:
             logger.error(f"Error indexing {pdf_path}: {e}")
     
-    def process_all(self):
-        """Process all PDF files in the input directory"""
+    def doc_name(self, pdf_path):
+        """Return the text store name for a PDF"""
+        return os.path.splitext(os.path.basename(pdf_path))[0]
+    
+    def text_path_for(self, pdf_path):
+        """Return the path of the plain OCR text file for a PDF (also the base name of its sidecars)"""
+        text_filename = os.path.splitext(os.path.basename(pdf_path))[0] + ".txt"
+        return os.path.join(self.output_dir, text_filename)
+    
+    def find_pdfs(self):
+        """Return all PDF files in the input directory, smallest first"""
         pdf_files = []
         for root, _, files in os.walk(self.input_dir):
             for file in files:
                 if file.lower().endswith('.pdf'):
                     pdf_files.append(os.path.join(root, file))
         
+        # Sort files by size (process smaller files first for quicker wins)
+        pdf_files.sort(key=lambda x: os.path.getsize(x))
+        return pdf_files
+    
+    def find_unprocessed(self, pdf_files=None):
+        """Return the PDF files that have no OCR text yet"""
+        if pdf_files is None:
+            pdf_files = self.find_pdfs()
+        return [pdf_path for pdf_path in pdf_files
+                if not self.text_store.exists(self.doc_name(pdf_path)) and pdf_path not in self.processed_files]
+    
+    def process_all(self):
+        """Process all PDF files in the input directory"""
+        pdf_files = self.find_pdfs()
+        
         if not pdf_files:
             logger.warning(f"No PDF files found in {self.input_dir}")
             return
         
-        # Sort files by size (process smaller files first for quicker wins)
-        pdf_files.sort(key=lambda x: os.path.getsize(x))
-        
         # Filter out already processed files
-        unprocessed_files = []
-        for pdf_path in pdf_files:
-            text_filename = os.path.splitext(os.path.basename(pdf_path))[0] + ".txt"
-            text_path = os.path.join(self.output_dir, text_filename)
-            
-            if not os.path.exists(text_path) and pdf_path not in self.processed_files:
-                unprocessed_files.append(pdf_path)
+        unprocessed_files = self.find_unprocessed(pdf_files)
         
         logger.info(f"Found {len(pdf_files)} PDF files, {len(unprocessed_files)} need processing")
         
@@ -461,9 +639,9 @@ class PDFOCRProcessor:
             logger.info("Progress saved due to error. You can resume later.")
             return
         
-        # Index all processed documents
-        logger.info("Building search index...")
-        self.rebuild_index_from_processed()
+        # Index new and changed documents
+        logger.info("Updating search index...")
+        self.update_index()
         
         logger.info("OCR processing and indexing completed")
         
@@ -475,51 +653,229 @@ class PDFOCRProcessor:
             except:
                 pass
     
+    def pdf_path_for(self, name):
+        """Return the PDF path indexed for a text store document"""
+        return os.path.join(self.input_dir, os.path.basename(name) + ".pdf")
+    
+    def iter_processed(self, names=None, manifest=None):
+        """
+        Yield (pdf_path, text) for documents in the text store, with memory checks
+        
+        Args:
+            names (list): Document names to read (default: the whole store)
+            manifest (IndexManifest): Record each document read in this manifest
+        """
+        if names is None:
+            names = self.text_store.names()
+        for i, name in enumerate(names):
+            if i % 50 == 0:  # Check memory periodically
+                if self.check_memory_usage():
+                    logger.warning("Memory high during indexing, pausing for garbage collection")
+                    time.sleep(2)
+                    gc.collect()
+            
+            try:
+                pdf_path = self.pdf_path_for(name)
+                file_path = self.text_store.path(name)
+                text = self.text_store.read(name)
+                if manifest is not None:
+                    manifest.record(name, pdf_path, file_path, text)
+            except Exception as e:
+                logger.error(f"Error reading {name} for indexing: {e}")
+                continue
+            yield pdf_path, text
+    
+    def bulk_index(self, documents, limitmb=None, batch_size=None, optimize=True, procs=None,
+                   keep_segments=False, index_dir=None):
+        """
+        Add many documents through one index writer
+        
+        Unlike calling index_document() in a loop, which opens the index and
+        commits a new segment for every document, this keeps one writer with a
+        RAM buffer of limitmb, commits every batch_size documents and merges
+        everything into a single segment at the end.
+        
+        With the Whoosh backend and procs > 1 the writer farms documents out to
+        that many worker processes, each tokenizing its share into its own
+        segment with its own limitmb buffer. The segments are merged on commit
+        unless keep_segments is set, in which case they are left for a later
+        optimize_index().
+        
+        Args:
+            documents (iterable): (pdf_path, text_content) pairs
+            limitmb (int): Writer RAM buffer in MB, per process (default: INDEX_LIMIT_MB)
+            batch_size (int): Documents per commit, 0 for a single commit (default: INDEX_BATCH_SIZE)
+            optimize (bool): Merge all segments on the final commit
+            procs (int): Indexing processes (default: INDEX_PROCS)
+            keep_segments (bool): With procs > 1, keep the per-process segments unmerged
+            index_dir (str): Index to write to (default: the published index). Other
+                directories are staging generations of the configured backend
+        
+        Returns:
+            tuple: (documents indexed, seconds taken)
+        """
+        limitmb = limitmb or self.index_limit_mb
+        batch_size = self.index_batch_size if batch_size is None else batch_size
+        procs = procs or self.index_procs
+        started = time.time()
+        
+        index_dir = index_dir or self.index_store.current_dir()
+        backend = self.index_store.backend() if index_dir == self.index_store.current_dir() else self.backend
+        if procs > 1:
+            optimize = optimize and not keep_segments
+        
+        def new_writer():
+            # Job files of INDEX_MP_BATCH documents bound what the parent holds in memory
+            return backend.writer(index_dir, limitmb=limitmb, procs=procs, batchsize=INDEX_MP_BATCH,
+                                  keep_segments=keep_segments)
+        
+        writer = new_writer()
+        count = 0
+        try:
+            for pdf_path, text_content in documents:
+                try:
+                    self.add_to_writer(writer, pdf_path, text_content)
+                    count += 1
+                except Exception as e:
+                    logger.error(f"Error indexing {pdf_path}: {e}")
+                    continue
+                
+                if batch_size and count % batch_size == 0:
+                    writer.commit(merge=False)
+                    logger.info(f"Committed {count} documents")
+                    writer = new_writer()
+            
+            writer.commit(optimize=optimize)
+        except BaseException:
+            writer.cancel()
+            raise
+        
+        return count, time.time() - started
+    
+    def optimize_index(self):
+        """Compact the published index (e.g. merge the segments left by a build with keep_segments)"""
+        started = time.time()
+        self.index_store.backend().optimize(self.index_store.current_dir())
+        logger.info(f"Optimized the search index in {time.time() - started:.1f}s")
+    
     def rebuild_index_from_processed(self):
-        """Rebuild the search index but only from successfully processed text files"""
+        """
+        Rebuild the search index but only from successfully processed text files
+        
+        The new index is built in a staging generation and published atomically
+        when complete, so searchers keep using the old index until then.
+        """
+        staging_dir = None
         try:
-            # Get list of all text files in output directory
-            text_files = []
-            for root, _, files in os.walk(self.output_dir):
-                for file in files:
-                    if file.lower().endswith('.txt'):
-                        text_files.append(os.path.join(root, file))
+            # Get list of all documents in the text store
+            names = self.text_store.names()
             
-            logger.info(f"Found {len(text_files)} text files to index")
+            logger.info(f"Found {len(names)} text files to index")
             
-            # Create new index
-            if os.path.exists(self.index_dir):
-                shutil.rmtree(self.index_dir)
-            os.makedirs(self.index_dir, exist_ok=True)
-            create_in(self.index_dir, schema)
+            # Create new index next to the published one
+            staging_dir = self.index_store.stage(self.backend, **self.index_layout())
             
-            # Index each text file with memory checks
-            for i, text_path in enumerate(text_files):
-                if i % 50 == 0:  # Check memory periodically
-                    if self.check_memory_usage():
-                        logger.warning("Memory high during indexing, pausing for garbage collection")
-                        time.sleep(2)
-                        gc.collect()
-                
-                try:
-                    # Derive the PDF path
-                    pdf_filename = os.path.splitext(os.path.basename(text_path))[0] + ".pdf"
-                    pdf_path = os.path.join(self.input_dir, pdf_filename)
-                    
-                    # Read the text content
-                    with open(text_path, 'r', encoding='utf-8') as f:
-                        text_content = f.read()
-                    
-                    # Index the document
-                    self.index_document(pdf_path, text_content)
-                    
-                except Exception as e:
-                    logger.error(f"Error indexing {text_path}: {e}")
+            # Index every text file through a single writer, recording what went in
+            manifest = IndexManifest(staging_dir)
+            manifest.settings = self.index_settings()
+            count, elapsed = self.bulk_index(self.iter_processed(names, manifest=manifest), index_dir=staging_dir)
+            manifest.save()
+            logger.info(f"Indexed {count} documents in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} docs/sec)")
             
+            self.index_store.publish(staging_dir)
             logger.info("Search index rebuild completed")
         except Exception as e:
             logger.error(f"Error rebuilding index: {e}")
+            if staging_dir:
+                self.index_store.discard(staging_dir)
             
+    def update_index(self, names=None):
+        """
+        Bring the search index up to date with the text store
+        
+        Compares the text store with the index manifest and only adds new
+        documents, updates changed ones and deletes removed ones. Documents whose
+        file size and mtime are unchanged are not read at all. An index without a
+        manifest (built by an older version), or with another backend, layout or
+        text normalization than the current settings, gets one full rebuild.
+        
+        Args:
+            names (list): Only check these documents (default: the whole store)
+        
+        Returns:
+            dict: Counts of added, updated, deleted and unchanged documents
+        """
+        stats = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        manifest = IndexManifest(self.index_store.current_dir())
+        if not manifest.exists:
+            logger.info("Search index has no manifest yet, doing a full rebuild")
+            self.rebuild_index_from_processed()
+            stats["added"] = len(IndexManifest(self.index_store.current_dir()))
+            return stats
+        
+        if not self.index_layout_matches(manifest):
+            logger.info(f"Rebuilding the search index for new settings: {self.backend.name} backend, one document per "
+                        f"{'page' if self.index_pages else 'PDF'}, {'with' if self.index_store_content else 'without'} "
+                        f"stored text, settings {self.index_settings()}")
+            self.rebuild_index_from_processed()
+            stats["added"] = len(IndexManifest(self.index_store.current_dir()))
+            return stats
+        
+        started = time.time()
+        if names is None:
+            current = self.text_store.names()
+            current_set = set(current)
+            removed = [name for name in manifest.entries if name not in current_set]
+        else:
+            current = [name for name in names if self.text_store.exists(name)]
+            removed = [name for name in names if name in manifest.entries and name not in current]
+        
+        writer = self.index_store.backend().writer(self.index_store.current_dir(), limitmb=self.index_limit_mb)
+        try:
+            for name in removed:
+                writer.delete(manifest.entries[name]["path"])
+                manifest.forget(name)
+                stats["deleted"] += 1
+            
+            for name in current:
+                file_path = self.text_store.path(name)
+                if manifest.unchanged(name, file_path):
+                    stats["unchanged"] += 1
+                    continue
+                
+                try:
+                    text = self.text_store.read(name)
+                except Exception as e:
+                    logger.error(f"Error reading {name} for indexing: {e}")
+                    continue
+                
+                old = manifest.entries.get(name)
+                pdf_path = self.pdf_path_for(name)
+                if old is not None and old["hash"] == text_hash(text) and old["path"] == pdf_path:
+                    # Touched or recompressed, but the text is the same
+                    manifest.record(name, pdf_path, file_path, text)
+                    stats["unchanged"] += 1
+                    continue
+                
+                if old is not None and old["path"] != pdf_path:
+                    writer.delete(old["path"])
+                self.add_to_writer(writer, pdf_path, text, replace=True)
+                manifest.record(name, pdf_path, file_path, text)
+                stats["updated" if old is not None else "added"] += 1
+            
+            if stats["added"] or stats["updated"] or stats["deleted"]:
+                writer.commit()
+            else:
+                writer.cancel()
+        except BaseException:
+            writer.cancel()
+            raise
+        
+        manifest.save()
+        logger.info(f"Index updated in {time.time() - started:.1f}s: {stats['added']} added, "
+                    f"{stats['updated']} updated, {stats['deleted']} deleted, {stats['unchanged']} unchanged")
+        return stats
+    
     def rebuild_index(self):
         """Rebuild the search index from existing text files"""
         logger.info("Rebuilding search index...")
@@ -533,17 +889,43 @@ def main():
     parser.add_argument("--index", default="search_index", help="Directory for search index")
     parser.add_argument("--workers", "-w", type=int, default=None, help="Number of parallel OCR workers")
     parser.add_argument("--rebuild-index", action="store_true", help="Rebuild search index from existing text files")
+    parser.add_argument("--update-index", action="store_true",
+                        help="Add new, changed and removed text files to the search index without OCR")
+    parser.add_argument("--index-pages", action="store_true", default=None,
+                        help="Index one document per page so hits report page numbers (switching rebuilds the index)")
+    parser.add_argument("--slim-index", action="store_true", default=None,
+                        help="Don't store OCR text in the search index; snippets are read from the text store")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Index raw OCR text, without de-hyphenation and junk token removal")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="Search backend for the index (default: INDEX_BACKEND; switching rebuilds the index)")
+    parser.add_argument("--index-procs", type=int, default=None,
+                        help="Processes used to build the search index (default: INDEX_PROCS)")
+    parser.add_argument("--optimize-index", action="store_true", help="Merge all search index segments into one")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and OCR/index new PDFs as they finish downloading")
+    parser.add_argument("--poll", action="store_true", help="With --watch, poll instead of using filesystem events")
+    parser.add_argument("--settle-seconds", type=float, default=2.0,
+                        help="With --watch, how long a PDF must stay unchanged before it is processed")
     parser.add_argument("--memory-limit", "-m", type=int, default=None, help="Maximum memory usage percentage")
+    parser.add_argument("--profile", "-p", choices=sorted(OCR_PROFILES), default=None,
+                        help="OCR profile (default: the site's ocr_profile, or %s)" % DEFAULT_OCR_PROFILE)
+    parser.add_argument("--word-boxes", action="store_true", default=None,
+                        help="Save word boxes and confidences to a .boxes sidecar next to each text file")
+    parser.add_argument("--compress-text", action="store_true", default=None,
+                        help="Save OCR text as compressed .ocrz files with random access by page")
     
     args = parser.parse_args()
     
     # Determine input directory
     input_dir = None
+    profile = DEFAULT_OCR_PROFILE
     if args.input:
         input_dir = args.input
     elif args.site:
         if args.site in WEBSITE_CONFIGS:
             input_dir = WEBSITE_CONFIGS[args.site]["output_dir"]
+            profile = WEBSITE_CONFIGS[args.site].get("ocr_profile", DEFAULT_OCR_PROFILE)
         else:
             print(f"Error: Site '{args.site}' not found in configurations.")
             print("Available sites:")
@@ -557,6 +939,7 @@ def main():
     # Use command line args if provided, otherwise use defaults
     workers = args.workers if args.workers is not None else DEFAULT_WORKERS
     memory_limit = args.memory_limit if args.memory_limit is not None else MAX_MEMORY
+    profile = args.profile or profile
     
     # Create processor
     processor = PDFOCRProcessor(
@@ -564,12 +947,34 @@ def main():
         output_dir=args.output,
         index_dir=args.index,
         num_workers=workers,
-        max_memory_percent=memory_limit
+        max_memory_percent=memory_limit,
+        profile=profile,
+        word_boxes=args.word_boxes if args.word_boxes is not None else WORD_BOXES,
+        compress_text=args.compress_text if args.compress_text is not None else COMPRESS_TEXT
     )
     
+    if args.backend:
+        processor.backend = get_backend(args.backend)
+    if args.index_procs:
+        processor.index_procs = args.index_procs
+    if args.index_pages is not None:
+        processor.index_pages = args.index_pages
+    if args.slim_index:
+        processor.index_store_content = False
+    if args.no_normalize:
+        processor.normalize = False
+    
+    # Watch the download directory if requested
+    if args.watch:
+        watcher = PDFWatcher(processor, settle_seconds=args.settle_seconds, use_watchdog=not args.poll)
+        watcher.run()
     # Rebuild index only if requested
-    if args.rebuild_index:
+    elif args.optimize_index:
+        processor.optimize_index()
+    elif args.rebuild_index:
         processor.rebuild_index()
+    elif args.update_index:
+        processor.update_index()
     else:
         # Process PDFs and build index
         processor.process_all()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Download Watcher Module
+OCR and index new PDFs as soon as they finish downloading
+
+Uses the optional watchdog package (inotify on Linux, native APIs elsewhere)
+and falls back to polling the download directories. A PDF is picked up once
+its size and modification time have stayed the same for settle_seconds;
+in-progress ".part" downloads are ignored.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIXES = (".part", ".crdownload", ".tmp")
+
+
+def is_finished_pdf(path):
+    """True for .pdf files that are not in-progress downloads"""
+    name = os.path.basename(path).lower()
+    return name.endswith(".pdf") and not name.endswith(PARTIAL_SUFFIXES)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        # Downloads land by renaming name.pdf.part to name.pdf
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+
+class PDFWatcher:
+    def __init__(self, processor, directories=None, settle_seconds=2.0, poll_interval=2.0,
+                 use_watchdog=True):
+        """
+        Watch download directories and feed finished PDFs to the OCR processor
+
+        Args:
+            processor (PDFOCRProcessor): Processor used to OCR and index new files
+            directories (list): Directories to watch (default: the processor's input_dir)
+            settle_seconds (float): How long a file must stay unchanged before it is processed
+            poll_interval (float): Seconds between checks (and between scans when polling)
+            use_watchdog (bool): Use filesystem events if watchdog is installed
+        """
+        self.processor = processor
+        self.directories = directories or [processor.input_dir]
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog and Observer is not None
+
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()
+        self.pending = {}     # path -> (size, mtime, time the file was last seen changing)
+        self.in_progress = set()
+        self.snapshot = {}    # polling mode: path -> (size, mtime)
+        self.stop_event = threading.Event()
+
+    def notify(self, path):
+        """Record that a file was created or changed"""
+        if is_finished_pdf(path):
+            with self.lock:
+                self.pending.setdefault(os.path.normpath(path), None)
+
+    def scan(self, notify=True):
+        """
+        Polling fallback: compare directory listings with the previous scan
+
+        Args:
+            notify (bool): Queue new or changed files (False just records the baseline)
+        """
+        current = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for file in files:
+                    path = os.path.normpath(os.path.join(root, file))
+                    if not is_finished_pdf(path):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    current[path] = (stat.st_size, stat.st_mtime)
+                    if notify and self.snapshot.get(path) != current[path]:
+                        self.notify(path)
+        self.snapshot = current
+
+    def ready_files(self):
+        """Return pending files whose size and mtime have settled"""
+        now = time.time()
+        ready = []
+        with self.lock:
+            for path, seen in list(self.pending.items()):
+                if path in self.in_progress:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self.pending[path]  # Removed or renamed before it settled
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if seen is None or seen[:2] != signature:
+                    self.pending[path] = signature + (now,)
+                elif now - seen[2] >= self.settle_seconds and stat.st_size > 0:
+                    del self.pending[path]
+                    self.in_progress.add(path)
+                    ready.append(path)
+        return ready
+
+    def handle(self, pdf_path):
+        """OCR one new PDF and add it to the index"""
+        try:
+            started = time.time()
+            text = self.processor.process_pdf(pdf_path)
+            if not text:
+                logger.warning(f"No text extracted from {os.path.basename(pdf_path)}, not indexing")
+                return
+            with self.index_lock:
+                self.processor.update_index([self.processor.doc_name(pdf_path)])
+            logger.info(f"OCR'd and indexed {os.path.basename(pdf_path)} in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Watcher failed to process {pdf_path}: {e}")
+        finally:
+            with self.lock:
+                self.in_progress.discard(pdf_path)
+
+    def run(self, initial_scan=True):
+        """
+        Watch until interrupted
+
+        Args:
+            initial_scan (bool): First queue PDFs that arrived while nothing was watching
+        """
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+
+        if initial_scan:
+            for pdf_path in self.processor.find_unprocessed():
+                self.notify(pdf_path)
+
+        observer = None
+        if self.use_watchdog:
+            observer = Observer()
+            handler = _EventHandler(self)
+            for directory in self.directories:
+                observer.schedule(handler, directory, recursive=True)
+            observer.start()
+            logger.info(f"Watching {', '.join(self.directories)} for new PDFs (filesystem events)")
+        else:
+            self.scan(notify=False)
+            logger.info(f"Watching {', '.join(self.directories)} for new PDFs (polling every {self.poll_interval}s)")
+
+        executor = ThreadPoolExecutor(max_workers=max(1, self.processor.num_workers))
+        try:
+            while not self.stop_event.is_set():
+                if observer is None:
+                    self.scan()
+                for pdf_path in self.ready_files():
+                    executor.submit(self.handle, pdf_path)
+                self.stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Watcher stopped")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            executor.shutdown(wait=True)
+            self.processor.save_progress()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Offset Highlight Module
+Snippets from the character offsets stored in the index
+
+Whoosh highlights a hit by re-tokenizing its text (up to the highlighter's
+32K character limit) and feeding every token through ContextFragmenter, so
+each hit costs a full pass of the analyzer. Per-PDF indexes that store the
+OCR text also store the character offsets of every content term in its
+postings (TEXT(chars=True)), and snippets are built from them instead:
+
+- the offsets of the query terms in the hit are read from the postings
+- only the text around them is tokenized: the fragmenter only depends on
+  the tokens from the one just before each match's context up to the end
+  of its fragment, so the token stream skips from one match to the next
+  through the text in between
+- the tokens go through Whoosh's own ContextFragmenter, fragment scorer,
+  ordering and formatter
+
+The fragments are the same as hit.highlights() with the same fragmenter:
+skips only start at whitespace, which no token crosses, so the tokens after
+a skip are exactly those of a full pass. The one difference is the choice
+between fragments with the same score, which Whoosh makes by object address
+(Fragment.__lt__ compares id()); here the earliest fragments win.
+"""
+
+import re
+import bisect
+import logging
+from heapq import nlargest
+from whoosh.highlight import BasicFragmentScorer, HtmlFormatter, Highlighter, FIRST, set_matched_filter
+from whoosh.reading import TermNotFound
+
+logger = logging.getLogger(__name__)
+
+LAST_WORD_CHAR = re.compile(r"\w(?=\W*$)")
+WHITESPACE = re.compile(r"\s")
+
+
+def previous_token_end(text, position, floor):
+    """
+    Return the end of the last token before a position (or floor if there is none after it)
+
+    Tokens end with a word character, so this is just after the last word
+    character before the position.
+    """
+    start = position
+    width = 64
+    while start > floor:
+        start = max(floor, start - width)
+        match = LAST_WORD_CHAR.search(text, start, position)
+        if match:
+            return match.end()
+        width *= 4
+    return floor
+
+
+def boundary_before(text, position, floor):
+    """Return the last position at or before `position` right after whitespace (or floor)"""
+    while position > floor:
+        if WHITESPACE.match(text, position - 1):
+            return position
+        position -= 1
+    return floor
+
+
+def token_stream(text, match_starts, words, analyzer, surround):
+    """
+    Yield the tokens ContextFragmenter needs to fragment a text like a full pass
+
+    Args:
+        text (str): Text being highlighted
+        match_starts (list): Sorted start characters of the query term occurrences
+        words (frozenset): Query terms in the field
+        analyzer: The field's analyzer
+        surround (int): Fragmenter context size
+
+    Yields:
+        whoosh.analysis.Token: Tokens with the matched attribute set
+    """
+    position = 0  # Everything before this has been tokenized
+    while True:
+        # Skip to the context of the next match
+        next_match = bisect.bisect_left(match_starts, position)
+        if next_match == len(match_starts):
+            return
+        match_start = match_starts[next_match]
+        # The fragmenter keeps the tokens within `surround` characters of the
+        # last token before the match; older ones are dropped by that token
+        skip_to = boundary_before(text, previous_token_end(text, match_start, position) - surround, position)
+
+        tokens = analyzer(text[skip_to:], positions=True, chars=True, mode="index",
+                          removestops=False, start_char=skip_to)
+        after_match = None  # Token characters since the last match
+        for token in set_matched_filter(tokens, words):
+            # A fragment ends at most 2 * surround token characters after its
+            # last match. The token after the end is still needed: when the
+            # countdown ends at exactly 0 the fragmenter doesn't keep it as context.
+            ended = after_match is not None and after_match >= 2 * surround
+            if token.matched:
+                after_match = 0
+            elif after_match is not None:
+                after_match += token.endchar - token.startchar
+            yield token
+            if ended and not token.matched:
+                position = token.endchar
+                break
+        else:
+            return
+
+
+def top_fragments(fragments, count, scorer, order, minscore=1):
+    """Like whoosh.highlight.top_fragments(), preferring earlier fragments among equal scores"""
+    scored = ((scorer(fragment), -number, fragment) for number, fragment in enumerate(fragments))
+    best = [fragment for score, _, fragment in nlargest(count, scored, key=lambda item: item[:2])
+            if score >= minscore]
+    best.sort(key=order)
+    return best
+
+
+def highlight_from_offsets(text, match_starts, words, analyzer, fragmenter, top=3,
+                           formatter=None, scorer=None, order=FIRST):
+    """
+    Highlight text like whoosh.highlight.Highlighter with a ContextFragmenter
+
+    Args:
+        text (str): Text being highlighted (the indexed text the offsets refer to)
+        match_starts (list): Start characters of the query term occurrences
+        words (frozenset): Query terms in the field
+        analyzer: The field's analyzer
+        fragmenter (whoosh.highlight.ContextFragmenter): Fragmenter to emulate
+        top (int): Number of fragments
+
+    Returns:
+        str: Formatted snippets
+    """
+    match_starts = sorted(start for start in match_starts
+                          if not fragmenter.charlimit or start < fragmenter.charlimit)
+    tokens = token_stream(text, match_starts, words, analyzer, fragmenter.surround)
+    fragments = fragmenter.fragment_tokens(text, Highlighter._merge_matched_tokens(tokens))
+    fragments = top_fragments(fragments, top, scorer or BasicFragmentScorer(), order, minscore=1)
+    return (formatter or HtmlFormatter(tagname="b")).format(fragments)
+
+
+def load_chars(results, fieldname, words, docnums):
+    """
+    Read the character offsets of the query terms in a batch of hits
+
+    Each term's postings are read once, in document order, for the whole
+    batch (like Whoosh's own pinpoint highlighting), and kept in the results.
+
+    Args:
+        results (whoosh.searching.Results): Search results
+        fieldname (str): Highlighted field
+        words (frozenset): Query terms in the field
+        docnums (iterable): Hits to read
+
+    Returns:
+        dict: docnum -> {word: [(pos, startchar, endchar), ...]}
+    """
+    cache = results._char_cache.setdefault(fieldname, {})
+    docnums = sorted(set(docnum for docnum in docnums if docnum not in cache))
+    if not docnums:
+        return cache
+
+    searcher = results.searcher
+    field = searcher.schema[fieldname]
+    for docnum in docnums:
+        cache[docnum] = {}
+    for word in words:
+        try:
+            postings = searcher.postings(fieldname, field.to_bytes(word))
+        except TermNotFound:
+            continue
+        for docnum in docnums:
+            if not postings.is_active():
+                break
+            if postings.id() < docnum:
+                postings.skip_to(docnum)
+            if postings.is_active() and postings.id() == docnum:
+                cache[docnum][word] = postings.value_as("characters")
+    return cache
+
+
+def highlight_hit(hit, fieldname, fragmenter, top=3, docnums=None):
+    """
+    Highlight a hit's stored text from the character offsets in its postings
+
+    Args:
+        hit (whoosh.searching.Hit): Hit to highlight
+        fieldname (str): Stored field with character offsets
+        fragmenter (whoosh.highlight.ContextFragmenter): Fragmenter to emulate
+        top (int): Number of fragments
+        docnums (list): The hits that are going to be highlighted, whose
+            offsets are read together (default: this hit only)
+
+    Returns:
+        str: The snippets hit.highlights(fieldname, top=top) gives with the
+        same fragmenter
+    """
+    results = hit.results
+    highlighter = results.highlighter
+    field = hit.searcher.schema[fieldname]
+    # The terms Highlighter.highlight_hit() highlights
+    if results.has_matched_terms():
+        terms = (term for term in results.matched_terms() if term[0] == fieldname)
+    else:
+        terms = results.query_terms(expand=True, fieldname=fieldname)
+    words = frozenset(field.from_bytes(term[1]) for term in terms)
+    text = hit[fieldname]
+    chars = load_chars(results, fieldname, words, list(docnums or ()) + [hit.docnum])[hit.docnum]
+    starts = [startchar for offsets in chars.values() for _, startchar, _ in offsets]
+    return highlight_from_offsets(text, starts, words, field.analyzer, fragmenter, top=top,
+                                  formatter=highlighter.formatter, scorer=highlighter.scorer,
+                                  order=highlighter.order)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Page Preview Module
+Single pages of PDFs, extracted or rendered, with an on-disk LRU cache
+
+Seeing one hit shouldn't take downloading a whole multi-MB PDF, so the
+search apps serve single pages:
+
+    GET /page/<page>/<filename>?format=webp&width=1000
+
+- format=webp (default) or png: the page rendered at `width` pixels
+  (default DEFAULT_WIDTH, rounded to WIDTH_STEP between MIN_WIDTH and
+  MAX_WIDTH so a few sizes cover every request)
+- format=pdf: the page extracted as a one-page PDF, text layer included
+
+The "Matching pages" links of the results go to these previews.
+
+Pages are extracted with Poppler's pdfseparate and rendered with pdftoppm
+(through pdf2image), the tools the OCR already uses. Without them (or
+without Pillow's WebP support) the endpoint answers 501 and the results
+link to the whole PDF as before.
+
+Extracted and rendered pages are kept in a cache directory shared by all
+processes, bounded by size: files are named after the PDF's content hash
+(see pdf_delivery.ContentHashes), so a changed PDF never serves stale pages;
+every hit touches the file's modification time, and once the directory
+outgrows its bound the least recently used files are deleted down to
+EVICT_TO of it. Pages are sent with the cache headers of PDFs (ETag,
+max-age).
+"""
+
+import io
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from flask import Blueprint, current_app, request, send_file
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+except ImportError:
+    convert_from_path = pdfinfo_from_path = None
+
+try:
+    from PIL import features
+except ImportError:
+    features = None
+
+# Windows Poppler location, if configured for the OCR
+try:
+    import ocr_config
+except ImportError:
+    ocr_config = None
+POPPLER_PATH = getattr(ocr_config, "POPPLER_PATH", None)
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_FORMATS = {"webp": "image/webp", "png": "image/png", "pdf": "application/pdf"}
+DEFAULT_FORMAT = "webp"
+DEFAULT_WIDTH = 1000
+MIN_WIDTH = 200
+MAX_WIDTH = 2000
+WIDTH_STEP = 100
+WEBP_QUALITY = 75
+
+# Fraction of the size bound the cache is trimmed to when it outgrows it
+EVICT_TO = 0.9
+
+# Seconds Poppler may take on one page
+POPPLER_TIMEOUT = 60
+
+
+class PreviewUnavailable(Exception):
+    """The tools to extract or render pages are missing"""
+
+
+class PageCache:
+    def __init__(self, cache_dir="page_cache", max_mb=256):
+        """
+        On-disk LRU cache of extracted and rendered pages
+
+        Args:
+            cache_dir (str): Cache directory (can be shared by several processes)
+            max_mb (float): Size bound of the cached files, in MB
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.size = sum(size for _, _, size in self.files())
+
+    def files(self):
+        """Return the cached files as (mtime, name, size), least recently used first"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith("."):  # Being written
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # Evicted by another process
+                continue
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        files.sort()
+        return files
+
+    def get(self, key):
+        """Return the path of a cached page, or None"""
+        path = os.path.join(self.cache_dir, key)
+        try:
+            os.utime(path)  # Most recently used, for every process
+            hit = True
+        except FileNotFoundError:
+            hit = False
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return path if hit else None
+
+    def put(self, key, data):
+        """Cache a page, evicting the least recently used; return its path (None if too large)"""
+        if len(data) > self.max_bytes:
+            return None
+        path = os.path.join(self.cache_dir, key)
+        temp_path = os.path.join(self.cache_dir, f".{key}.{os.getpid()}.{threading.get_ident()}")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict(keep=key)
+        return path
+
+    def _evict(self, keep):
+        # Other processes write to the directory too: go by what is on disk
+        files = self.files()
+        self.size = sum(size for _, _, size in files)
+        for _, name, size in files:
+            if self.size <= self.max_bytes * EVICT_TO:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"bytes": self.size, "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+class PagePreviews:
+    def __init__(self, hashes, cache, poppler_path=POPPLER_PATH):
+        """
+        Extract and render single pages of PDFs
+
+        Args:
+            hashes (pdf_delivery.ContentHashes): Content hashes of the PDFs (cache keys)
+            cache (PageCache): Cache of extracted and rendered pages
+            poppler_path (str): Directory of the Poppler tools (default: on the PATH)
+        """
+        self.hashes = hashes
+        self.cache = cache
+        self.poppler_path = poppler_path if poppler_path and os.path.isdir(poppler_path) else None
+        self.page_counts = {}  # content hash -> number of pages
+        self.formats = {}  # format -> whether it is available
+
+    def tool(self, name):
+        """Return the path of a Poppler tool, or None"""
+        return shutil.which(name, path=self.poppler_path)
+
+    def available(self, fmt=DEFAULT_FORMAT):
+        """Whether pages can be served in a format"""
+        if fmt not in self.formats:
+            tools = ["pdfinfo", "pdfseparate" if fmt == "pdf" else "pdftoppm"]
+            available = pdfinfo_from_path is not None and all(self.tool(tool) for tool in tools)
+            if fmt == "webp":
+                available = available and features is not None and features.check("webp")
+            self.formats[fmt] = available
+        return self.formats[fmt]
+
+    def page_count(self, path, digest):
+        """Return the number of pages of a PDF"""
+        count = self.page_counts.get(digest)
+        if count is None:
+            info = pdfinfo_from_path(path, poppler_path=self.poppler_path, timeout=POPPLER_TIMEOUT)
+            count = self.page_counts[digest] = int(info["Pages"])
+        return count
+
+    def page(self, path, page, fmt=DEFAULT_FORMAT, width=DEFAULT_WIDTH):
+        """
+        Return a page of a PDF, from the cache or extracted/rendered into it
+
+        Args:
+            path (str): PDF file
+            page (int): 1-based page number
+            fmt (str): One of PREVIEW_FORMATS
+            width (int): Image width in pixels (rounded to WIDTH_STEP, ignored for PDF)
+
+        Returns:
+            tuple: (cache key, path of the cached file or None, data or None):
+            the data is only returned when it is too large to cache
+
+        Raises:
+            PreviewUnavailable: If the tools for the format are missing
+            ValueError: If the page number is out of range
+        """
+        if not self.available(fmt):
+            raise PreviewUnavailable(f"Page previews in {fmt} are not available on this server "
+                                     "(they need Poppler, pdf2image and Pillow)")
+        digest = self.hashes.get(path)
+        if fmt == "pdf":
+            key = f"{digest[:32]}-{page}.pdf"
+        else:
+            width = min(max(round(width / WIDTH_STEP) * WIDTH_STEP, MIN_WIDTH), MAX_WIDTH)
+            key = f"{digest[:32]}-{page}-{width}.{fmt}"
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return key, cached, None
+
+        pages = self.page_count(path, digest)
+        if not 1 <= page <= pages:
+            raise ValueError(f"Page {page} out of range (1-{pages})")
+
+        data = self.extract(path, page) if fmt == "pdf" else self.render(path, page, fmt, width)
+        return key, self.cache.put(key, data), data
+
+    def extract(self, path, page):
+        """Return a page of a PDF as a one-page PDF"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            subprocess.run([self.tool("pdfseparate"), "-f", str(page), "-l", str(page), path,
+                            os.path.join(temp_dir, "page-%d.pdf")],
+                           check=True, capture_output=True, timeout=POPPLER_TIMEOUT)
+            with open(os.path.join(temp_dir, f"page-{page}.pdf"), "rb") as f:
+                return f.read()
+
+    def render(self, path, page, fmt, width):
+        """Return a page of a PDF rendered as an image"""
+        images = convert_from_path(path, first_page=page, last_page=page, size=(width, None),
+                                   poppler_path=self.poppler_path, timeout=POPPLER_TIMEOUT)
+        if not images:
+            raise ValueError(f"Page {page} out of range")
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            images[0].save(buffer, format="WEBP", quality=WEBP_QUALITY)
+        else:
+            images[0].save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+
+def create_page_routes(get_previews, find_pdf, get_max_age):
+    """
+    Create the page preview blueprint
+
+    Args:
+        get_previews (callable): Returns the app's PagePreviews
+        find_pdf (callable): Returns the path of a PDF from its filename, or None
+        get_max_age (callable): Returns the seconds browsers may cache a page
+
+    Returns:
+        flask.Blueprint: The /page/<page>/<filename> route
+    """
+    pages = Blueprint("pages", __name__)
+
+    @pages.route("/page/<int:page>/<path:filename>")
+    def view_page(page, filename):
+        """Serve one page of a PDF, extracted or rendered"""
+        fmt = request.args.get("format", DEFAULT_FORMAT).lower()
+        if fmt not in PREVIEW_FORMATS:
+            return f"Unknown format: {fmt} (use {', '.join(PREVIEW_FORMATS)})", 400
+        try:
+            width = int(request.args.get("width", DEFAULT_WIDTH))
+        except ValueError:
+            return "Invalid width", 400
+
+        pdf_path = find_pdf(filename)
+        if not pdf_path:
+            return "PDF file not found", 404
+        pdf_path = os.path.join(current_app.root_path, pdf_path)
+        try:
+            key, cached, data = get_previews().page(pdf_path, page, fmt, width)
+        except PreviewUnavailable as e:
+            return str(e), 501
+        except ValueError as e:
+            return str(e), 404
+        except Exception as e:
+            logger.error(f"Error previewing page {page} of {filename}: {e}")
+            return f"Error: Could not extract page {page}. {str(e)}", 500
+
+        name = f"{os.path.splitext(os.path.basename(filename))[0]}-page-{page}.{fmt}"
+        return send_file(cached if cached else io.BytesIO(data), mimetype=PREVIEW_FORMATS[fmt],
+                         download_name=name, conditional=True, etag=key,
+                         max_age=get_max_age())
+
+    return pages
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - PDF Catalog Module
+Prebuilt lookup table from document IDs to PDF files
+
+The /view and /page routes find a PDF from the ID in their link. Instead of
+probing every PDF directory with os.path.exists() on each request (the local
+app) or loading pdf_mappings.json into every worker (the deployed app), both
+look it up in a SQLite file built once from the PDF directories:
+
+    pdfs (doc_id TEXT PRIMARY KEY, dir INTEGER, size INTEGER) WITHOUT ROWID
+    dirs (id INTEGER PRIMARY KEY, path TEXT)
+    shared (name TEXT, rank INTEGER, doc_id TEXT, PRIMARY KEY (name, rank)) WITHOUT ROWID
+
+- doc_id is the PDF's filename, unless several PDFs share that filename:
+  each of them then gets the name of its PDF directory (and subdirectories)
+  in front, e.g. "rfk/report.pdf" and "mlk/report.pdf", and is listed in
+  "shared" in directory order. Looking up the bare filename finds the copy
+  in the first directory.
+- the PDF is the file named like the end of its doc_id in its directory
+  ("dirs"), whose path is relative to the catalog file so a deployment can
+  be moved; lookups return absolute paths.
+
+Each filename is stored once, in a table sorted by doc_id: 100,000 PDFs take
+about 8 MB on disk, which every worker reads through the shared page cache
+instead of holding its own dict.
+
+Results link to the doc_id of their PDF (see PDFCatalog.doc_id_for): for
+shared filenames, the copy whose directories best match the PDF path stored
+in the index.
+
+The local search app rebuilds its catalog from its PDF directories whenever
+the index generation changes (new documents come with new PDFs). The deployed
+app uses the catalog written by prepare_for_deployment.py and reopens it when
+the index generation changes, in case it was replaced along with the index.
+
+    python pdf_catalog.py downloads/rfk downloads/mlk --catalog pdf_catalog.sqlite3
+
+builds a catalog from the command line, and "--find <filename>" looks one up.
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = "pdf_catalog.sqlite3"
+
+
+def scan(roots):
+    """
+    Find the PDFs under some directories and give each a document ID
+
+    Args:
+        roots (list): PDF directories, in lookup order (a file found under
+            several of them is listed once, under the first)
+
+    Returns:
+        list: (doc_id, name, path, size) tuples in directory order
+    """
+    found = []  # (root, relative path, path, size)
+    seen = set()
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        for dirpath, dirnames, files in os.walk(root):
+            dirnames.sort()
+            for file in sorted(files):
+                if not file.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(dirpath, file)
+                real_path = os.path.realpath(path)
+                if real_path in seen:
+                    continue
+                seen.add(real_path)
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                found.append((root, relative, os.path.abspath(path), os.path.getsize(path)))
+
+    names = Counter(os.path.basename(relative) for _, relative, _, _ in found)
+    entries = []
+    doc_ids = set()
+    for root, relative, path, size in found:
+        name = os.path.basename(relative)
+        doc_id = name
+        if names[name] > 1:
+            label = os.path.basename(os.path.normpath(os.path.abspath(root)))
+            doc_id = f"{label}/{relative}"
+            number = 2
+            while doc_id in doc_ids:  # Directories with the same name
+                doc_id = f"{label}-{number}/{relative}"
+                number += 1
+        doc_ids.add(doc_id)
+        entries.append((doc_id, name, path, size))
+
+    shared = sum(1 for count in names.values() if count > 1)
+    if shared:
+        logger.info(f"{shared} PDF filenames are shared by several files; their IDs include their directory")
+    return entries
+
+
+def write_catalog(path, entries):
+    """
+    Write a catalog file (replacing any previous one atomically)
+
+    Args:
+        path (str): Catalog file
+        entries (list): (doc_id, name, path, size) tuples in directory order,
+            as from scan(); each PDF's filename must end its doc_id
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    dirs = {}  # directory -> id
+    rows = []
+    shared = []
+    names = Counter(name for _, name, _, _ in entries)
+    ranks = Counter()
+    for doc_id, name, pdf_path, size in entries:
+        directory = os.path.dirname(os.path.abspath(pdf_path))
+        try:
+            directory = os.path.relpath(directory, base)
+        except ValueError:  # Another drive (Windows)
+            pass
+        rows.append((doc_id, dirs.setdefault(directory.replace(os.sep, "/"), len(dirs)), size))
+        if names[name] > 1:
+            shared.append((name, ranks[name], doc_id))
+            ranks[name] += 1
+
+    db = sqlite3.connect(temp_path)
+    try:
+        with db:
+            db.execute("CREATE TABLE pdfs (doc_id TEXT PRIMARY KEY, dir INTEGER NOT NULL, "
+                       "size INTEGER NOT NULL) WITHOUT ROWID")
+            db.execute("CREATE TABLE dirs (id INTEGER PRIMARY KEY, path TEXT NOT NULL)")
+            db.execute("CREATE TABLE shared (name TEXT NOT NULL, rank INTEGER NOT NULL, doc_id TEXT NOT NULL, "
+                       "PRIMARY KEY (name, rank)) WITHOUT ROWID")
+            db.executemany("INSERT INTO pdfs (doc_id, dir, size) VALUES (?, ?, ?)", sorted(rows))
+            db.executemany("INSERT INTO dirs (id, path) VALUES (?, ?)",
+                           [(number, directory) for directory, number in dirs.items()])
+            db.executemany("INSERT INTO shared (name, rank, doc_id) VALUES (?, ?, ?)", shared)
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    os.replace(temp_path, path)
+    logger.info(f"Wrote PDF catalog of {len(rows)} PDFs to {path}")
+
+
+def path_match(index_path, pdf_path):
+    """Return how many trailing path components two paths share"""
+    index_parts = os.path.normpath(index_path).split(os.sep)[::-1]
+    pdf_parts = os.path.normpath(pdf_path).split(os.sep)[::-1]
+    shared = 0
+    for index_part, pdf_part in zip(index_parts, pdf_parts):
+        if index_part != pdf_part:
+            break
+        shared += 1
+    return shared
+
+
+class PDFCatalog:
+    def __init__(self, path=CATALOG_FILENAME, roots=None):
+        """
+        Lookup table from document IDs to PDF files
+
+        Args:
+            path (str): Catalog file
+            roots (list): PDF directories to build the catalog from, in lookup
+                order (None: use the catalog file as it is)
+        """
+        self.path = path
+        self.base = os.path.dirname(os.path.abspath(path))
+        self.roots = roots
+        self.generation = None
+        self.version = 0  # Incremented when the file is rebuilt or replaced
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._signature = None
+        self.refresh()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def refresh(self):
+        """Rebuild the catalog from its directories, or reopen the file if it was replaced"""
+        if self.roots is not None:
+            self.build()
+        signature = self._file_signature()
+        if signature != self._signature:
+            if signature is None:
+                logger.warning(f"PDF catalog {self.path} not found. PDF viewing will be disabled.")
+            self._signature = signature
+            self.version += 1
+
+    def build(self):
+        """Rebuild the catalog file from its directories"""
+        write_catalog(self.path, scan(self.roots))
+
+    def for_generation(self, generation):
+        """Return the catalog, refreshed first if the index generation changed since the last call"""
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    if self.generation is not None:
+                        self.refresh()
+                    self.generation = generation
+        return self
+
+    def connection(self):
+        """Return this thread's read-only connection to the current file (None if there is none)"""
+        local = self._local
+        if getattr(local, "version", None) != self.version:
+            if getattr(local, "db", None) is not None:
+                local.db.close()
+            local.db = None
+            local.version = self.version
+            if self._signature is not None:
+                try:
+                    uri = "file:" + os.path.abspath(self.path).replace("?", "%3f").replace("#", "%23") + "?mode=ro"
+                    local.db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                    local.dirs = {number: os.path.normpath(os.path.join(self.base, directory))
+                                  for number, directory in local.db.execute("SELECT id, path FROM dirs")}
+                except sqlite3.Error as e:
+                    logger.error(f"Could not open PDF catalog {self.path}: {e}")
+                    local.db = None
+        return local.db
+
+    def close_handles(self):
+        """Close this thread's connection and drop every thread's (before forking worker processes)"""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+        self._local = threading.local()
+
+    def find(self, doc_id):
+        """
+        Look up a PDF
+
+        Args:
+            doc_id (str): Document ID, or a bare filename
+
+        Returns:
+            tuple: (absolute path, size), or None if it isn't in the catalog
+        """
+        db = self.connection()
+        if db is None:
+            return None
+        row = db.execute("SELECT dir, size FROM pdfs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            # A bare filename shared by several PDFs: the copy in the first directory
+            first = db.execute("SELECT doc_id FROM shared WHERE name = ? ORDER BY rank LIMIT 1",
+                               (doc_id,)).fetchone()
+            if first is None:
+                return None
+            doc_id = first[0]
+            row = db.execute("SELECT dir, size FROM pdfs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return os.path.join(self._local.dirs[row[0]], doc_id.rsplit("/", 1)[-1]), row[1]
+
+    def find_path(self, doc_id):
+        """Return the absolute path of a PDF, or None"""
+        found = self.find(doc_id)
+        return found[0] if found else None
+
+    def doc_id_for(self, filename, index_path=None):
+        """
+        Return the document ID of a search hit's PDF
+
+        Args:
+            filename (str): The hit's filename
+            index_path (str): The PDF path stored in the index, which picks
+                the copy of a shared filename
+
+        Returns:
+            str: Document ID, or None if the PDF isn't in the catalog
+        """
+        db = self.connection()
+        if db is None:
+            return None
+        doc_ids = [row[0] for row in db.execute("SELECT doc_id FROM shared WHERE name = ? ORDER BY rank",
+                                                (filename,))]
+        if not doc_ids:
+            found = db.execute("SELECT 1 FROM pdfs WHERE doc_id = ?", (filename,)).fetchone()
+            return filename if found else None
+        if not index_path:
+            return doc_ids[0]
+        # max() keeps the first of equal matches: the copy in the first directory
+        return max(doc_ids, key=lambda doc_id: path_match(index_path, self.find(doc_id)[0]))
+
+    def __len__(self):
+        db = self.connection()
+        return db.execute("SELECT count(*) FROM pdfs").fetchone()[0] if db is not None else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the PDF catalog (document ID -> PDF file lookup table)")
+    parser.add_argument("dirs", nargs="*", help="PDF directories, in lookup order")
+    parser.add_argument("--catalog", default=CATALOG_FILENAME, help="Catalog file")
+    parser.add_argument("--find", help="Look up a document ID or filename instead of building")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.find:
+        found = PDFCatalog(args.catalog).find(args.find)
+        if not found:
+            print(f"{args.find} is not in {args.catalog}")
+            return 1
+        print(f"{found[0]} ({found[1]} bytes)")
+        return 0
+    if not args.dirs:
+        parser.error("PDF directories are required to build a catalog")
+    PDFCatalog(args.catalog, roots=args.dirs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
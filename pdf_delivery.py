@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - PDF Delivery Module
+Serve PDFs with byte ranges, content-hash ETags and cache headers
+
+The viewer (PDF.js in the browser) loads large PDFs incrementally with Range
+requests and revalidates them with If-None-Match, so PDFDelivery.send():
+
+- answers Range / If-Range requests with 206 partial content (Flask's
+  send_file), so only the pages being viewed are downloaded
+- tags every PDF with a strong ETag, the SHA-256 of its content: unlike
+  Flask's default (mtime, size and name), it is the same on every server
+  and after every deployment, so browser and proxy caches stay valid
+- answers a matching If-None-Match / If-Modified-Since with 304
+- lets browsers and proxies cache PDFs for max_age seconds (public)
+
+Content hashes are read from a hash file written when the PDFs are deployed
+(prepare_for_deployment.py, or "python pdf_delivery.py --hash-file
+pdf_hashes.json <dirs>"), or computed on the first request for a PDF and
+kept in memory.
+
+With an offload mode the Python worker only checks the request and answers
+with headers; a front proxy then streams the file itself (ranges included):
+
+- "x-accel-redirect" (nginx): the file is served from an internal location,
+  accel_prefix + its path relative to accel_root
+- "x-sendfile" (Apache mod_xsendfile, lighttpd): the proxy reads the absolute path
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import logging
+import threading
+from urllib.parse import quote
+from flask import Response, current_app, request, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import dump_options_header
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_MODES = ("x-accel-redirect", "x-sendfile")
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path):
+    """Return the SHA-256 of a file, as hex"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_hash_file(hash_file, paths):
+    """
+    Hash PDFs into a hash file
+
+    Args:
+        hash_file (str): JSON file to write, {path: [size, sha256]} with paths
+            relative to its directory
+        paths (iterable): PDF files
+    """
+    base = os.path.dirname(os.path.abspath(hash_file))
+    hashes = {}
+    for path in paths:
+        hashes[os.path.relpath(os.path.abspath(path), base)] = [os.path.getsize(path), file_digest(path)]
+    with open(hash_file, "w") as f:
+        json.dump(hashes, f)
+    logger.info(f"Wrote the content hashes of {len(hashes)} PDFs to {hash_file}")
+    return len(hashes)
+
+
+class ContentHashes:
+    def __init__(self, hash_file=None):
+        """
+        SHA-256 content hashes of PDFs
+
+        Args:
+            hash_file (str): Hash file written by write_hash_file(); PDFs it
+                does not list (or whose size changed) are hashed on first use
+        """
+        self.precomputed = {}  # absolute path -> (size, sha256)
+        self.computed = {}  # absolute path -> (size, mtime, sha256)
+        self.lock = threading.Lock()
+        if hash_file and os.path.exists(hash_file):
+            base = os.path.dirname(os.path.abspath(hash_file))
+            try:
+                with open(hash_file) as f:
+                    for path, (size, digest) in json.load(f).items():
+                        self.precomputed[os.path.normpath(os.path.join(base, path))] = (size, digest)
+                logger.info(f"Loaded {len(self.precomputed)} PDF content hashes")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read PDF content hashes from {hash_file}: {e}")
+
+    def get(self, path, stat=None):
+        """Return the SHA-256 of a PDF"""
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        # Deployments don't keep modification times: precomputed hashes are checked by size
+        precomputed = self.precomputed.get(path)
+        if precomputed is not None and precomputed[0] == stat.st_size:
+            return precomputed[1]
+        with self.lock:
+            computed = self.computed.get(path)
+        if computed is not None and computed[:2] == (stat.st_size, stat.st_mtime_ns):
+            return computed[2]
+        digest = file_digest(path)
+        with self.lock:
+            self.computed[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+
+class PDFDelivery:
+    def __init__(self, hashes=None, max_age=86400, offload=None, accel_prefix="/internal-pdfs/", accel_root="."):
+        """
+        Args:
+            hashes (ContentHashes): Content hashes (default: computed on first use)
+            max_age (int): Seconds browsers and proxies may cache a PDF without revalidating it
+            offload (str): None, or one of OFFLOAD_MODES to let the front proxy send the file
+            accel_prefix (str): nginx internal location of the PDFs (x-accel-redirect)
+            accel_root (str): Directory that location serves, relative to the
+                app's root (x-accel-redirect)
+        """
+        if offload and offload not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown PDF offload mode: {offload} (use {', '.join(OFFLOAD_MODES)})")
+        self.hashes = hashes or ContentHashes()
+        self.max_age = max_age
+        self.offload = offload or None
+        self.accel_prefix = "/" + accel_prefix.strip("/") + "/"
+        self.accel_root = accel_root
+
+    def send(self, path, download_name):
+        """
+        Return the response to a request for a PDF (in a Flask request)
+
+        Args:
+            path (str): PDF file (relative paths are relative to the app's
+                root, as with flask.send_file)
+            download_name (str): Filename shown by the browser
+
+        Returns:
+            flask.Response: The PDF, part of it (206), 304, or 416 for a
+            range past the end of the file
+
+        Raises:
+            OSError: If the file cannot be read
+        """
+        path = os.path.join(current_app.root_path, path)
+        stat = os.stat(path)
+        etag = self.hashes.get(path, stat)
+        if self.offload:
+            return self.offloaded(path, download_name, etag, stat)
+        return self.send_directly(path, download_name, etag, stat)
+
+    def send_directly(self, path, download_name, etag, stat):
+        """Send the file from Python (ranges, conditional requests)"""
+        try:
+            return send_file(path, mimetype="application/pdf", download_name=download_name,
+                             conditional=True, etag=etag, max_age=self.max_age, last_modified=stat.st_mtime)
+        except RequestedRangeNotSatisfiable as e:
+            # A range past the end of the file: 416, with the file's length
+            return e.get_response(request.environ)
+
+    def offloaded(self, path, download_name, etag, stat):
+        """Headers-only response for the front proxy to fill in"""
+        response = Response(mimetype="application/pdf")
+        response.automatically_set_content_length = False  # The proxy sets the file's length
+        if self.offload == "x-accel-redirect":
+            relative = os.path.relpath(path, os.path.join(current_app.root_path, self.accel_root))
+            if relative.startswith(".."):
+                logger.warning(f"{path} is outside the offloaded directory {self.accel_root}, sending it directly")
+                return self.send_directly(path, download_name, etag, stat)
+            response.headers["X-Accel-Redirect"] = self.accel_prefix + quote(relative.replace(os.sep, "/"))
+        else:
+            response.headers["X-Sendfile"] = path
+        response.headers["Content-Disposition"] = dump_options_header("inline", {"filename": download_name})
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            # Some proxies send the file anyway
+            response.headers.pop("X-Accel-Redirect", None)
+            response.headers.pop("X-Sendfile", None)
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the content hashes (ETags) of PDFs")
+    parser.add_argument("dirs", nargs="+", help="Directories of PDFs")
+    parser.add_argument("--hash-file", default="pdf_hashes.json", help="Hash file to write (paths are "
+                                                                       "relative to its directory)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    paths = [os.path.join(root, name) for directory in args.dirs for root, _, files in os.walk(directory)
+             for name in files if name.lower().endswith(".pdf")]
+    write_hash_file(args.hash_file, paths)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
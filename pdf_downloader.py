@@ -78,13 +78,15 @@ class PDFDownloader:
             # Get total size for progress bar
             total_size = int(response.headers.get('content-length', 0))
             
-            # Write the file with progress bar
-            with open(file_path, 'wb') as f:
+            # Write to a .part file and rename when complete, so watchers never see a half-written PDF
+            part_path = file_path + ".part"
+            with open(part_path, 'wb') as f:
                 with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename) as pbar:
                     for chunk in response.iter_content(chunk_size=8192):
                         if chunk:
                             f.write(chunk)
                             pbar.update(len(chunk))
+            os.replace(part_path, file_path)
             
             logger.info(f"Successfully downloaded {filename}")
             return file_path
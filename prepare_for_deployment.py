@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 """
 GovDocHarvester - Deployment Preparation Script
-Prepares the search index and document mappings for web deployment
+Prepares the search index and PDF catalog for web deployment
 """
 
 import os
 import sys
-import json
 import shutil
 import argparse
 import logging
 from pathlib import Path
+from index_store import IndexStore
+from pdf_delivery import write_hash_file
+from pdf_catalog import scan, write_catalog, CATALOG_FILENAME
 
 # Set up logging
 logging.basicConfig(
@@ -27,56 +29,60 @@ def prepare_for_deployment(output_dir="deploy", include_pdfs=False, pdf_dir=None
         output_dir (str): Directory to save deployment files
         include_pdfs (bool): Whether to include PDF files in deployment
         pdf_dir (str): Directory containing PDF files to include
-        search_index_dir (str): Directory containing Whoosh search index
+        search_index_dir (str): Directory containing the search index
         ocr_text_dir (str): Directory containing OCR text files
     """
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     logger.info(f"Creating deployment files in {output_dir}")
     
-    # Copy search index
+    # Copy the published search index generation
     index_output_dir = os.path.join(output_dir, "search_index")
-    if os.path.exists(search_index_dir):
-        logger.info(f"Copying search index from {search_index_dir} to {index_output_dir}")
+    index_store = IndexStore(search_index_dir)
+    if index_store.exists():
+        current_dir = index_store.current_dir()
+        logger.info(f"Copying search index from {current_dir} to {index_output_dir}")
         if os.path.exists(index_output_dir):
             shutil.rmtree(index_output_dir)
-        shutil.copytree(search_index_dir, index_output_dir)
+        shutil.copytree(current_dir, index_output_dir,
+                        ignore=shutil.ignore_patterns("generations", "CURRENT"))
+        
+        # A slim index has no stored text, so snippets need the OCR text alongside it
+        if not index_store.backend().layout(current_dir)["store_content"]:
+            text_output_dir = os.path.join(output_dir, "ocr_text")
+            logger.info(f"Slim index: copying OCR text from {ocr_text_dir} to {text_output_dir}")
+            if os.path.exists(text_output_dir):
+                shutil.rmtree(text_output_dir)
+            shutil.copytree(ocr_text_dir, text_output_dir,
+                            ignore=shutil.ignore_patterns("*.boxes", ".ocr_progress.json"))
     else:
         logger.error(f"Search index directory not found: {search_index_dir}")
         return False
     
-    # Create PDF mappings (empty if no PDFs included)
-    pdf_mappings = {}
+    # PDF catalog (empty if no PDFs included): document ID -> deployed PDF
+    catalog = []
     
     if include_pdfs and pdf_dir:
         # Create PDFs directory in output
         pdfs_output_dir = os.path.join(output_dir, "pdfs")
         os.makedirs(pdfs_output_dir, exist_ok=True)
         
-        # Find all PDF files
+        # Find all PDF files; PDFs sharing a filename get their directory in their ID
         logger.info(f"Scanning for PDF files in {pdf_dir}")
-        pdf_count = 0
-        for root, _, files in os.walk(pdf_dir):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    pdf_path = os.path.join(root, file)
-                    
-                    # Copy PDF to output dir
-                    output_path = os.path.join(pdfs_output_dir, file)
-                    shutil.copy2(pdf_path, output_path)
-                    
-                    # Add to mappings (using relative path for deployment)
-                    pdf_mappings[file] = os.path.join("pdfs", file)
-                    pdf_count += 1
+        for doc_id, name, pdf_path, size in scan([pdf_dir]):
+            # Copy PDF to output dir, under its document ID
+            output_path = os.path.join(pdfs_output_dir, *doc_id.split("/"))
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.copy2(pdf_path, output_path)
+            catalog.append((doc_id, name, output_path, size))
         
-        logger.info(f"Included {pdf_count} PDF files for deployment")
-    
-    # Write the PDF mappings file
-    mapping_path = os.path.join(output_dir, "pdf_mappings.json")
-    with open(mapping_path, 'w') as f:
-        json.dump(pdf_mappings, f)
+        logger.info(f"Included {len(catalog)} PDF files for deployment")
+        
+        # Precompute the content hashes served as ETags, so the web app never hashes a PDF
+        write_hash_file(os.path.join(output_dir, "pdf_hashes.json"), [path for _, _, path, _ in catalog])
     
-    logger.info(f"Created PDF mappings file with {len(pdf_mappings)} entries")
+    # Write the PDF catalog (paths relative to the deployment)
+    write_catalog(os.path.join(output_dir, CATALOG_FILENAME), catalog)
     
     # Copy template directory if it exists
     template_dir = "templates"
@@ -97,7 +103,7 @@ def prepare_for_deployment(output_dir="deploy", include_pdfs=False, pdf_dir=None
         shutil.copytree(static_dir, static_output_dir)
     
     # Copy web app files
-    for file in ["web_app.py", "Procfile", "requirements_web.txt"]:
+    for file in ["web_app.py", "search_core.py", "search_backend.py", "index_store.py", "text_store.py", "term_trigrams.py", "doc_metadata.py", "result_cache.py", "offset_highlight.py", "search_api.py", "result_export.py", "pdf_delivery.py", "page_preview.py", "pdf_catalog.py", "gunicorn.conf.py", "warmup_queries.txt", "Procfile", "start.sh", "requirements_web.txt"]:
         if os.path.exists(file):
             logger.info(f"Copying {file} to deployment directory")
             shutil.copy2(file, os.path.join(output_dir, file))
@@ -119,10 +125,27 @@ This application is ready for deployment on platforms like Render, Railway, or H
 ## File Structure
 
 - `web_app.py` - The main Flask application
-- `search_index/` - The Whoosh search index
+- `search_core.py` - Search logic shared with the local search app
+- `search_backend.py` - Whoosh and SQLite FTS5 search backends
+- `index_store.py` - Opens the current search index generation
+- `text_store.py` - Reads OCR text for snippets (slim indexes)
+- `term_trigrams.py` - Trigram lookup for fuzzy and wildcard queries
+- `doc_metadata.py` - Metadata filters and sorting (file number, section, date...)
+- `result_cache.py` - Search result cache (`SEARCH_CACHE_MB`, default 64; `SEARCH_CACHE_FILE` shares it between workers)
+- `offset_highlight.py` - Snippets from the word offsets stored in the index
+- `search_api.py` - JSON search API with cursor pagination
+- `result_export.py` - Streaming export of all the results of a query
+- `pdf_delivery.py` - PDF serving with byte ranges, ETags and cache headers (`PDF_MAX_AGE`, `PDF_OFFLOAD`)
+- `page_preview.py` - Single-page previews of the PDFs (needs Poppler, pdf2image and Pillow; `PAGE_CACHE_MB`, default 256)
+- `ocr_text/` - OCR text (only for slim indexes, which don't store it)
+- `search_index/` - The search index (Whoosh or SQLite FTS5)
 - `templates/` - HTML templates
 - `pdfs/` - PDF documents (if included)
-- `pdf_mappings.json` - Mapping of document filenames to paths
+- `pdf_catalog.py` - Lookup of PDFs by document ID
+- `pdf_catalog.sqlite3` - Document IDs, paths and sizes of the PDFs
+- `pdf_hashes.json` - Content hashes of the PDFs (their ETags)
+- `gunicorn.conf.py` - Server settings: the index is loaded and warmed up once, then shared by the workers (`WEB_CONCURRENCY`)
+- `warmup_queries.txt` - Queries run before serving, one per line (optional)
 - `requirements.txt` - Python package dependencies
 """)
     
@@ -135,6 +158,7 @@ def main():
     parser.add_argument("--include-pdfs", action="store_true", help="Include PDF files in deployment")
     parser.add_argument("--pdf-dir", help="Directory containing PDF files (required if --include-pdfs is used)")
     parser.add_argument("--search-index", default="search_index", help="Directory containing search index")
+    parser.add_argument("--ocr-text", default="ocr_text", help="Directory containing OCR text (shipped with slim indexes)")
     
     args = parser.parse_args()
     
@@ -149,7 +173,8 @@ def main():
         output_dir=args.output,
         include_pdfs=args.include_pdfs,
         pdf_dir=args.pdf_dir,
-        search_index_dir=args.search_index
+        search_index_dir=args.search_index,
+        ocr_text_dir=args.ocr_text
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Result Cache Module
+Cache of search results in front of SearchCore.search()
+
+Most traffic repeats a few dozen queries, and each search runs the query and
+highlights every hit again. Results are cached per normalized query, page,
+page size, metadata filters and sort order (and the snippets of each hit
+loaded later by the results page, per query and hit), and tagged with the
+index generation they came from: once a new generation is published (or the
+index is updated in place) older results are never served and are dropped.
+
+Two caches, both bounded by the pickled size of the results, evicting the
+least recently used:
+
+- ResultCache: in this process only
+- SQLiteResultCache: a SQLite file shared by all processes on the machine
+  (e.g. every gunicorn worker), so a query cached by one worker is a hit in
+  all of them
+
+Both count hits and misses (all processes together for the shared cache)
+and log the hit ratio every STATS_EVERY lookups.
+
+A hit in the shared cache is read-only, so processes don't queue for the
+database's write lock just to read: entries' last use is only updated once
+it is TOUCH_SECONDS old (roughly least recently used is enough), and each
+process adds its hit and miss counts to the shared counters every
+COUNTER_FLUSH_SECONDS.
+"""
+
+import json
+import time
+import atexit
+import pickle
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Lookups between hit ratio log lines
+STATS_EVERY = 1000
+
+# Seconds before a shared cache hit updates the entry's last use again
+TOUCH_SECONDS = 10
+# Seconds between writes of a process's hit and miss counts to the shared counters
+COUNTER_FLUSH_SECONDS = 10
+
+OPERATORS = ("AND", "OR", "NOT", "TO")
+
+
+def normalize_query(query_text):
+    """
+    Normalize a query so equivalent spellings share a cache entry
+
+    Whitespace is collapsed and words are lowercased (the index is), except
+    operators and field prefixes, whose case matters to the query parser.
+    """
+    return " ".join(token if token in OPERATORS or ":" in token else token.lower()
+                    for token in query_text.split())
+
+
+def cache_key(query_text, page, per_page, filters=None, sort=None, snippets=True):
+    """Return the cache key of a search"""
+    filters = sorted((field, list(value) if isinstance(value, tuple) else value)
+                     for field, value in (filters or {}).items())
+    return json.dumps([normalize_query(query_text), page, per_page, filters, sort, snippets])
+
+
+def snippet_key(query_text, path, page=None):
+    """Return the cache key of the snippets of one hit (see SearchCore.snippets)"""
+    return json.dumps(["snippets", normalize_query(query_text), path, page])
+
+
+class CacheCounters:
+    """Hit, miss and eviction counters with periodic hit ratio logging"""
+
+    def __init__(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        lookups = self.hits + self.misses
+        if lookups % STATS_EVERY == 0:
+            logger.info(f"Result cache: {self.hit_ratio():.1%} hit ratio over {lookups} lookups")
+
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache(CacheCounters):
+    def __init__(self, max_mb=64):
+        """
+        In-process LRU cache of search results
+
+        Args:
+            max_mb (float): Size bound of the pickled results, in MB
+        """
+        super().__init__()
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.entries = OrderedDict()  # key -> (value, size), least recently used first
+        self.size = 0
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        if generation != self.generation:
+            if self.entries:
+                logger.info(f"Index generation changed, dropping {len(self.entries)} cached results")
+            self.entries.clear()
+            self.size = 0
+            self.generation = generation
+
+    def get(self, generation, key):
+        """Return the cached results of a search, or None"""
+        with self.lock:
+            self._check_generation(generation)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            self.count(entry is not None)
+            return entry[0] if entry is not None else None
+
+    def put(self, generation, key, value):
+        """Cache the results of a search, evicting the least recently used"""
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._check_generation(generation)
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def close_handles(self):
+        """Nothing to close: the entries live in memory"""
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_ratio": self.hit_ratio()}
+
+
+class SQLiteResultCache(CacheCounters):
+    def __init__(self, path, max_mb=64):
+        """
+        LRU cache of search results in a SQLite file shared between processes
+
+        Cache errors (e.g. a locked database) are logged and treated as misses,
+        so they never fail a search.
+
+        Args:
+            path (str): Cache database file (created if missing)
+            max_mb (float): Size bound of the pickled results, in MB
+        """
+        super().__init__()
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.generation = None
+        self._local = threading.local()
+        self.lock = threading.Lock()
+        self.unflushed = {"hits": 0, "misses": 0}  # Counted here, not yet in the shared counters
+        self.flushed_at = time.time()
+        atexit.register(self.flush_counters)
+
+        db = self.connection()
+        db.execute("PRAGMA journal_mode = WAL")
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, generation TEXT NOT NULL, "
+                       "value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            db.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                           [("hits",), ("misses",), ("evictions",)])
+
+    def connection(self):
+        """Return this thread's connection"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA synchronous = NORMAL")
+        return db
+
+    def close_handles(self):
+        """Close this thread's connection and drop every thread's (before forking worker processes)"""
+        self.flush_counters()  # Or every worker would count them again
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+        self._local = threading.local()
+
+    def flush_counters(self):
+        """Add this process's hit and miss counts to the shared counters"""
+        with self.lock:
+            unflushed, self.unflushed = self.unflushed, {"hits": 0, "misses": 0}
+            self.flushed_at = time.time()
+        if not any(unflushed.values()):
+            return
+        try:
+            db = self.connection()
+            with db:
+                db.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                               [(count, name) for name, count in unflushed.items() if count])
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache counters update failed: {e}")
+
+    def _check_generation(self, db, generation):
+        # Whichever process sees the new generation first drops the old results
+        if generation != self.generation:
+            db.execute("DELETE FROM results WHERE generation != ?", (generation,))
+            self.generation = generation
+
+    def get(self, generation, key):
+        """Return the cached results of a search, or None"""
+        try:
+            db = self.connection()
+            with db:
+                self._check_generation(db, generation)
+                row = db.execute("SELECT value, used FROM results WHERE key = ? AND generation = ?",
+                                 (key, generation)).fetchone()
+                now = time.time()
+                if row is not None and now - row[1] >= TOUCH_SECONDS:
+                    db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache lookup failed: {e}")
+            return None
+
+        self.count(row is not None)
+        with self.lock:
+            self.unflushed["hits" if row is not None else "misses"] += 1
+            flush = now - self.flushed_at >= COUNTER_FLUSH_SECONDS
+        if flush:
+            self.flush_counters()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def put(self, generation, key, value):
+        """Cache the results of a search, evicting the least recently used"""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        try:
+            db = self.connection()
+            with db:
+                self._check_generation(db, generation)
+                db.execute("INSERT OR REPLACE INTO results (key, generation, value, size, used) VALUES (?, ?, ?, ?, ?)",
+                           (key, generation, data, len(data), time.time()))
+                self._evict(db)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache update failed: {e}")
+
+    def _evict(self, db):
+        total = db.execute("SELECT coalesce(sum(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY used").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            evicted += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+        db.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (evicted,))
+        self.evictions += evicted
+
+    def stats(self):
+        """Return the cache statistics of all processes sharing the file (others' last few seconds excepted)"""
+        self.flush_counters()
+        db = self.connection()
+        counters = dict(db.execute("SELECT name, value FROM counters"))
+        entries, size = db.execute("SELECT count(*), coalesce(sum(size), 0) FROM results").fetchone()
+        lookups = counters["hits"] + counters["misses"]
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes,
+                "hits": counters["hits"], "misses": counters["misses"], "evictions": counters["evictions"],
+                "hit_ratio": counters["hits"] / lookups if lookups else 0.0}
+
+
+def make_cache(max_mb=64, path=None):
+    """
+    Create a result cache
+
+    Args:
+        max_mb (float): Size bound in MB; 0 disables caching
+        path (str): SQLite file shared between processes (default: in-process cache)
+
+    Returns:
+        ResultCache, SQLiteResultCache or None
+    """
+    if not max_mb or max_mb <= 0:
+        return None
+    if path:
+        return SQLiteResultCache(path, max_mb=max_mb)
+    return ResultCache(max_mb=max_mb)
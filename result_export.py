@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Result Export Module
+Stream every result of a query as JSON Lines or CSV
+
+The search pages and the JSON API return results a page at a time; exports
+return all of them in one stream, for analysis elsewhere:
+
+    python result_export.py "kennedy date:1968" --format csv -o kennedy.csv
+
+or GET /api/v1/export?q=...&format=csv from the search apps (see
+search_api.py). Lines are written as the results come out of the index
+(see SearchCore.export), so memory stays flat however many documents match.
+Results are ranked by relevance unless --unranked (ranked=0) is given: the
+matches are then streamed in index order without being scored, which is
+cheaper when the order does not matter.
+
+Every result has its filename, title, score (none when unranked), the
+metadata parsed from its filename, and in page-granular indexes the best
+matching page, all the matching page numbers and their count. The server
+path and the snippets can be added.
+"""
+
+import io
+import re
+import csv
+import sys
+import html
+import json
+import time
+import argparse
+import logging
+from doc_metadata import METADATA_FIELDS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("jsonl", "csv")
+MIMETYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv"}
+
+TAG = re.compile(r"<[^>]+>")
+
+
+def export_record(result, paths=False, snippets=False):
+    """Return the exported fields of a SearchCore result"""
+    record = {}
+    if paths:
+        record["path"] = result["path"]
+    for key in ("filename", "title", "score", "page", "pages", "page_hits", "metadata"):
+        if key in result:
+            record[key] = result[key]
+    if snippets:
+        record["snippets"] = result["snippets"]
+    return record
+
+
+def csv_columns(paths=False, snippets=False):
+    """Return the CSV header: metadata fields get a column each"""
+    columns = (["path"] if paths else []) + ["filename", "title", "score", "page", "pages", "page_hits"]
+    columns += list(METADATA_FIELDS)
+    return columns + (["snippets"] if snippets else [])
+
+
+def csv_row(record, columns):
+    """Flatten an export record into CSV values (pages space-separated, snippets as plain text)"""
+    values = dict(record.get("metadata", {}))
+    values.update((key, value) for key, value in record.items() if key != "metadata")
+    if "pages" in values:
+        values["pages"] = " ".join(str(page) for page in values["pages"])
+    if values.get("snippets"):
+        values["snippets"] = html.unescape(TAG.sub("", values["snippets"]))
+    return ["" if values.get(column) is None else values[column] for column in columns]
+
+
+def export_lines(results, fmt="jsonl", paths=False, snippets=False):
+    """
+    Format results for export, one line at a time
+
+    Args:
+        results (iterable): SearchCore results (see SearchCore.export)
+        fmt (str): "jsonl" or "csv"
+        paths (bool): Include the server path of each PDF
+        snippets (bool): Include the snippets
+
+    Yields:
+        str: Lines, with their line ending (CSV starts with a header)
+    """
+    if fmt == "jsonl":
+        for result in results:
+            yield json.dumps(export_record(result, paths, snippets), ensure_ascii=False) + "\n"
+        return
+    if fmt != "csv":
+        raise ValueError(f"Unknown export format: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    columns = csv_columns(paths, snippets)
+    writer.writerow(columns)
+    for row in (csv_row(export_record(result, paths, snippets), columns) for result in results):
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # No results: just the header
+        yield buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every result of a search query as JSON Lines or CSV")
+    parser.add_argument("query", help='Search query, with metadata filters if needed (e.g. "kennedy date:1968")')
+    parser.add_argument("--index-dir", default="search_index", help="Search index to query")
+    parser.add_argument("--text-dir", default="ocr_text", help="OCR text store (snippets of --slim-index indexes)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="Output format (default: from the output "
+                                                                 "file extension, else jsonl)")
+    parser.add_argument("-o", "--output", help="Output file (default: standard output)")
+    parser.add_argument("--unranked", action="store_true", help="Index order, without scoring (faster)")
+    parser.add_argument("--snippets", action="store_true", help="Include highlighted snippets (slower)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    fmt = args.format or ("csv" if args.output and args.output.lower().endswith(".csv") else "jsonl")
+
+    from search_core import SearchCore
+    core = SearchCore(args.index_dir, args.text_dir)
+    if not core.ix:
+        print(f"No search index found in {args.index_dir}", file=sys.stderr)
+        return 1
+    try:
+        results = core.export(args.query, ranked=not args.unranked, snippets=args.snippets)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    exported = 0
+
+    def counted(results):
+        nonlocal exported
+        for result in results:
+            exported += 1
+            yield result
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        out.writelines(export_lines(counted(results), fmt, paths=True, snippets=args.snippets))
+    finally:
+        if args.output:
+            out.close()
+    print(f"Exported {exported} results in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
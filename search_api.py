@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Search API Module
+Versioned JSON search API shared by the local and deployed search apps
+
+    GET /api/v1/search?q=kennedy+date:1968&limit=50
+
+returns
+
+    {"api_version": 1, "query": ..., "results": [...], "total": 1234,
+     "next_cursor": "..."}
+
+Results are paged with cursors rather than page numbers: pass the
+next_cursor of a response as cursor= to get the results after it, until it
+is null. A cursor carries the rank of the last result returned (see
+SearchCore.search_after), so the 500th page costs the same as the first,
+and it stops working with a 400 error once the index is republished.
+
+Parameters:
+- q: query, with the metadata filters of the search page (no sort: terms)
+- limit: results per response (default 10, at most MAX_LIMIT)
+- cursor: next_cursor of the previous response
+- fields: comma-separated result fields (default: all of FIELDS)
+- snippets=1: highlight the results (off by default: bulk consumers rarely
+  need them and they are the most expensive part of a search)
+- total: count the matches (1) or not (0: "total" is null). By default
+  only the first request, without a cursor, counts them: counting costs a
+  pass over every match, which later pages need not repeat
+
+    GET /api/v1/export?q=kennedy&format=csv
+
+streams every result at once instead, as JSON Lines (format=jsonl, the
+default) or CSV (see result_export.py), ranked by relevance unless ranked=0
+(index order, unscored: cheaper), with snippets=1 to add snippets.
+
+Errors are returned as {"error": message} with a 400 (bad parameters) or 500
+status.
+"""
+
+import logging
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from result_export import EXPORT_FORMATS, MIMETYPES, export_lines
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = 1
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+# Result fields that can be selected; "page", "pages" and "page_hits" are
+# only returned by page-granular indexes. Server paths are never returned.
+FIELDS = ("title", "filename", "score", "metadata", "snippets", "page", "pages", "page_hits")
+
+
+def parse_flag(value, default):
+    """Parse a 0/1 (or false/true) query parameter"""
+    if value is None or value == "":
+        return default
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Invalid flag: {value} (use 0 or 1)")
+
+
+def parse_fields(value):
+    """Parse the fields parameter into a tuple of FIELDS"""
+    if not value:
+        return FIELDS
+    fields = tuple(field.strip() for field in value.split(",") if field.strip())
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (use {', '.join(FIELDS)})")
+    return fields
+
+
+def error(message, status):
+    return jsonify({"api_version": API_VERSION, "error": message}), status
+
+
+def create_api(get_search):
+    """
+    Create the API blueprint
+
+    Args:
+        get_search (callable): Returns the app's SearchCore (called per
+            request, since the apps create theirs after importing this)
+
+    Returns:
+        flask.Blueprint: Routes under /api/v1
+    """
+    api = Blueprint("api", __name__, url_prefix=f"/api/v{API_VERSION}")
+
+    @api.route("/search")
+    def search():
+        """Search with cursor pagination"""
+        args = request.args
+        query = args.get("q", "")
+        try:
+            limit = int(args.get("limit", DEFAULT_LIMIT))
+            if not 1 <= limit <= MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+            fields = parse_fields(args.get("fields"))
+            snippets = parse_flag(args.get("snippets"), False) and "snippets" in fields
+            cursor = args.get("cursor") or None
+            count = parse_flag(args.get("total"), cursor is None)
+            if not query.strip():
+                raise ValueError("Missing query (q)")
+            found = get_search().search_after(query, cursor=cursor, limit=limit, snippets=snippets, count=count)
+        except ValueError as e:
+            return error(str(e), 400)
+        except Exception as e:
+            logger.error(f"API search error: {e}")
+            return error("Search failed", 500)
+
+        results = [{field: result[field] for field in fields if field in result}
+                   for result in found["results"]]
+        return jsonify({
+            "api_version": API_VERSION,
+            "query": query,
+            "results": results,
+            "total": found["total"],
+            "next_cursor": found["next_cursor"],
+        })
+
+    @api.route("/export")
+    def export():
+        """Stream every result of a query as JSON Lines or CSV"""
+        args = request.args
+        query = args.get("q", "")
+        fmt = args.get("format", "jsonl").lower()
+        try:
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"Unknown format: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+            snippets = parse_flag(args.get("snippets"), False)
+            ranked = parse_flag(args.get("ranked"), True)
+            if not query.strip():
+                raise ValueError("Missing query (q)")
+            results = get_search().export(query, ranked=ranked, snippets=snippets)
+        except ValueError as e:
+            return error(str(e), 400)
+        except Exception as e:
+            logger.error(f"API export error: {e}")
+            return error("Export failed", 500)
+
+        # Lines are sent as they are formatted, within the request's context
+        lines = stream_with_context(export_lines(results, fmt, snippets=snippets))
+        return Response(lines, mimetype=MIMETYPES[fmt],
+                        headers={"Content-Disposition": f'attachment; filename="results.{fmt}"'})
+
+    return api
@@ -7,10 +7,13 @@ Web search interface for OCR'd PDF documents
 import os
 import sys
 import argparse
-from flask import Flask, render_template, request, redirect, url_for, send_file
-from whoosh.index import open_dir
-from whoosh.qparser import QueryParser, MultifieldParser
-from whoosh.highlight import ContextFragmenter
+from flask import Flask, render_template, request, redirect, url_for, jsonify
+from search_core import SearchCore
+from result_cache import make_cache
+from search_api import create_api
+from pdf_delivery import PDFDelivery
+from pdf_catalog import PDFCatalog, CATALOG_FILENAME
+from page_preview import PagePreviews, PageCache, create_page_routes
 from config import WEBSITE_CONFIGS
 import logging
 
@@ -27,125 +30,59 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-class PDFSearchApp:
-    def __init__(self, index_dir="search_index", pdf_dirs=None):
+class PDFSearchApp(SearchCore):
+    def __init__(self, index_dir="search_index", pdf_dirs=None, text_dir="ocr_text", cache=None,
+                 catalog_path=CATALOG_FILENAME):
         """
         Initialize the search application
         
         Args:
             index_dir (str): Directory containing the search index
             pdf_dirs (list): List of directories containing PDF files
+            text_dir (str): OCR text directory (snippets for indexes built with --slim-index)
+            cache: Result cache (see result_cache.make_cache), or None
+            catalog_path (str): PDF catalog file, rebuilt from the PDF directories
         """
-        self.index_dir = index_dir
+        if not os.path.exists(index_dir):
+            logger.error(f"Search index directory not found: {index_dir}")
+        super().__init__(index_dir, text_dir, cache=cache)
         self.pdf_dirs = pdf_dirs or []
-        
-        try:
-            # Open the search index
-            if os.path.exists(index_dir):
-                self.ix = open_dir(index_dir)
-                logger.info(f"Search index opened from {index_dir}")
-            else:
-                logger.error(f"Search index directory not found: {index_dir}")
-                self.ix = None
-        except Exception as e:
-            logger.error(f"Failed to open search index: {e}")
-            self.ix = None
+        # The PDF directories first, then those of every website config
+        roots = list(self.pdf_dirs)
+        for site_id, config in WEBSITE_CONFIGS.items():
+            pdf_dir = config.get("output_dir")
+            if pdf_dir and pdf_dir not in roots:
+                roots.append(pdf_dir)
+        self.catalog = PDFCatalog(catalog_path, roots=roots)
+        logger.info(f"Cataloged {len(self.catalog)} PDFs")
     
-    def search(self, query_text, page=1, per_page=10):
-        """
-        Search the index for documents matching the query
-        
-        Args:
-            query_text (str): Search query
-            page (int): Page number for pagination
-            per_page (int): Results per page
-        
-        Returns:
-            dict: Search results
-        """
-        if not self.ix:
-            logger.error("Search index not available")
-            return {"query": query_text, "total": 0, "results": [], "page": page, "pages": 0}
-        
-        try:
-            # Calculate offset for pagination
-            start_offset = (page - 1) * per_page
-            
-            with self.ix.searcher() as searcher:
-                # Create a parser that searches both title and content
-                parser = MultifieldParser(["title", "content"], self.ix.schema)
-                query = parser.parse(query_text)
-                
-                # Create a context fragmenter for better highlighting
-                fragmenter = ContextFragmenter(maxchars=300, surround=50)
-                
-                # Execute the search
-                results = searcher.search_page(query, page, pagelen=per_page)
-                results.fragmenter = fragmenter
-                
-                # Format results
-                formatted_results = []
-                for hit in results:
-                    # Create highlighted snippets from the content field
-                    snippets = hit.highlights("content", top=3) or "No preview available"
-                    
-                    # Find the PDF file
-                    pdf_path = hit["path"]
-                    title = hit["title"]
-                    
-                    formatted_results.append({
-                        "title": title,
-                        "path": pdf_path,
-                        "filename": hit["filename"],
-                        "snippets": snippets,
-                        "score": hit.score,
-                    })
-                
-                # Return search results and pagination info
-                return {
-                    "query": query_text,
-                    "total": len(results),
-                    "total_docs": results.total,
-                    "results": formatted_results,
-                    "page": page,
-                    "pages": results.pagecount,
-                    "has_previous": results.pagenum > 1,
-                    "has_next": results.pagenum < results.pagecount
-                }
-                
-        except Exception as e:
-            logger.error(f"Search error: {e}")
-            return {"query": query_text, "total": 0, "results": [], "page": page, "pages": 0}
+    def pdf_catalog(self):
+        """Return the PDF catalog, rebuilt first if a new index generation was published"""
+        index = self.ix
+        return self.catalog.for_generation(index.generation() if index else None)
     
     def find_pdf(self, filename):
         """
         Find the actual path to a PDF file
         
         Args:
-            filename (str): Filename of the PDF
+            filename (str): Document ID (see pdf_catalog.py) or filename of the PDF
         
         Returns:
-            str: Full path to the PDF file
+            str: Full path to the PDF file, or None
         """
-        # First look in the specified PDF directories
-        for pdf_dir in self.pdf_dirs:
-            pdf_path = os.path.join(pdf_dir, filename)
-            if os.path.exists(pdf_path):
-                return pdf_path
-        
-        # If not found, try to find it in all website config directories
-        for site_id, config in WEBSITE_CONFIGS.items():
-            pdf_dir = config.get("output_dir")
-            if pdf_dir:
-                pdf_path = os.path.join(pdf_dir, filename)
-                if os.path.exists(pdf_path):
-                    return pdf_path
-        
-        # If still not found, return None
-        return None
+        return self.pdf_catalog().find_path(filename)
+    
+    def format_hit(self, hit):
+        """Add the document ID the PDF links use to each result"""
+        result = super().format_hit(hit)
+        result["pdf_id"] = self.pdf_catalog().doc_id_for(result["filename"], result["path"]) or result["filename"]
+        return result
 
 # Initialize the search app
 search_app = None
+pdf_delivery = PDFDelivery()
+page_previews = None
 
 @app.route('/')
 def home():
@@ -161,8 +98,8 @@ def search():
     if not query:
         return redirect(url_for('home'))
     
-    # Perform the search
-    results = search_app.search(query, page=page)
+    # Perform the search; snippets are fetched by the page afterwards (see /snippets)
+    results = search_app.search(query, page=page, snippets=False)
     
     return render_template(
         'results.html',
@@ -175,24 +112,52 @@ def search():
         has_next=results["has_next"]
     )
 
+@app.route('/snippets')
+def snippets():
+    """Snippets of the results in view, fetched by the results page as hit=<position>:<filename>"""
+    query = request.args.get('q', '')
+    page = int(request.args.get('page', 1))
+    hits = []
+    for value in request.args.getlist('hit'):
+        position, _, filename = value.partition(':')
+        if position.isdigit():
+            hits.append((int(position), filename))
+    return jsonify(search_app.snippets(query, hits, page=page))
+
+# JSON search API with cursor pagination (see search_api.py)
+app.register_blueprint(create_api(lambda: search_app))
+
+# Single pages of PDFs, extracted or rendered (see page_preview.py)
+app.register_blueprint(create_page_routes(lambda: page_previews, lambda filename: search_app.find_pdf(filename),
+                                          lambda: pdf_delivery.max_age))
+
+@app.context_processor
+def preview_links():
+    """Link matching pages to their previews when Poppler is installed"""
+    return {"page_previews": page_previews is not None and page_previews.available()}
+
 @app.route('/view/<path:filename>')
 def view_pdf(filename):
     """View a PDF file"""
     pdf_path = search_app.find_pdf(filename)
     
-    if pdf_path and os.path.exists(pdf_path):
+    if pdf_path:
         try:
-            return send_file(pdf_path, download_name=filename)
+            return pdf_delivery.send(pdf_path, os.path.basename(filename))
         except Exception as e:
             logger.error(f"Error sending PDF file: {e}")
             return f"Error: Could not retrieve the PDF file. {str(e)}", 500
     else:
         return "PDF file not found", 404
 
-def create_app(index_dir="search_index", pdf_dirs=None):
+def create_app(index_dir="search_index", pdf_dirs=None, text_dir="ocr_text", cache_mb=64, cache_file=None,
+               pdf_max_age=86400, page_cache_dir="page_cache", page_cache_mb=256, catalog_path=CATALOG_FILENAME):
     """Create the Flask application with the search app"""
-    global search_app
-    search_app = PDFSearchApp(index_dir=index_dir, pdf_dirs=pdf_dirs or [])
+    global search_app, pdf_delivery, page_previews
+    pdf_delivery = PDFDelivery(max_age=pdf_max_age)
+    page_previews = PagePreviews(pdf_delivery.hashes, PageCache(page_cache_dir, page_cache_mb))
+    search_app = PDFSearchApp(index_dir=index_dir, pdf_dirs=pdf_dirs or [], text_dir=text_dir,
+                              cache=make_cache(cache_mb, cache_file), catalog_path=catalog_path)
     
     # Create templates directory if it doesn't exist
     os.makedirs(os.path.join(os.path.dirname(__file__), 'templates'), exist_ok=True)
@@ -320,6 +285,15 @@ def create_templates():
             color: #333;
             line-height: 1.5;
         }
+        .result-pages {
+            margin-top: 8px;
+            font-size: 14px;
+            color: #777;
+        }
+        .snippet-loading {
+            color: #aaa;
+            font-style: italic;
+        }
         .highlight {
             background-color: #ffffcc;
             font-weight: bold;
@@ -357,6 +331,7 @@ def create_templates():
             text-decoration: underline;
         }
     </style>
+    <noscript><style>.snippet-loading { display: none; }</style></noscript>
 </head>
 <body>
     <div class="home-link">
@@ -377,13 +352,28 @@ def create_templates():
         {% for result in results %}
             <div class="result">
                 <div class="result-title">
-                    <a href="{{ url_for('view_pdf', filename=result.filename) }}" target="_blank">
+                    <a href="{{ url_for('view_pdf', filename=result.pdf_id) }}{% if result.page %}#page={{ result.page }}{% endif %}" target="_blank">
                         {{ result.title }}
                     </a>
                 </div>
-                <div class="result-snippet">
-                    {{ result.snippets|safe }}
-                </div>
+                {% if result.snippets is none %}
+                    <div class="result-snippet" data-hit="{{ loop.index0 }}:{{ result.filename }}">
+                        <span class="snippet-loading">Loading preview&hellip;</span>
+                    </div>
+                {% else %}
+                    <div class="result-snippet">
+                        {{ result.snippets|safe }}
+                    </div>
+                {% endif %}
+                {% if result.pages %}
+                    <div class="result-pages">
+                        Matching pages:
+                        {% for p in result.pages %}
+                            {% if page_previews %}<a href="{{ url_for('pages.view_page', filename=result.pdf_id, page=p) }}" target="_blank">{{ p }}</a>{% else %}<a href="{{ url_for('view_pdf', filename=result.pdf_id) }}#page={{ p }}" target="_blank">{{ p }}</a>{% endif %}{% if not loop.last %},{% endif %}
+                        {% endfor %}
+                        {% if result.page_hits > result.pages|length %}&hellip; ({{ result.page_hits }} pages){% endif %}
+                    </div>
+                {% endif %}
             </div>
         {% endfor %}
         
@@ -401,6 +391,59 @@ def create_templates():
     {% else %}
         <p>No results found for your query. Please try different search terms.</p>
     {% endif %}
+<script>
+    // Snippets are fetched after the page is shown, for the results in view,
+    // a few per request so they are highlighted in parallel
+    (function () {
+        var BATCH = 3;
+        var url = "{{ url_for('snippets') }}", query = {{ query|tojson }}, page = {{ page }};
+        var pending = [], timer = null;
+
+        function load(batch) {
+            var params = new URLSearchParams({q: query, page: page});
+            batch.forEach(function (el) { params.append("hit", el.dataset.hit); });
+            fetch(url + "?" + params)
+                .then(function (response) { return response.json(); })
+                .then(function (snippets) {
+                    batch.forEach(function (el) {
+                        el.innerHTML = snippets[el.dataset.hit.split(":")[0]] || "No preview available";
+                    });
+                })
+                .catch(function () {
+                    batch.forEach(function (el) { el.textContent = "No preview available"; });
+                });
+        }
+
+        function flush() {
+            timer = null;
+            while (pending.length) {
+                load(pending.splice(0, BATCH));
+            }
+        }
+
+        function queue(el) {
+            pending.push(el);
+            if (!timer) {
+                timer = setTimeout(flush, 50);
+            }
+        }
+
+        var targets = document.querySelectorAll("[data-hit]");
+        if (!("IntersectionObserver" in window)) {
+            targets.forEach(queue);
+            return;
+        }
+        var observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    queue(entry.target);
+                }
+            });
+        }, {rootMargin: "200px"});
+        targets.forEach(function (el) { observer.observe(el); });
+    })();
+</script>
 </body>
 </html>
 ''')
@@ -409,6 +452,16 @@ def main():
     parser = argparse.ArgumentParser(description="Start the PDF search web interface")
     parser.add_argument("--index", default="search_index", help="Directory containing the search index")
     parser.add_argument("--pdf-dir", action='append', help="Directory containing PDF files (can be used multiple times)")
+    parser.add_argument("--text-dir", default="ocr_text",
+                        help="OCR text directory (used for snippets when the index was built with --slim-index)")
+    parser.add_argument("--cache-mb", type=float, default=64, help="Search result cache size in MB (0 disables it)")
+    parser.add_argument("--cache-file", help="SQLite file for a result cache shared between processes")
+    parser.add_argument("--pdf-max-age", type=int, default=86400,
+                        help="Seconds browsers may cache a PDF before revalidating it")
+    parser.add_argument("--pdf-catalog", default=CATALOG_FILENAME,
+                        help="PDF lookup table, rebuilt from the PDF directories at startup")
+    parser.add_argument("--page-cache-dir", default="page_cache", help="Directory of the page preview cache")
+    parser.add_argument("--page-cache-mb", type=float, default=256, help="Page preview cache size in MB")
     parser.add_argument("--host", default="127.0.0.1", help="Host to run the web server on")
     parser.add_argument("--port", type=int, default=5000, help="Port to run the web server on")
     parser.add_argument("--debug", action="store_true", help="Run in debug mode")
@@ -431,7 +484,10 @@ def main():
                 pdf_dirs.append(pdf_dir)
     
     # Create and run the app
-    app = create_app(index_dir=args.index, pdf_dirs=pdf_dirs)
+    app = create_app(index_dir=args.index, pdf_dirs=pdf_dirs, text_dir=args.text_dir,
+                     cache_mb=args.cache_mb, cache_file=args.cache_file, pdf_max_age=args.pdf_max_age,
+                     page_cache_dir=args.page_cache_dir, page_cache_mb=args.page_cache_mb,
+                     catalog_path=args.pdf_catalog)
     print(f"* PDF Search web interface started at http://{args.host}:{args.port}")
     print(f"* Using search index: {args.index}")
     print(f"* PDF directories: {', '.join(pdf_dirs)}")
@@ -0,0 +1,1330 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Search Backend Module
+Search engines behind the indexer (ocr_processor.py) and the search apps
+
+A backend creates, writes and optimizes the index in one generation
+directory (see index_store.py) and opens it for searching. Two are available:
+
+- "whoosh": the pure-Python Whoosh index (the default)
+- "sqlite": a SQLite FTS5 table in fts.sqlite3, ranked with bm25() and
+  snippeted with snippet(). Slim indexes (--slim-index) use a contentless
+  FTS5 table and highlight snippets from the text store instead.
+
+Both support the same layouts (one document per PDF or per page, with or
+without stored text) and return the same result dicts. The backend of an
+existing index is recognized from its files, so the search apps need no
+setting. Queries use the Whoosh syntax (AND/OR/NOT, "phrases", field:term,
+wildcards, word~2) and are translated for FTS5; fuzzy and wildcard terms are
+expanded through a trigram index of the index vocabulary in both backends.
+
+The metadata parsed from filenames (see doc_metadata.py) is kept in typed,
+sortable fields: Whoosh ID/NUMERIC columns, indexed SQLite columns. Metadata
+filters are applied as term and range lookups on them (a Whoosh filter query,
+a SQL WHERE clause), never as text queries, and results can be sorted by them.
+
+Besides numbered pages (search()), hits can be paged with search-after
+cursors (search_after()): the rank key of the last hit returned, (score,
+docnum) in Whoosh and (bm25 rank, row id) in SQLite. Only the hits after it
+are kept, so deep pages cost no more than the first one.
+"""
+
+import os
+import re
+import html
+import math
+import time
+import sqlite3
+import logging
+import weakref
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from heapq import nlargest
+from pathlib import Path
+from whoosh.index import create_in, open_dir, exists_in
+from whoosh.fields import Schema, TEXT, ID, STORED, NUMERIC
+from whoosh.query import And, Or, Term, NumericRange, Every
+from whoosh.sorting import FieldFacet, QueryFacet, MultiFacet
+from whoosh.collectors import TopCollector, ScoredCollector, FilterCollector, CollapseCollector
+from whoosh.searching import ResultsPage
+from whoosh.qparser import MultifieldParser, FuzzyTermPlugin
+from whoosh.analysis import StandardAnalyzer
+from whoosh.highlight import ContextFragmenter, HtmlFormatter, highlight
+from term_trigrams import TrigramIndex, expand_query
+from offset_highlight import highlight_hit
+from doc_metadata import METADATA_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Matching page numbers listed per PDF in page-granular results
+MAX_LISTED_PAGES = 25
+
+# Open searchers kept for reuse per Whoosh index (one per concurrent search)
+MAX_IDLE_SEARCHERS = 8
+
+# Fields with a trigram index for fuzzy and wildcard terms
+TRIGRAM_FIELDS = ("title", "content")
+
+# Metadata field sort orders (see doc_metadata.SORT_ORDERS): fields, descending.
+# Documents without a value sort last either way.
+SORT_FIELDS = {
+    "date": (["doc_date"], False),
+    "-date": (["doc_date"], True),
+    "file": (["file_number", "volume", "section", "serial", "part"], False),
+}
+
+
+def make_schema(pages=False, store_content=True):
+    """
+    Build the Whoosh index schema
+
+    Args:
+        pages (bool): One document per "--- Page N ---" section, grouped back to
+            the PDF by path at query time
+        store_content (bool): Store the OCR text in the index (per-PDF indexes
+            also store the character offsets of its terms, see offset_highlight.py;
+            pages are short enough to re-tokenize). Without it the index is much
+            smaller and snippets are read from the text store
+
+    Returns:
+        whoosh.fields.Schema: Index schema
+    """
+    # Filename metadata, as sortable columns for filtering and sorting
+    metadata = {field: NUMERIC(int, stored=True, sortable=True)
+                for field in METADATA_FIELDS if field != "file_number"}
+    metadata["file_number"] = ID(stored=True, sortable=True)
+
+    if pages:
+        return Schema(
+            path=ID(stored=True, sortable=True),
+            page=NUMERIC(stored=True, sortable=True),
+            filename=STORED,
+            title=TEXT(stored=True),
+            content=TEXT(stored=store_content),
+            **metadata
+        )
+    return Schema(
+        path=ID(stored=True, unique=True),
+        filename=STORED,
+        title=TEXT(stored=True),
+        content=TEXT(stored=store_content, chars=store_content),
+        **metadata
+    )
+
+
+def is_paged(ix):
+    """True if a Whoosh index (or searcher) holds one document per page"""
+    return "page" in ix.schema.names()
+
+
+def memory_mapped(searcher):
+    """Whether every segment of a searcher is read through a memory map (no file offsets to share)"""
+    # A segment reader reads its compound file (overlaid on the index directory), which is
+    # mapped whole and its file closed, unless mmap fails
+    for reader, _ in searcher.reader().leaf_readers():
+        storage = getattr(reader, "_storage", None)
+        if getattr(getattr(storage, "a", storage), "_source", None) is None:
+            return False
+    return True
+
+
+def new_fragmenter():
+    """Fragmenter used for snippets highlighted from OCR text"""
+    return ContextFragmenter(maxchars=300, surround=50)
+
+
+def hit_metadata(values):
+    """Return the metadata fields of a hit that have a value"""
+    return {field: values[field] for field in METADATA_FIELDS if values.get(field) is not None}
+
+
+def search_results(hits, total, total_docs, page, per_page):
+    """Return the backend-independent result dict of one page of hits"""
+    pages = math.ceil(total / per_page) if total else 0
+    return {
+        "hits": hits,
+        "total": total,
+        "total_docs": total_docs,
+        "page": min(page, pages) if pages else page,
+        "pages": pages,
+    }
+
+
+class SearchBackend(ABC):
+    """
+    Interface of a search backend (a backend missing a method can't be created)
+
+    Index layouts are given as pages (one document per page) and
+    store_content (keep the OCR text in the index). Writers take the field
+    dicts built by the indexer: path, filename, title, content, the metadata
+    fields (None where unknown) and, in page-granular indexes, page.
+    """
+    name = None
+
+    @abstractmethod
+    def exists(self, directory):
+        """True if directory holds an index of this backend"""
+
+    @abstractmethod
+    def create(self, directory, pages=False, store_content=True):
+        """Create an empty index"""
+
+    @abstractmethod
+    def layout(self, directory):
+        """Return the layout of an index as {"pages": bool, "store_content": bool}"""
+
+    @abstractmethod
+    def writer(self, directory, limitmb=256, procs=1, batchsize=20, keep_segments=False):
+        """
+        Open a writer with add(fields), delete(path), commit(optimize=False,
+        merge=True) and cancel(), and a paged attribute
+        """
+
+    @abstractmethod
+    def optimize(self, directory):
+        """Compact the index"""
+
+    @abstractmethod
+    def open(self, directory, trigrams=True):
+        """
+        Open an index for searching; the result has search(), search_after(),
+        export(), hit_snippets(), doc_count() and generation() (changes
+        whenever the searchable contents do)
+        """
+
+
+# Whoosh
+
+class WhooshWriter:
+    def __init__(self, writer):
+        self.writer = writer
+        self.names = set(writer.schema.names())
+        self.paged = "page" in self.names
+
+    def add(self, fields):
+        # Unknown metadata is left out; older indexes have no metadata fields
+        self.writer.add_document(**{name: value for name, value in fields.items()
+                                    if value is not None and name in self.names})
+
+    def delete(self, path):
+        self.writer.delete_by_term("path", path)
+
+    def commit(self, optimize=False, merge=True):
+        self.writer.commit(optimize=optimize, merge=merge)
+
+    def cancel(self):
+        self.writer.cancel()
+
+
+class AllowedMatchesCollector(FilterCollector):
+    """
+    A FilterCollector that can be wrapped by a CollapseCollector
+
+    Searcher.search() wraps the filter around the collapsing, where
+    FilterCollector passes the allowed documents straight to the collector
+    under the CollapseCollector, so nothing is collapsed. Inside it, this
+    one only lets the allowed documents through matches(), which
+    CollapseCollector reads.
+    """
+
+    def matches(self):
+        allow = self._allow
+        for sub_docnum in self.child.matches():
+            if allow is None or self.offset + sub_docnum in allow:
+                yield sub_docnum
+
+
+class SearchAfterCollector(TopCollector):
+    """
+    Top hits ranked after a search-after cursor
+
+    Hits rank as in TopCollector: by score, then by docnum among equal
+    scores. Those at or before the cursor (the (score, docnum) of the last
+    hit already returned) are passed over, so the heap only holds one page
+    however deep the cursor is.
+    """
+
+    def __init__(self, limit=10, after=None):
+        TopCollector.__init__(self, limit=limit)
+        self.after = (after[0], 0 - after[1]) if after else None
+
+    def _collect(self, global_docnum, score):
+        if self.after is not None and (score, 0 - global_docnum) >= self.after:
+            self.total += 1
+            return 0
+        return TopCollector._collect(self, global_docnum, score)
+
+
+class GroupedSearchAfterCollector(ScoredCollector):
+    """
+    Top groups of hits ranked after a search-after cursor
+
+    Every match is grouped by a column (the PDF path of the pages of a
+    page-granular index), and each group ranks as its best hit; groups at
+    or before the cursor are passed over.
+    """
+
+    def __init__(self, fieldname, limit=10, after=None):
+        ScoredCollector.__init__(self)
+        self.fieldname = fieldname
+        self.limit = limit
+        self.after = (after[0], 0 - after[1]) if after else None
+
+    def prepare(self, top_searcher, q, context):
+        ScoredCollector.prepare(self, top_searcher, q, context)
+        self.best = {}  # group -> (score, -docnum) of its best hit
+        self.members = {}  # group -> docnums
+
+    def set_subsearcher(self, subsearcher, offset):
+        ScoredCollector.set_subsearcher(self, subsearcher, offset)
+        self.column = subsearcher.reader().column_reader(self.fieldname)
+
+    def _collect(self, global_docnum, score):
+        group = self.column[global_docnum - self.offset]
+        rank = (score, 0 - global_docnum)
+        best = self.best.get(group)
+        if best is None or rank > best:
+            self.best[group] = rank
+        self.members.setdefault(group, []).append(global_docnum)
+        return 0 - score
+
+    def count(self):
+        return len(self.best)
+
+    def results(self):
+        ranked = ((rank, group) for group, rank in self.best.items() if self.after is None or rank < self.after)
+        top = nlargest(self.limit, ranked)
+        # Hit docnum -> docnums of its group
+        self.hit_members = {0 - rank[1]: self.members[group] for rank, group in top}
+        return self._results([(score, 0 - docnum) for (score, docnum), _ in top])
+
+
+class WhooshIndex:
+    def __init__(self, ix, trigrams=True):
+        """
+        Args:
+            ix (whoosh.index.Index): Open Whoosh index
+            trigrams (bool): Expand fuzzy and wildcard terms through trigram indexes
+        """
+        self.ix = ix
+        self.use_trigrams = trigrams
+        self.directory = ix.storage.folder
+        self._idle = []  # (searcher, directory signature) pairs not in use
+        self._idle_lock = threading.Lock()
+        self._page_columns = weakref.WeakKeyDictionary()
+        self._parser = None
+        self._trigrams = {}
+        self._trigrams_generation = None
+
+    @property
+    def paged(self):
+        with self.searcher() as searcher:
+            return is_paged(searcher)
+
+    def doc_count(self):
+        with self.searcher() as searcher:
+            return searcher.doc_count()
+
+    def generation(self):
+        """Identify the index contents: the directory and the TOC generation the searcher sees"""
+        with self.searcher() as searcher:
+            return f"{self.directory}:{searcher.reader().generation()}"
+
+    def _directory_signature(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return None  # Generation pruned; keep serving from the open files
+
+    @contextmanager
+    def searcher(self):
+        """
+        Check out a long-lived searcher, refreshed after commits
+
+        Opening a searcher loads the readers of every segment, so searchers
+        are kept open across requests in a pool shared by all threads (a
+        server may run each request on a new thread); a searcher serves one
+        thread at a time. A commit adds files to the index directory, so one
+        stat() of it tells when to refresh, which reuses the readers of
+        unchanged segments. Searchers of an index that is no longer used
+        close when it is garbage collected.
+        """
+        signature = self._directory_signature()
+        with self._idle_lock:
+            searcher, seen = self._idle.pop() if self._idle else (None, None)
+        if searcher is None:
+            searcher = self.ix.searcher()
+        elif signature != seen and signature is not None:
+            searcher = searcher.refresh()
+        try:
+            yield searcher
+        finally:
+            with self._idle_lock:
+                self._idle.append((searcher, signature))
+                extra, self._idle = self._idle[:-MAX_IDLE_SEARCHERS], self._idle[-MAX_IDLE_SEARCHERS:]
+            for surplus, _ in extra:
+                surplus.close()
+
+    def close_handles(self):
+        """
+        Prepare to fork worker processes, which must not share open files
+
+        A searcher whose segments are all memory-mapped holds no open file
+        (Whoosh reads each segment's files into memory through the map), so
+        the pooled ones are kept: forked from them, the workers share those
+        segment files copy-on-write instead of each loading its own copy.
+        Otherwise they are closed and the workers open their own. Either way
+        they keep the trigram indexes built here.
+        """
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+            for searcher, signature in idle:
+                if memory_mapped(searcher):
+                    self._idle.append((searcher, signature))
+                else:
+                    searcher.close()
+
+    def page_column(self, searcher):
+        """Return the page number column of a searcher"""
+        column = self._page_columns.get(searcher)
+        if column is None:
+            column = self._page_columns[searcher] = searcher.reader().column_reader("page")
+        return column
+
+    def parser(self, schema):
+        """Return the query parser (title and content, with fuzzy terms), shared by all threads"""
+        parser = self._parser
+        if parser is None:
+            parser = self._parser = MultifieldParser(["title", "content"], schema)
+            parser.add_plugin(FuzzyTermPlugin())
+        return parser
+
+    def trigram_index(self, searcher, fieldname):
+        """
+        Return the trigram index of a field's terms, or None for fields without one
+
+        Indexes are kept until the searcher sees another commit.
+        """
+        if fieldname not in TRIGRAM_FIELDS:
+            return None
+        reader = searcher.reader()
+        if reader.generation() != self._trigrams_generation:
+            self._trigrams, self._trigrams_generation = {}, reader.generation()
+
+        index = self._trigrams.get(fieldname)
+        if index is None:
+            started = time.perf_counter()
+            index = self._trigrams[fieldname] = TrigramIndex.from_reader(reader, fieldname)
+            logger.info(f"Built trigram index of {len(index)} {fieldname} terms "
+                        f"in {time.perf_counter() - started:.2f}s")
+        return index
+
+    def parse_query(self, searcher, query_text):
+        """Parse a query, with fuzzy ("word~2") terms enabled"""
+        query = self.parser(searcher.schema).parse(query_text)
+        if self.use_trigrams:
+            query = expand_query(query, lambda fieldname: self.trigram_index(searcher, fieldname))
+        return query
+
+    def highlight(self, hit, text_for, docnums=None):
+        """
+        Return highlighted snippets for a hit, from the index or from the text store
+
+        docnums lists the hits of the page, whose term offsets are read together.
+        """
+        content = hit.searcher.schema["content"]
+        if content.stored:
+            if content.supports("characters"):
+                return highlight_hit(hit, "content", hit.results.fragmenter, top=3, docnums=docnums)
+            return hit.highlights("content", top=3)  # Built before offsets were stored
+        text = text_for(hit["filename"], hit.get("page")) if text_for else None
+        return hit.highlights("content", text=text, top=3) if text else ""
+
+    def metadata_filter(self, filters):
+        """Return a query matching the documents that pass metadata filters, or None"""
+        queries = []
+        for field, value in (filters or {}).items():
+            if field == "file_number":
+                queries.append(Term(field, value))
+            else:
+                queries.append(NumericRange(field, value[0], value[1]))
+        if not queries:
+            return None
+        return queries[0] if len(queries) == 1 else And(queries)
+
+    def sort_facet(self, sort):
+        """Return the Whoosh facet of a metadata sort order"""
+        fields, descending = SORT_FIELDS[sort]
+        if not descending:
+            return MultiFacet([FieldFacet(field) for field in fields])
+        facets = []
+        for field in fields:
+            # Missing numbers are stored as the largest value: keep them last
+            facets.append(QueryFacet({0: Every(field)}, other=1))
+            facets.append(FieldFacet(field, reverse=True))
+        return MultiFacet(facets)
+
+    def search(self, query_text, page=1, per_page=10, text_for=None, filters=None, sort=None, snippets=True):
+        """
+        Run a query and return one page of hits
+
+        Args:
+            query_text (str): Search query
+            page (int): Page number
+            per_page (int): Hits per page
+            text_for (callable): text_for(filename, page) returns the OCR text
+                to highlight when the index does not store it
+            filters (dict): Metadata filters (see doc_metadata.split_filters)
+            sort (str): Metadata sort order instead of relevance (see SORT_FIELDS);
+                hits then have no score
+            snippets (bool): Highlight the hits; without it their snippets are
+                None, to be fetched later with hit_snippets()
+
+        Returns:
+            dict: See search_results()
+        """
+        with self.searcher() as searcher:
+            # Search both title and content
+            query = self.parse_query(searcher, query_text)
+            metadata = self.metadata_filter(filters)
+            text_query = bool(query_text.strip())
+            if metadata is not None and not text_query:
+                # Only filters: the lookup is the query, and there is nothing to highlight
+                query, metadata = metadata, None
+
+            options = {}
+            if sort:
+                options["sortedby"] = self.sort_facet(sort)
+
+            if is_paged(searcher):  # The searcher's schema; ix.schema reads the TOC file
+                # Rank each PDF by its best page, and count the PDFs. This is
+                # search_page(collapse="path", groupedby="path", filter=metadata)
+                # but with the filter applied before collapsing
+                collector = searcher.collector(limit=max(page, 1) * per_page, groupedby="path", **options)
+                if metadata is not None:
+                    collector = AllowedMatchesCollector(collector, allow=metadata)
+                collector = CollapseCollector(collector, "path")
+                searcher.search_with_collector(query, collector)
+                results = ResultsPage(collector.results(), max(page, 1), per_page)
+                total = total_docs = len(results.results.groups("path"))
+                # Collapsing drops the other pages from the groups: look up those of the PDFs
+                # shown (metadata filters need not apply, all pages of a PDF share its metadata)
+                groups = self.page_members(searcher, query, [hit["path"] for hit in results])
+                page_column = self.page_column(searcher)
+            else:
+                results = searcher.search_page(query, page, pagelen=per_page, filter=metadata, **options)
+                groups = page_column = None
+                total, total_docs = len(results), results.total
+
+            # Create a context fragmenter for better highlighting
+            results.results.fragmenter = new_fragmenter()
+
+            hits = []
+            docnums = [hit.docnum for hit in results]
+            for hit in results:
+                highlighted = (self.highlight(hit, text_for, docnums) if snippets else None) if text_query else ""
+                members = groups.get(hit["path"], [hit.docnum]) if groups is not None else None
+                score = None if sort else hit.score  # Sorted hits are not scored
+                hits.append(self.hit_result(hit.fields(), highlighted, score, members, page_column))
+
+            return search_results(hits, total, total_docs, page, per_page)
+
+    def page_members(self, searcher, query, paths):
+        """Return {path: docnums of its matching pages} for some PDFs of a page-granular index"""
+        if not paths:
+            return {}
+        path_column = searcher.reader().column_reader("path")
+        members = {}
+        for docnum in searcher.docs_for_query(And([query, Or([Term("path", path) for path in set(paths)])])):
+            members.setdefault(path_column[docnum], []).append(docnum)
+        return members
+
+    def hit_result(self, fields, snippets, score, members=None, page_column=None, max_pages=MAX_LISTED_PAGES):
+        """
+        Return the result dict of a hit from its stored fields
+
+        In page-granular indexes, members are the docnums of the matching
+        pages of the hit's PDF, of which max_pages (None: all) are listed.
+        """
+        found = {
+            "title": fields["title"],
+            "path": fields["path"],
+            "filename": fields["filename"],
+            "snippets": snippets,
+            "score": score,
+            "metadata": hit_metadata(fields),
+        }
+        if members is not None:
+            found["page"] = fields["page"]
+            found["pages"] = sorted(page_column[docnum] for docnum in members)[:max_pages]
+            found["page_hits"] = len(members)
+        return found
+
+    def search_after(self, query_text, after=None, limit=10, text_for=None, filters=None,
+                     snippets=False, count=False):
+        """
+        Run a query and return the hits ranked after a search-after cursor
+
+        search() collects the top page * per_page hits to show one page; this
+        only keeps `limit` hits however deep the cursor is, and counts the
+        matches only when asked to. Hits are in relevance order.
+
+        Args:
+            query_text (str): Search query
+            after (list): The "after" of the previous call, or None for the first hits
+            limit (int): Number of hits
+            text_for (callable): See search()
+            filters (dict): Metadata filters (see doc_metadata.split_filters)
+            snippets (bool): Highlight the hits (their snippets are None otherwise)
+            count (bool): Count all the matching documents (PDFs in page-granular indexes)
+
+        Returns:
+            dict: "hits" (as in search()), "total" (None unless counted) and
+            "after", the cursor of the next hits (None after the last ones)
+        """
+        with self.searcher() as searcher:
+            query = self.parse_query(searcher, query_text)
+            metadata = self.metadata_filter(filters)
+            text_query = bool(query_text.strip())
+            if metadata is not None and not text_query:
+                query, metadata = metadata, None
+
+            paged = is_paged(searcher)
+            if paged:
+                top = GroupedSearchAfterCollector("path", limit, after)
+            else:
+                top = SearchAfterCollector(limit, after)
+            collector = top if metadata is None else FilterCollector(top, allow=metadata)
+            searcher.search_with_collector(query, collector)
+            results = collector.results()
+            results.fragmenter = new_fragmenter()
+
+            page_column = self.page_column(searcher) if paged else None
+            docnums = [hit.docnum for hit in results]
+            hits = []
+            for hit in results:
+                highlighted = (self.highlight(hit, text_for, docnums) if snippets else None) if text_query else ""
+                members = top.hit_members[hit.docnum] if paged else None
+                hits.append(self.hit_result(hit.fields(), highlighted, hit.score, members, page_column))
+
+            last = results.top_n[-1] if hits and len(hits) == limit else None
+            # Whoosh skips matches that cannot make the top hits, so
+            # TopCollector counts them again (without scoring) when asked
+            return {"hits": hits, "total": collector.count() if count else None,
+                    "after": [last[0], last[1]] if last else None}
+
+    def export(self, query_text, filters=None, ranked=True):
+        """
+        Yield every hit of a query, for bulk exports
+
+        Ranked hits come in relevance order; only their (score, docnum)
+        pairs are collected before the first one is yielded. Unranked hits
+        are not scored (their score is None) and are streamed in index order
+        straight from the matching postings. Hit dicts are built one at a
+        time from the stored fields, so memory does not grow with them; in
+        page-granular indexes the docnums of the matching pages are kept to
+        group them by PDF, whose "pages" lists all of them.
+
+        Args:
+            query_text (str): Search query
+            filters (dict): Metadata filters (see doc_metadata.split_filters)
+            ranked (bool): Score and rank the hits
+
+        Yields:
+            dict: Hits as in search(), with no snippets (see hit_snippets())
+        """
+        with self.searcher() as searcher:
+            query = self.parse_query(searcher, query_text)
+            metadata = self.metadata_filter(filters)
+            if metadata is not None and not query_text.strip():
+                query, metadata = metadata, None
+            if metadata is not None and not ranked:
+                # Unscored: the filter is just another required clause
+                query, metadata = And([query, metadata]), None
+
+            paged = is_paged(searcher)
+            members = {}
+            if ranked:
+                if paged:
+                    top = GroupedSearchAfterCollector("path", limit=max(searcher.doc_count_all(), 1))
+                else:
+                    top = searcher.collector(limit=None)
+                collector = top if metadata is None else FilterCollector(top, allow=metadata)
+                searcher.search_with_collector(query, collector)
+                ranking = collector.results().top_n
+                if paged:
+                    members = top.hit_members
+            elif paged:
+                # Each PDF comes at its first matching page
+                path_column = searcher.reader().column_reader("path")
+                groups = {}
+                for docnum in searcher.docs_for_query(query):
+                    groups.setdefault(path_column[docnum], []).append(docnum)
+                members = {docnums[0]: docnums for docnums in groups.values()}
+                ranking = ((None, docnum) for docnum in members)
+            else:
+                ranking = ((None, docnum) for docnum in searcher.docs_for_query(query))
+
+            page_column = self.page_column(searcher) if paged else None
+            for score, docnum in ranking:
+                yield self.hit_result(searcher.stored_fields(docnum), None, score,
+                                      members[docnum] if paged else None, page_column, max_pages=None)
+
+    def hit_snippets(self, query_text, hits, text_for=None):
+        """
+        Highlight hits returned by search(..., snippets=False)
+
+        Args:
+            query_text (str): The text query of the search (without metadata filters)
+            hits (list): Hits, identified by path (and page)
+            text_for (callable): See search()
+
+        Returns:
+            list: Snippets of each hit, "" where there are none
+        """
+        if not hits or not query_text.strip():
+            return [""] * len(hits)
+        with self.searcher() as searcher:
+            paged = is_paged(searcher)
+            docs = [And([Term("path", hit["path"]), NumericRange("page", hit["page"], hit["page"])])
+                    if paged else Term("path", hit["path"]) for hit in hits]
+            # Intersected with the documents, the query only visits these
+            results = searcher.search(And([self.parse_query(searcher, query_text), Or(docs)]), limit=len(hits))
+            results.fragmenter = new_fragmenter()
+
+            docnums = [hit.docnum for hit in results]
+            found = {}
+            for hit in results:
+                fields = hit.fields()
+                found[(fields["path"], fields.get("page"))] = self.highlight(hit, text_for, docnums)
+            return [found.get((hit["path"], hit.get("page")), "") for hit in hits]
+
+
+class WhooshBackend(SearchBackend):
+    name = "whoosh"
+
+    def exists(self, directory):
+        return os.path.isdir(directory) and exists_in(directory)
+
+    def create(self, directory, pages=False, store_content=True):
+        create_in(directory, make_schema(pages=pages, store_content=store_content))
+
+    def layout(self, directory):
+        ix = open_dir(directory)
+        return {"pages": is_paged(ix), "store_content": ix.schema["content"].stored}
+
+    def writer(self, directory, limitmb=256, procs=1, batchsize=20, keep_segments=False):
+        ix = open_dir(directory)
+        if procs > 1:
+            # Job files of batchsize documents bound what the parent holds in memory
+            return WhooshWriter(ix.writer(procs=procs, limitmb=limitmb, batchsize=batchsize,
+                                          multisegment=keep_segments))
+        return WhooshWriter(ix.writer(limitmb=limitmb))
+
+    def optimize(self, directory):
+        ix = open_dir(directory)
+        segments = len(ix._segments())
+        ix.optimize()
+        logger.info(f"Merged {segments} segments")
+
+    def open(self, directory, trigrams=True):
+        return WhooshIndex(open_dir(directory), trigrams=trigrams)
+
+
+# SQLite FTS5
+
+SQLITE_FILENAME = "fts.sqlite3"
+SQLITE_VERSION = 2  # 2: metadata columns
+
+# Whoosh-syntax query tokens: phrases, parentheses, and everything else up to whitespace
+QUERY_TOKEN = re.compile(r'"[^"]*"(?:\^[\d.]*)?|[()]|[^\s()"]+|"')
+FIELD_PREFIX = re.compile(r"^(title|content):", re.IGNORECASE)
+FUZZY_SUFFIX = re.compile(r"~(\d)?(?:/(\d+))?$")
+BOOST_SUFFIX = re.compile(r"\^[\d.]*$")
+# Words as the FTS5 unicode61 tokenizer splits them
+FTS_WORD = re.compile(r"[^\W_]+")
+OPERATORS = ("AND", "OR", "NOT", "ANDNOT", "ANDMAYBE")
+
+# Control characters marking matches in snippet() output, replaced after escaping
+MATCH_START, MATCH_END, ELLIPSIS = "\x02", "\x03", "\x04"
+SNIPPET_TOKENS = 40
+
+
+def fts_string(text):
+    """Quote text as an FTS5 string"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_terms(terms):
+    """Return an FTS5 expression matching any of the given terms"""
+    if not terms:
+        return '""'  # An empty phrase matches nothing
+    if len(terms) == 1:
+        return fts_string(terms[0])
+    return "(" + " OR ".join(fts_string(term) for term in terms) + ")"
+
+
+class SQLiteWriter:
+    def __init__(self, path, limitmb=256):
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute(f"PRAGMA cache_size = {-int(limitmb) * 1024}")
+        meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        self.paged = meta["pages"] == "1"
+        self.can_delete = meta["store_content"] == "1" or meta.get("contentless_delete") == "1"
+        # Older databases have no metadata columns
+        self.columns = ("path", "page", "filename", "title")
+        if int(meta["version"]) >= 2:
+            self.columns += METADATA_FIELDS
+        self.insert = (f"INSERT INTO documents ({', '.join(self.columns)}) "
+                       f"VALUES ({', '.join('?' * len(self.columns))})")
+
+    def add(self, fields):
+        cursor = self.db.execute(self.insert, [fields.get(column) for column in self.columns])
+        self.db.execute("INSERT INTO fts (rowid, title, content) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, fields["title"], fields["content"]))
+
+    def delete(self, path):
+        if self.can_delete:
+            self.db.execute("DELETE FROM fts WHERE rowid IN (SELECT id FROM documents WHERE path = ?)", (path,))
+        # Otherwise the rows stay in the contentless FTS table until the next
+        # rebuild; searches only return rows that still have a document
+        self.db.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+    def commit(self, optimize=False, merge=True):
+        try:
+            self.db.commit()
+            if optimize:
+                self.db.execute("INSERT INTO fts (fts) VALUES ('optimize')")
+                self.db.commit()
+        finally:
+            self.db.close()
+
+    def cancel(self):
+        try:
+            self.db.rollback()
+            self.db.close()
+        except sqlite3.ProgrammingError:
+            pass  # Already committed and closed
+
+
+class SQLiteIndex:
+    def __init__(self, path, trigrams=True):
+        """
+        Args:
+            path (str): SQLite database file
+            trigrams (bool): Expand fuzzy and wildcard terms through a trigram
+                index of the vocabulary (otherwise they are searched as plain words)
+        """
+        self.path = path
+        self.uri = Path(path).resolve().as_uri() + "?mode=ro"
+        self.use_trigrams = trigrams
+        self._local = threading.local()
+        self._vocabulary = None
+        self._vocabulary_version = None
+        meta = dict(self.connection().execute("SELECT key, value FROM meta"))
+        self.paged = meta["pages"] == "1"
+        self.store_content = meta["store_content"] == "1"
+
+    def connection(self):
+        """Return this thread's read-only connection"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.uri, uri=True, timeout=30, check_same_thread=False)
+        return db
+
+    def close_handles(self):
+        """Close this thread's connection and drop every thread's (before forking worker processes)"""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+        self._local = threading.local()
+
+    def doc_count(self):
+        return self.connection().execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def generation(self):
+        """Identify the index contents: the database file and its modification time"""
+        return f"{self.path}:{os.stat(self.path).st_mtime_ns}"
+
+    def vocabulary(self):
+        """Return the trigram index of the indexed terms, rebuilt after writes"""
+        db = self.connection()
+        version = db.execute("SELECT count(*), max(id) FROM documents").fetchone()
+        if self._vocabulary is None or version != self._vocabulary_version:
+            started = time.perf_counter()
+            terms = [row[0] for row in db.execute("SELECT term FROM vocabulary ORDER BY term")]
+            self._vocabulary, self._vocabulary_version = TrigramIndex(terms), version
+            logger.info(f"Built trigram index of {len(terms)} terms in {time.perf_counter() - started:.2f}s")
+        return self._vocabulary
+
+    def translate(self, query_text):
+        """
+        Translate a Whoosh-syntax query into an FTS5 query
+
+        Operators bind as in Whoosh: NOT, then AND, then OR, then ANDNOT and
+        ANDMAYBE, then the implicit AND between terms. Known differences:
+            - Boosts ("kennedy^2") are ignored; ranking is bm25() alone.
+            - ANDMAYBE keeps only its left side.
+            - Dangling operators ("kennedy OR"), unmatched parentheses and quotes are dropped.
+            - NOT needs something to exclude from: "police NOT fbi" and
+              "police AND NOT fbi" work, but a query of only NOT terms
+              ("NOT fbi") or a negated alternative ("kennedy OR NOT fbi")
+              raises ValueError.
+
+        Returns:
+            tuple: (FTS5 query, set of terms to highlight, list of prefixes to highlight)
+
+        Raises:
+            ValueError: If the query can't be expressed in FTS5
+        """
+        tokens = QUERY_TOKEN.findall(query_text)
+        terms, prefixes = set(), []
+        position = 0
+
+        # Each parse returns None or (expression, negated); FTS5's NOT is
+        # binary, so negated parts are held back until ANDed with something
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def take():
+            nonlocal position
+            position += 1
+            return tokens[position - 1]
+
+        def combine_all(parts):
+            included = [expression for expression, negated in parts if not negated]
+            excluded = [expression for expression, negated in parts if negated]
+            if not included:
+                # NOT a AND NOT b is NOT (a OR b)
+                return combine_any([(expression, False) for expression in excluded])[0], True
+            expression = included[0] if len(included) == 1 else "(" + " AND ".join(included) + ")"
+            if excluded:
+                expression = "(" + expression + "".join(f" NOT {item}" for item in excluded) + ")"
+            return expression, False
+
+        def combine_any(parts):
+            if len(parts) == 1:
+                return parts[0]
+            if any(negated for _, negated in parts):
+                raise ValueError("NOT can't be one side of OR, e.g. kennedy OR NOT fbi")
+            return "(" + " OR ".join(expression for expression, _ in parts) + ")", False
+
+        def parse_query(column=None, closing=False):
+            parts = []
+            while peek() is not None:
+                if peek() == ")":
+                    if closing:
+                        break
+                    take()  # Unmatched, drop it
+                    continue
+                part = parse_clause(column)
+                if part:
+                    parts.append(part)
+            return combine_all(parts) if parts else None
+
+        def parse_clause(column):
+            left = parse_any(column)
+            while peek() in ("ANDNOT", "ANDMAYBE"):
+                operator = take()
+                right = parse_any(column)
+                # ANDMAYBE only affects ranking in Whoosh, so match without it;
+                # with nothing on its left, either drops its right side as in Whoosh
+                if left and right and operator == "ANDNOT":
+                    left = combine_all([left, (right[0], not right[1])])
+            return left
+
+        def parse_any(column):
+            parts = []
+            while True:
+                part = parse_all(column)
+                if part:
+                    parts.append(part)
+                if peek() != "OR":
+                    break
+                take()
+            return combine_any(parts) if parts else None
+
+        def parse_all(column):
+            parts = []
+            while True:
+                part = parse_unary(column)
+                if part:
+                    parts.append(part)
+                if peek() != "AND":
+                    break
+                take()
+            return combine_all(parts) if parts else None
+
+        def parse_unary(column):
+            if peek() == "NOT":
+                take()
+                part = parse_unary(column)
+                return part and (part[0], not part[1])
+            if peek() in (None, ")") or peek() in OPERATORS:
+                return None  # A dangling operator
+            return parse_term(column)
+
+        def parse_term(column):
+            token = take()
+            if token == "(":
+                # A field prefix before "(" applies to each term of the group
+                # without one: FTS5 can't nest column filters
+                part = parse_query(column, closing=True)
+                if peek() == ")":
+                    take()  # An unclosed group runs to the end of the query
+                return part
+
+            field = FIELD_PREFIX.match(token)
+            if field:
+                token = token[field.end():]
+                if not token:
+                    # Applies to the next token, e.g. title:"..." or title:(...)
+                    if peek() in (None, ")") or peek() in OPERATORS:
+                        return None
+                    return parse_term(field.group(1).lower())
+                column = field.group(1).lower()
+
+            token = BOOST_SUFFIX.sub("", token)
+            if token.startswith('"'):
+                words = [word.lower() for word in FTS_WORD.findall(token)]
+                expression = fts_string(" ".join(words)) if words else None
+                terms.update(words)
+            else:
+                expression = self.translate_term(token, terms, prefixes)
+
+            if not expression:
+                return None
+            return (f"{column} : {expression}" if column else expression), False
+
+        query = parse_query()
+        if query and query[1]:
+            raise ValueError("NOT needs a term to exclude from, e.g. police NOT fbi")
+        return (query[0] if query else ""), terms, prefixes
+
+    def translate_term(self, token, terms, prefixes):
+        """Translate a single query term, collecting what to highlight"""
+        fuzzy = FUZZY_SUFFIX.search(token)
+        if fuzzy:
+            word = token[:fuzzy.start()].lower()
+            if not self.use_trigrams:
+                token = word
+            else:
+                maxdist = int(fuzzy.group(1) or 1)
+                found = self.vocabulary().fuzzy(word, maxdist, int(fuzzy.group(2) or 0))
+                terms.update(found)
+                return fts_terms(found)
+
+        if "*" in token or "?" in token:
+            pattern = token.lower()
+            stem = pattern[:-1]
+            if pattern.endswith("*") and FTS_WORD.fullmatch(stem):
+                prefixes.append(stem)
+                return fts_string(stem) + "*"
+            if self.use_trigrams:
+                found = self.vocabulary().wildcard(pattern)
+                terms.update(found)
+                return fts_terms(found)
+            token = pattern.replace("*", " ").replace("?", " ")
+
+        words = [word.lower() for word in FTS_WORD.findall(token)]
+        terms.update(words)
+        # "F.B.I." is indexed as the words f, b, i: match them as a phrase
+        return fts_string(" ".join(words)) if words else None
+
+    def snippets(self, match, rows, terms, prefixes, text_for):
+        """Return {row id: snippets} for the hits being shown"""
+        if not rows:
+            return {}
+        db = self.connection()
+        if self.store_content:
+            ids = [row[0] for row in rows]
+            placeholders = ", ".join("?" * len(ids))
+            found = db.execute(
+                f"SELECT rowid, snippet(fts, 1, ?, ?, ?, {SNIPPET_TOKENS}) FROM fts "
+                f"WHERE fts MATCH ? AND rowid IN ({placeholders})",
+                [MATCH_START, MATCH_END, ELLIPSIS, match] + ids)
+            return {rowid: html.escape(text or "")
+                    .replace(MATCH_START, '<b class="match term0">').replace(MATCH_END, "</b>")
+                    .replace(ELLIPSIS, "...")
+                    for rowid, text in found}
+
+        # Contentless table: highlight the text from the text store
+        if prefixes:
+            vocabulary = self.vocabulary()
+            terms = terms | {term for prefix in prefixes for term in vocabulary.prefix(prefix)}
+        analyzer = StandardAnalyzer(stoplist=None)
+        snippets = {}
+        for row in rows:
+            text = text_for(row[2], row[4]) if text_for else None
+            if text:
+                snippets[row[0]] = highlight(text, terms, analyzer, new_fragmenter(),
+                                             HtmlFormatter(tagname="b"), top=3)
+        return snippets
+
+    def metadata_conditions(self, filters, params):
+        """Return the SQL conditions of metadata filters, adding their parameters"""
+        conditions = []
+        for field, value in (filters or {}).items():
+            if field not in METADATA_FIELDS:
+                raise ValueError(f"Unknown metadata field: {field}")
+            if field == "file_number":
+                conditions.append("d.file_number = :file_number")
+                params["file_number"] = value
+                continue
+            low, high = value
+            if low is not None:
+                conditions.append(f"d.{field} >= :{field}_low")
+                params[f"{field}_low"] = low
+            if high is not None:
+                conditions.append(f"d.{field} <= :{field}_high")
+                params[f"{field}_high"] = high
+        return conditions
+
+    def search(self, query_text, page=1, per_page=10, text_for=None, filters=None, sort=None, snippets=True):
+        """
+        Run a query and return one page of hits (see WhooshIndex.search)
+
+        Hits are ranked by bm25() over title and content; in page-granular
+        indexes each PDF is ranked by its best page. Metadata filters are
+        conditions on the indexed documents columns.
+        """
+        match, terms, prefixes = self.translate(query_text)
+        params = {"match": match, "limit": per_page, "offset": (max(page, 1) - 1) * per_page}
+        conditions = self.metadata_conditions(filters, params)
+        if not match and not conditions:
+            return search_results([], 0, 0, page, per_page)
+
+        db = self.connection()
+        order = "rank, id"
+        if sort:
+            fields, descending = SORT_FIELDS[sort]
+            direction = " DESC" if descending else ""
+            order = ", ".join(f"{field} IS NULL, {field}{direction}" for field in fields) + ", rank, id"
+        sql = self.ranked_sql(match, conditions, order) + " LIMIT :limit OFFSET :offset"
+
+        rows = db.execute(sql, params).fetchall()
+        if not rows and page > 1:
+            # Past the last page: show the last page, like Whoosh's search_page()
+            total = db.execute(sql, dict(params, limit=1, offset=0)).fetchone()
+            if total:
+                page = math.ceil(total[8] / per_page)
+                params["offset"] = (page - 1) * per_page
+                rows = db.execute(sql, params).fetchall()
+        total = rows[0][8] if rows else 0
+
+        highlighted = self.snippets(match, rows, terms, prefixes, text_for) if match and snippets else {}
+        hits = [self.row_result(row, (highlighted.get(row[0], "") if snippets else None) if match else "",
+                                None if sort else -row[5])  # bm25() is lower for better matches
+                for row in rows]
+        return search_results(hits, total, total, page, per_page)
+
+    def ranked_sql(self, match, conditions, order, total="count(*) OVER ()", after=None, scored=True):
+        """
+        Return the SQL of the ranked hits of a query
+
+        Rows are (id, path, filename, title, page, rank, page hits, pages,
+        total, metadata fields...); in page-granular indexes one per PDF, for
+        its best page.
+
+        Args:
+            match (str): FTS5 query, or None to rank every document matching the conditions equally
+            conditions (list): SQL conditions on the documents (see metadata_conditions)
+            order (str): ORDER BY clause
+            total (str): SQL of the total column
+            after (str): Condition on the rank and id of the hits
+            scored (bool): Rank matches with bm25() (otherwise all rank 0)
+        """
+        where = " AND ".join(conditions) or "1"
+        if match:
+            rank = "bm25(fts)" if scored else "0.0"
+            matches = f"WITH m AS MATERIALIZED (SELECT rowid, {rank} AS rank FROM fts WHERE fts MATCH :match)"
+        else:
+            # Only filters: look the documents up by their columns
+            matches = f"WITH m AS MATERIALIZED (SELECT d.id AS rowid, 0.0 AS rank FROM documents d WHERE {where})"
+        columns = ", ".join(f"d.{field}" for field in METADATA_FIELDS)
+
+        if self.paged:
+            return (f"{matches}, g AS (SELECT d.id, d.path, d.filename, d.title, d.page, min(m.rank) AS rank, "
+                    f"count(*) AS hits, group_concat(d.page) AS pages, {columns} "
+                    f"FROM m JOIN documents d ON d.id = m.rowid WHERE {where} GROUP BY d.path) "
+                    f"SELECT id, path, filename, title, page, rank, hits, pages, {total}, "
+                    f"{', '.join(METADATA_FIELDS)} FROM g WHERE {after or '1'} ORDER BY {order}")
+        return (f"{matches} SELECT d.id, d.path, d.filename, d.title, d.page, m.rank, 1, NULL, {total}, "
+                f"{columns} FROM m JOIN documents d ON d.id = m.rowid WHERE {where} AND {after or '1'} "
+                f"ORDER BY {order}")
+
+    def row_result(self, row, snippets, score, max_pages=MAX_LISTED_PAGES):
+        """Return the result dict of a ranked_sql() row, listing max_pages matching pages (None: all)"""
+        row_id, path, filename, title, best_page, rank, page_hits, pages = row[:8]
+        found = {
+            "title": title,
+            "path": path,
+            "filename": filename,
+            "snippets": snippets,
+            "score": score,
+            "metadata": hit_metadata(dict(zip(METADATA_FIELDS, row[9:]))),
+        }
+        if self.paged:
+            found["page"] = best_page
+            found["pages"] = sorted(int(number) for number in pages.split(","))[:max_pages]
+            found["page_hits"] = page_hits
+        return found
+
+    def search_after(self, query_text, after=None, limit=10, text_for=None, filters=None,
+                     snippets=False, count=False):
+        """
+        Run a query and return the hits ranked after a search-after cursor (see WhooshIndex.search_after)
+
+        Hits are ordered by bm25() rank, then row id; the cursor is the
+        (rank, id) of the last hit returned, so SQLite only keeps the next
+        `limit` rows instead of skipping an OFFSET.
+        """
+        match, terms, prefixes = self.translate(query_text)
+        params = {"match": match, "limit": limit}
+        conditions = self.metadata_conditions(filters, params)
+        if not match and not conditions:
+            return {"hits": [], "total": 0 if count else None, "after": None}
+
+        db = self.connection()
+        cursor = None
+        if after:
+            cursor = "(rank > :after_rank OR (rank = :after_rank AND id > :after_id))"
+            params["after_rank"], params["after_id"] = after
+        # Without a cursor every match is ranked anyway, and counted by a window in the same query
+        counted = count and not after
+        rows = db.execute(self.ranked_sql(match, conditions, "rank, id", total="count(*) OVER ()" if counted else "NULL",
+                                          after=cursor) + " LIMIT :limit", params).fetchall()
+
+        total = None
+        if counted:
+            total = rows[0][8] if rows else 0
+        elif count:
+            total = db.execute(f"SELECT count(*) FROM ({self.ranked_sql(match, conditions, 'id', total='NULL')})",
+                               params).fetchone()[0]
+
+        highlighted = self.snippets(match, rows, terms, prefixes, text_for) if match and snippets else {}
+        hits = [self.row_result(row, (highlighted.get(row[0], "") if snippets else None) if match else "", -row[5])
+                for row in rows]
+        last = rows[-1] if rows and len(rows) == limit else None
+        return {"hits": hits, "total": total, "after": [last[5], last[0]] if last else None}
+
+    def export(self, query_text, filters=None, ranked=True):
+        """
+        Yield every hit of a query, for bulk exports (see WhooshIndex.export)
+
+        Rows are read from the SQLite cursor as they are yielded; unranked
+        hits are not scored and come in row id order.
+        """
+        match, _, _ = self.translate(query_text)
+        params = {"match": match}
+        conditions = self.metadata_conditions(filters, params)
+        if not match and not conditions:
+            return
+        sql = self.ranked_sql(match, conditions, "rank, id" if ranked else "id", total="NULL", scored=ranked)
+        for row in self.connection().execute(sql, params):
+            yield self.row_result(row, None, -row[5] if ranked else None, max_pages=None)
+
+    def hit_snippets(self, query_text, hits, text_for=None):
+        """Highlight hits returned by search(..., snippets=False) (see WhooshIndex.hit_snippets)"""
+        match, terms, prefixes = self.translate(query_text)
+        if not hits or not match:
+            return [""] * len(hits)
+        db = self.connection()
+        rows = []
+        for hit in hits:
+            row = db.execute("SELECT id, path, filename, title, page FROM documents WHERE path = ? AND page IS ?",
+                             (hit["path"], hit.get("page"))).fetchone()
+            if row:
+                rows.append(row)
+        highlighted = self.snippets(match, rows, terms, prefixes, text_for)
+        found = {(row[1], row[4]): highlighted.get(row[0], "") for row in rows}
+        return [found.get((hit["path"], hit.get("page")), "") for hit in hits]
+
+
+class SQLiteBackend(SearchBackend):
+    name = "sqlite"
+
+    def database(self, directory):
+        return os.path.join(directory, SQLITE_FILENAME)
+
+    def exists(self, directory):
+        return os.path.isfile(self.database(directory))
+
+    def create(self, directory, pages=False, store_content=True):
+        db = sqlite3.connect(self.database(directory))
+        try:
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, path TEXT NOT NULL, page INTEGER, "
+                       "filename TEXT, title TEXT, file_number TEXT, serial INTEGER, volume INTEGER, "
+                       "section INTEGER, part INTEGER, part_of INTEGER, doc_date INTEGER)")
+            db.execute("CREATE INDEX documents_path ON documents (path)")
+            db.execute("CREATE INDEX documents_file ON documents (file_number, volume, section, serial, part)")
+            db.execute("CREATE INDEX documents_date ON documents (doc_date)")
+
+            contentless_delete = False
+            if store_content:
+                db.execute("CREATE VIRTUAL TABLE fts USING fts5 (title, content)")
+            else:
+                try:
+                    # SQLite 3.43+ can delete from contentless tables
+                    db.execute("CREATE VIRTUAL TABLE fts USING fts5 (title, content, content='', contentless_delete=1)")
+                    contentless_delete = True
+                except sqlite3.OperationalError:
+                    db.execute("CREATE VIRTUAL TABLE fts USING fts5 (title, content, content='')")
+            db.execute("CREATE VIRTUAL TABLE vocabulary USING fts5vocab (fts, 'row')")
+
+            db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("version", str(SQLITE_VERSION)),
+                ("pages", "1" if pages else "0"),
+                ("store_content", "1" if store_content else "0"),
+                ("contentless_delete", "1" if contentless_delete else "0"),
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+    def layout(self, directory):
+        db = sqlite3.connect(self.database(directory))
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+        finally:
+            db.close()
+        return {"pages": meta["pages"] == "1", "store_content": meta["store_content"] == "1"}
+
+    def writer(self, directory, limitmb=256, procs=1, batchsize=20, keep_segments=False):
+        if procs > 1:
+            logger.info("The sqlite backend indexes in a single process")
+        return SQLiteWriter(self.database(directory), limitmb=limitmb)
+
+    def optimize(self, directory):
+        db = sqlite3.connect(self.database(directory))
+        try:
+            db.execute("INSERT INTO fts (fts) VALUES ('optimize')")
+            db.commit()
+            db.execute("VACUUM")
+        finally:
+            db.close()
+
+    def open(self, directory, trigrams=True):
+        return SQLiteIndex(self.database(directory), trigrams=trigrams)
+
+
+BACKENDS = {backend.name: backend for backend in (WhooshBackend(), SQLiteBackend())}
+DEFAULT_BACKEND = "whoosh"
+
+
+def get_backend(name):
+    """Return a backend by name"""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown search backend: {name} (available: {', '.join(sorted(BACKENDS))})")
+
+
+def detect_backend(directory):
+    """Return the backend of the index in a directory (Whoosh if there is none yet)"""
+    for backend in BACKENDS.values():
+        if backend.name != DEFAULT_BACKEND and backend.exists(directory):
+            return backend
+    return BACKENDS[DEFAULT_BACKEND]
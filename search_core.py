@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Search Core Module
+Search logic shared by the local (search_app.py) and deployed (web_app.py) interfaces
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+from itertools import islice
+from index_store import LiveIndex
+from text_store import TextStore, PAGE_MARKER
+from doc_metadata import split_filters, format_date
+from result_cache import cache_key, snippet_key
+
+logger = logging.getLogger(__name__)
+
+# Exported results highlighted together
+EXPORT_BATCH = 100
+
+
+def encode_cursor(state, after):
+    """Return the cursor token of a search state and a backend search-after key"""
+    data = json.dumps([state, after], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Return the (search state, backend search-after key) of a cursor token
+
+    Raises:
+        ValueError: If the token is not a cursor
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state, after = json.loads(data)
+        score, docnum = after
+        return state, [float(score), int(docnum)]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class SearchCore:
+    def __init__(self, index_dir="search_index", text_dir="ocr_text", trigrams=True, cache=None):
+        """
+        Args:
+            index_dir (str): Directory containing the search index
+            text_dir (str): OCR text store, used for snippets when the index does not store text
+            trigrams (bool): Expand fuzzy and wildcard terms through trigram indexes
+            cache: Result cache (see result_cache.make_cache), or None
+        """
+        self.index_dir = index_dir
+        self.text_store = TextStore(text_dir)
+        self.cache = cache
+        # Newly published index generations are picked up on the next request
+        self.live_index = LiveIndex(index_dir, trigrams=trigrams)
+        self.live_index.get()
+
+    @property
+    def ix(self):
+        """The current search index (a backend index, see search_backend.py), or None if it is not available"""
+        return self.live_index.get()
+
+    def empty_results(self, query_text, page):
+        return {"query": query_text, "total": 0, "total_docs": 0, "results": [], "page": page, "pages": 0,
+                "has_previous": False, "has_next": False}
+
+    def format_hit(self, hit):
+        """
+        Turn a backend hit into a result dict
+
+        Subclasses extend this with fields their templates need.
+        """
+        result = {
+            "title": hit["title"],
+            "path": hit["path"],
+            "filename": hit["filename"],
+            # None: not highlighted yet (see snippets())
+            "snippets": hit["snippets"] if hit["snippets"] is None else hit["snippets"] or "No preview available",
+            "score": hit["score"],
+        }
+        for key in ("page", "pages", "page_hits"):
+            if key in hit:
+                result[key] = hit[key]
+        metadata = dict(hit.get("metadata", {}))
+        if "doc_date" in metadata:
+            metadata["doc_date"] = format_date(metadata["doc_date"])
+        result["metadata"] = metadata
+        return result
+
+    def hit_text(self, filename, page=None):
+        """Read the text of a hit from the text store (just one page for page-level hits)"""
+        name = os.path.splitext(filename)[0]
+        try:
+            if page is not None:
+                section = self.text_store.read_page(name, page)
+                return PAGE_MARKER.sub("", section, count=1) if section else None
+            return self.text_store.read(name)
+        except Exception as e:
+            logger.warning(f"No text for snippets of {name}: {e}")
+            return None
+
+    def find(self, index, text, page, per_page, filters, sort, snippets):
+        """Run a search on the backend index, through the result cache (valid until the index generation changes)"""
+        if self.cache is None:
+            return index.search(text, page=page, per_page=per_page, text_for=self.hit_text,
+                                filters=filters, sort=sort, snippets=snippets)
+        generation = index.generation()
+        key = cache_key(text, page, per_page, filters, sort, snippets)
+        found = self.cache.get(generation, key)
+        if found is None:
+            found = index.search(text, page=page, per_page=per_page, text_for=self.hit_text,
+                                 filters=filters, sort=sort, snippets=snippets)
+            self.cache.put(generation, key, found)
+        return found
+
+    def search(self, query_text, page=1, per_page=10, filters=None, sort=None, snippets=True):
+        """
+        Search the index for documents matching the query
+
+        Args:
+            query_text (str): Search query, possibly with metadata filters and a sort order
+            page (int): Page number for pagination
+            per_page (int): Results per page
+            filters (dict): Metadata filters besides those in the query (see doc_metadata.split_filters)
+            sort (str): Sort order if the query has none ("date", "-date" or "file"; default: relevance)
+            snippets (bool): Highlight the results; without it their snippets
+                are None and can be fetched with snippets()
+
+        Returns:
+            dict: Search results. Every result has the "metadata" parsed from
+            its filename. With a page-granular index every result also
+            has "page" (best matching page), "pages" (matching page numbers)
+            and "page_hits" (number of matching pages).
+        """
+        index = self.ix
+        if not index:
+            logger.error("Search index not available")
+            return self.empty_results(query_text, page)
+
+        try:
+            text, query_filters, query_sort = split_filters(query_text)
+            filters = dict(filters or {}, **query_filters)
+            sort = query_sort or sort
+            found = self.find(index, text, page, per_page, filters, sort, snippets)
+
+            # Return search results and pagination info
+            page, pages = found["page"], found["pages"]
+            return {
+                "query": query_text,
+                "total": found["total"],
+                "total_docs": found["total_docs"],
+                "results": [self.format_hit(hit) for hit in found["hits"]],
+                "page": page,
+                "pages": pages,
+                "has_previous": page > 1,
+                "has_next": page < pages
+            }
+
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return self.empty_results(query_text, page)
+
+    def snippets(self, query_text, hits, page=1, per_page=10, filters=None, sort=None):
+        """
+        Highlight some results of a search(..., snippets=False) page
+
+        Only results of that page are highlighted: they are looked up in its
+        hits (from the result cache when there is one), and the snippets of
+        each hit are cached on their own.
+
+        Args:
+            query_text (str): Search query, as given to search()
+            hits (list): (position on the page, filename) of the results to
+                highlight; results whose filename no longer matches (the index
+                changed) are left out
+            page, per_page, filters, sort: As given to search()
+
+        Returns:
+            dict: Snippets by position
+        """
+        index = self.ix
+        if not index or not hits:
+            return {}
+
+        try:
+            text, query_filters, query_sort = split_filters(query_text)
+            filters = dict(filters or {}, **query_filters)
+            sort = query_sort or sort
+            found = self.find(index, text, page, per_page, filters, sort, snippets=False)["hits"]
+            wanted = {position: found[position] for position, filename in hits
+                      if 0 <= position < len(found) and found[position]["filename"] == filename}
+
+            snippets, missing, generation = {}, {}, None
+            if self.cache is not None:
+                generation = index.generation()
+                for position, hit in wanted.items():
+                    cached = self.cache.get(generation, snippet_key(text, hit["path"], hit.get("page")))
+                    if cached is None:
+                        missing[position] = hit
+                    else:
+                        snippets[position] = cached
+            else:
+                missing = wanted
+
+            highlighted = index.hit_snippets(text, list(missing.values()), text_for=self.hit_text)
+            for (position, hit), found_snippets in zip(missing.items(), highlighted):
+                if self.cache is not None:
+                    self.cache.put(generation, snippet_key(text, hit["path"], hit.get("page")), found_snippets)
+                snippets[position] = found_snippets
+            return {position: found_snippets or "No preview available"
+                    for position, found_snippets in snippets.items()}
+
+        except Exception as e:
+            logger.error(f"Snippet error: {e}")
+            return {}
+
+    def search_after(self, query_text, cursor=None, limit=10, filters=None, snippets=False, count=False):
+        """
+        Return the results of a query that come after a cursor, in relevance order
+
+        Unlike search(), deep results cost no more than the first ones: only
+        `limit` results are collected past the cursor, and matches are only
+        counted when asked to. Results are not cached.
+
+        Args:
+            query_text (str): Search query, possibly with metadata filters (but no sort order)
+            cursor (str): The "next_cursor" of the previous call, or None for the first results
+            limit (int): Number of results
+            filters (dict): Metadata filters besides those in the query
+            snippets (bool): Highlight the results (their snippets are None otherwise)
+            count (bool): Count all the matching documents ("total" is None otherwise)
+
+        Returns:
+            dict: "query", "results" (as in search()), "total" and
+            "next_cursor" (None after the last results)
+
+        Raises:
+            ValueError: If the query or cursor is invalid, or the cursor comes
+                from another query or index generation
+        """
+        index = self.ix
+        if not index:
+            raise RuntimeError("Search index not available")
+
+        text, query_filters, sort = split_filters(query_text)
+        if sort:
+            raise ValueError("Sort orders are not supported with cursors")
+        filters = dict(filters or {}, **query_filters)
+        # Cursors are only valid for the query and index they came from
+        state = hashlib.sha1(json.dumps([index.generation(), cache_key(text, None, None, filters)])
+                             .encode("utf-8")).hexdigest()[:16]
+        after = None
+        if cursor:
+            cursor_state, after = decode_cursor(cursor)
+            if cursor_state != state:
+                raise ValueError("The index or query changed; start again without a cursor")
+
+        try:
+            found = index.search_after(text, after=after, limit=limit, text_for=self.hit_text,
+                                       filters=filters, snippets=snippets, count=count)
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            raise
+        return {
+            "query": query_text,
+            "results": [self.format_hit(hit) for hit in found["hits"]],
+            "total": found["total"],
+            "next_cursor": encode_cursor(state, found["after"]) if found["after"] else None,
+        }
+
+    def export(self, query_text, filters=None, ranked=True, snippets=False):
+        """
+        Return a generator of every result of a query
+
+        Args:
+            query_text (str): Search query, possibly with metadata filters (but no sort order)
+            filters (dict): Metadata filters besides those in the query
+            ranked (bool): Relevance order; otherwise results are not scored
+                and come in index order, which is cheaper
+            snippets (bool): Highlight the results (their snippets are None otherwise)
+
+        Returns:
+            generator: Results as in search(), listing all their matching pages
+
+        Raises:
+            ValueError: If the query is invalid (raised here, not by the generator)
+        """
+        index = self.ix
+        if not index:
+            raise RuntimeError("Search index not available")
+        text, query_filters, sort = split_filters(query_text)
+        if sort:
+            raise ValueError("Sort orders are not supported in exports")
+        filters = dict(filters or {}, **query_filters)
+
+        def results():
+            hits = index.export(text, filters=filters, ranked=ranked)
+            while True:
+                batch = list(islice(hits, EXPORT_BATCH))
+                if not batch:
+                    return
+                if snippets and text.strip():
+                    for hit, found in zip(batch, index.hit_snippets(text, batch, text_for=self.hit_text)):
+                        hit["snippets"] = found
+                for hit in batch:
+                    yield self.format_hit(hit)
+
+        return results()
+
+    def warm_up(self, queries):
+        """
+        Run queries to load what the first searches would otherwise wait for
+
+        Opens a searcher or this thread's connection, builds the trigram
+        indexes (fuzzy and wildcard terms), and reads the index and text
+        files into the OS page cache. The result cache is bypassed, so a
+        process inheriting cached results still opens its own index.
+
+        Args:
+            queries (list): Queries as given to search(); failing ones are logged and skipped
+
+        Returns:
+            float: Seconds taken
+        """
+        started = time.perf_counter()
+        index = self.ix
+        if not index:
+            return 0.0
+        for query_text in queries:
+            try:
+                text, filters, sort = split_filters(query_text)
+                found = index.search(text, text_for=self.hit_text, filters=filters, sort=sort, snippets=True)
+                for hit in found["hits"]:
+                    self.format_hit(hit)
+            except Exception as e:
+                logger.warning(f"Warm-up query {query_text!r} failed: {e}")
+        return time.perf_counter() - started
+
+    def close_handles(self):
+        """
+        Close the index files and database connections worker processes must not share
+
+        Called in a preforking server's master after warming up: the workers
+        open their own, and share everything built in memory copy-on-write.
+        """
+        index = self.live_index.index
+        if index is not None:
+            index.close_handles()
+        if self.cache is not None:
+            self.cache.close_handles()
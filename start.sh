@@ -2,5 +2,5 @@
 # Install the required dependencies
 pip install -r requirements.txt
 
-# Start the app using Gunicorn
-python -m gunicorn web_app:app
\ No newline at end of file
+# Start the app using Gunicorn (preloaded, warmed-up workers; see gunicorn.conf.py)
+python -m gunicorn -c gunicorn.conf.py web_app:app
\ No newline at end of file
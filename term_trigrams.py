@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Term Trigram Module
+Character-trigram index over the search index's term dictionary
+
+Fuzzy ("attorney~2") and wildcard ("*tion") queries are expanded by Whoosh
+into every indexed term they match, and finding those terms means walking the
+whole term dictionary: a Levenshtein automaton for fuzzy terms, a regex over
+each term for wildcards without a literal prefix. With noisy OCR text the
+dictionary is large and these queries are slow.
+
+TrigramIndex maps each character trigram to the terms that contain it, so
+the candidate terms can be looked up instead:
+
+- fuzzy: a term within k edits of a word must share at least
+  (distinct trigrams of the word - 3k) trigrams with it, since one edit
+  destroys at most 3 trigrams. Candidates that pass are checked with the
+  exact edit distance, so the result is the same set of terms Whoosh would
+  find.
+- wildcard: a matching term must contain every trigram of the literal parts
+  of the pattern. Candidates are checked with the pattern itself.
+
+Terms are padded with "$$" at both ends, so trigrams also anchor the start
+and end of a word ("$$a", "on$").
+
+expand_query() rewrites the FuzzyTerm and Wildcard nodes of a parsed query
+into ExpandedTerms queries that carry the looked-up terms.
+"""
+
+import re
+import fnmatch
+import bisect
+import logging
+from array import array
+from collections import Counter
+from itertools import chain
+from whoosh.query import FuzzyTerm, Wildcard
+from whoosh.query.terms import MultiTerm
+from whoosh.support.levenshtein import levenshtein
+
+logger = logging.getLogger(__name__)
+
+PAD = "$$"
+WILDCARD_CHARS = re.compile(r"[*?]+")
+
+
+def trigrams(text):
+    """Return the set of trigrams of a padded term"""
+    padded = PAD + text + PAD
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def literal_trigrams(pattern):
+    """
+    Return the trigrams every term matching a glob pattern must contain
+
+    Args:
+        pattern (str): Pattern with "*" and "?" wildcards
+
+    Returns:
+        set: Trigrams of the literal parts of the pattern (anchored with the
+        padding where the pattern does not start or end with a wildcard)
+    """
+    grams = set()
+    for part in WILDCARD_CHARS.split(PAD + pattern + PAD):
+        grams.update(part[i:i + 3] for i in range(len(part) - 2))
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self, terms):
+        """
+        Args:
+            terms (list): Sorted list of the terms of one field
+        """
+        self.terms = terms
+        postings = {}
+        for termnum, term in enumerate(terms):
+            for gram in trigrams(term):
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array("I")
+                ids.append(termnum)
+        self.postings = postings
+
+    @classmethod
+    def from_reader(cls, reader, fieldname):
+        """Build the trigram index of a field's term dictionary"""
+        field = reader.schema[fieldname]
+        return cls([field.from_bytes(btext) for btext in reader.lexicon(fieldname)])
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _prefix_range(self, prefix):
+        """Return the range of term numbers starting with a prefix"""
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\U0010ffff")
+        return range(start, end)
+
+    def prefix(self, text):
+        """Return the terms starting with a prefix, in dictionary order"""
+        found = self._prefix_range(text)
+        return self.terms[found.start:found.stop]
+
+    def fuzzy(self, text, maxdist=1, prefix=0):
+        """
+        Find the terms within a Levenshtein distance of a word
+
+        Args:
+            text (str): Word to match
+            maxdist (int): Maximum edit distance
+            prefix (int): Number of leading characters that must match exactly
+
+        Returns:
+            list: Matching terms, in dictionary order
+        """
+        grams = trigrams(text)
+        needed = len(grams) - 3 * maxdist
+        if needed > 0:
+            counts = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+            candidates = sorted(termnum for termnum, count in counts.items() if count >= needed)
+        else:
+            # Short words with a large distance share no trigram necessarily
+            candidates = self._prefix_range(text[:prefix]) if prefix else range(len(self.terms))
+
+        start = text[:prefix]
+        length = len(text)
+        matches = []
+        for termnum in candidates:
+            term = self.terms[termnum]
+            if (abs(len(term) - length) <= maxdist and term.startswith(start)
+                    and levenshtein(text, term, maxdist) <= maxdist):
+                matches.append(term)
+        return matches
+
+    def wildcard(self, pattern):
+        """
+        Find the terms matching a glob pattern with "*" and "?" wildcards
+
+        Returns:
+            list: Matching terms, in dictionary order
+        """
+        regex = re.compile(fnmatch.translate(pattern))
+        grams = literal_trigrams(pattern)
+        if not grams:
+            return [term for term in self.terms if regex.match(term)]
+
+        # Intersect the rarest trigrams first
+        lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(ids)
+        return [self.terms[termnum] for termnum in sorted(candidates) if regex.match(self.terms[termnum])]
+
+
+class ExpandedTerms(MultiTerm):
+    """
+    A fuzzy or wildcard query whose matching terms were already looked up
+
+    Matches, scores and highlights like the query it replaces.
+    """
+
+    def __init__(self, fieldname, text, terms, boost=1.0, constantscore=True):
+        self.fieldname = fieldname
+        self.text = text
+        self.terms = terms
+        self.boost = boost
+        self.constantscore = constantscore
+
+    def __eq__(self, other):
+        return (other and self.__class__ is other.__class__
+                and self.fieldname == other.fieldname and self.text == other.text
+                and self.terms == other.terms and self.boost == other.boost)
+
+    def __hash__(self):
+        return hash(self.fieldname) ^ hash(self.text) ^ hash(self.boost)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.fieldname!r}, {self.text!r}, {len(self.terms)} terms)"
+
+    def __unicode__(self):
+        return f"{self.fieldname}:{self.text}"
+
+    __str__ = __unicode__
+
+    def _btexts(self, ixreader):
+        field = ixreader.schema[self.fieldname]
+        return [field.to_bytes(term) for term in self.terms]
+
+
+def expand_query(query, trigram_index):
+    """
+    Replace the fuzzy and wildcard terms of a query with trigram lookups
+
+    Args:
+        query (whoosh.query.Query): Parsed query
+        trigram_index (callable): Returns the TrigramIndex of a field name, or
+            None for fields without one
+
+    Returns:
+        whoosh.query.Query: Rewritten query (the original is not modified)
+    """
+    def rewrite(node):
+        if isinstance(node, FuzzyTerm):
+            index = trigram_index(node.fieldname)
+            if index is not None:
+                terms = index.fuzzy(node.text, node.maxdist, node.prefixlength)
+                return ExpandedTerms(node.fieldname, node.text, terms, node.boost, node.constantscore)
+        elif type(node) is Wildcard and "[" not in node.text:
+            # Prefix queries stay with Whoosh, which finds them with a range scan
+            index = trigram_index(node.fieldname)
+            if index is not None:
+                terms = index.wildcard(node.text)
+                return ExpandedTerms(node.fieldname, node.text, terms, node.boost, node.constantscore)
+        return node
+
+    return query.accept(rewrite)
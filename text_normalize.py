@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Text Normalization Module
+Clean up raw OCR text before it is indexed
+
+Tesseract output of old typewritten scans is full of noise ("eceeerscemmmemamn",
+"([)", "C3 ° *") that bloats the index vocabulary without ever matching a real
+query. normalize_text() is applied to the text going into the search index
+only; ocr_text keeps the raw OCR output. It:
+
+- joins words hyphenated across line breaks ("inves-\\ntigation")
+- drops junk words using character-class rules (few distinct letters,
+  no vowels, long consonant runs in words with few distinct letters,
+  letters and digits mixed over and over)
+  and tokens with no letters or digits at all
+- optionally drops unknown words that also look implausible, given a word
+  list (one word per line, e.g. /usr/share/dict/words)
+- collapses runs of spaces and blank lines
+
+"--- Page N ---" markers are left untouched.
+"""
+
+import re
+import sys
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rules change, so indexes built with older rules are rebuilt
+NORMALIZE_VERSION = 2
+
+HYPHEN_BREAK = re.compile(r"(\w)-[ \t]*\n[ \t]*(?=[a-z])")
+# Words long enough to judge; shorter ones are always kept
+CANDIDATE_WORD = re.compile(r"[^\W_]{4,}")
+# Whitespace-delimited tokens without a letter or digit, except page marker dashes
+SYMBOL_TOKEN = re.compile(r"(?<!\S)(?!---(?: |$))(?:[^\w\s]|_)+(?!\S)", re.MULTILINE)
+SPACES = re.compile(r"[ \t\f\v]+")
+EDGE_SPACES = re.compile(r"^ | $", re.MULTILINE)
+BLANK_LINES = re.compile(r"\n{3,}")
+WORD_PIECE = re.compile(r"[^\W_]+")
+# "iii" and "lll" are usually misread "ili"/"ll" in otherwise real words
+TRIPLE_LETTER = re.compile(r"([a-hj-km-z])\1\1", re.IGNORECASE)
+CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{6,}", re.IGNORECASE)
+# Names have consonant runs of 6 or 7 ("Knightsbridge", "Hirschsprung"), never this long
+JUNK_CONSONANT_RUN = 8
+LETTER_DIGIT_SWITCH = re.compile(r"(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])")
+VOWELS = set("aeiouyAEIOUY")
+
+MAX_TOKEN_LENGTH = 30
+
+# Real words and names the rules must keep, and noise they must drop ("--check")
+KEEP_EXAMPLES = ["Knightsbridge", "Hirschsprung", "Offfice", "Blvd", "HQTRS", "1968s", "Schwarzschild",
+                 "Washington", "strengths"]
+DROP_EXAMPLES = ["eceeerscemmmemamn", "ccceeeecesceees", "I4NBSo0", "mnrrmmnrrm", "xkcdqrtpzwm"]
+
+
+def is_junk(word, dictionary=None):
+    """
+    Decide whether an OCR word is noise
+
+    Args:
+        word (str): Run of letters and digits
+        dictionary (set): Optional set of lowercase known words
+
+    Returns:
+        bool: True if the word should be dropped
+    """
+    if len(word) > MAX_TOKEN_LENGTH:
+        return True
+    if len(word) < 4:
+        return False  # Too short to judge ("C3", "Mr", "12c")
+
+    letters = sum(c.isalpha() for c in word)
+    digits = sum(c.isdigit() for c in word)
+
+    if letters and digits:
+        # "I4NBSo0" switches between letters and digits over and over; "1968s" or "12c" do not
+        return len(LETTER_DIGIT_SWITCH.findall(word)) >= 3
+
+    if not letters:
+        return False  # Numbers are kept
+    # Few distinct letters: "eceeerscemmmemamn", "ccceeeecesceees" (but not "Offfice")
+    variety = len(set(word.lower())) / len(word)
+    if (TRIPLE_LETTER.search(word) and variety <= 0.5) or (len(word) >= 12 and variety < 0.35):
+        return True
+    # A long consonant run alone is no evidence: surnames and places have them
+    run = CONSONANT_RUN.search(word)
+    if run and (len(run.group()) >= JUNK_CONSONANT_RUN or variety <= 0.6):
+        return True
+    vowels = sum(c in VOWELS for c in word)
+    if vowels == 0:
+        # Keep abbreviations and acronyms like "Blvd" or "HQTRS"
+        return len(word) > 5 or (len(word) == 5 and not word.isupper())
+    if len(word) >= 10 and vowels / len(word) < 0.15:
+        return True
+
+    if dictionary is not None and word.lower() not in dictionary:
+        # Unknown words survive unless they are also unusually vowel-poor or vowel-heavy
+        ratio = vowels / len(word)
+        return ratio < 0.25 or ratio > 0.7
+    return False
+
+
+def load_dictionary(path):
+    """Load a word list (one word per line) as a set of lowercase words"""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return {line.strip().lower() for line in f if line.strip()}
+
+
+def normalize_text(text, dictionary=None):
+    """
+    Normalize OCR text for indexing
+
+    Args:
+        text (str): Raw OCR text
+        dictionary (set): Optional set of lowercase known words (see load_dictionary)
+
+    Returns:
+        str: Normalized text
+    """
+    verdicts = {}  # OCR text repeats itself a lot; judge each distinct word once
+
+    def drop_junk(match):
+        word = match.group()
+        junk = verdicts.get(word)
+        if junk is None:
+            junk = verdicts[word] = is_junk(word, dictionary)
+        return "" if junk else word
+
+    text = HYPHEN_BREAK.sub(r"\1", text)
+    text = CANDIDATE_WORD.sub(drop_junk, text)
+    text = SYMBOL_TOKEN.sub("", text)
+    text = EDGE_SPACES.sub("", SPACES.sub(" ", text))
+    return BLANK_LINES.sub("\n\n", text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how OCR text is normalized before indexing")
+    parser.add_argument("file", nargs="?", help="OCR text file")
+    parser.add_argument("--dictionary", help="Word list used to judge unknown words")
+    parser.add_argument("--dropped", action="store_true", help="List the dropped words instead")
+    parser.add_argument("--check", action="store_true", help="Check the rules against the built-in examples "
+                                                             "(no file needed)")
+
+    args = parser.parse_args()
+    dictionary = load_dictionary(args.dictionary) if args.dictionary else None
+
+    if args.check:
+        wrong = [word for word in KEEP_EXAMPLES if is_junk(word)] + \
+                [word for word in DROP_EXAMPLES if not is_junk(word)]
+        for word in wrong:
+            print(f"Misjudged: {word}")
+        return 1 if wrong else 0
+    if not args.file:
+        parser.error("an OCR text file is required")
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    if args.dropped:
+        for word in WORD_PIECE.findall(HYPHEN_BREAK.sub(r"\1", text)):
+            if is_junk(word, dictionary):
+                print(word)
+    else:
+        print(normalize_text(text, dictionary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
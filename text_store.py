@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - OCR Text Store Module
+Plain or compressed storage of OCR text with random access by page
+
+Compressed documents are kept as "<name>.ocrz" files:
+
+    header      12 bytes   magic, version, codec, frame count
+    frame index FRAME records (page number, offset, compressed and raw length)
+    frames      one compressed frame per "--- Page N ---" section
+
+Any single page can be read by decompressing just its frame. Frames use zstd
+when the zstandard package is installed and zlib otherwise; the codec is
+recorded per file, so stores can mix both.
+
+The store reads plain .txt and compressed .ocrz documents side by side
+(preferring .ocrz), so consumers never need to know which layout is on disk.
+
+Migrate an existing ocr_text directory with:
+    python text_store.py migrate --source ocr_text
+"""
+
+import os
+import re
+import sys
+import struct
+import zlib
+import argparse
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GDHT"
+VERSION = 1
+HEADER = struct.Struct("<4sHBxI")
+FRAME = struct.Struct("<IQII")
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+PLAIN_EXTENSION = ".txt"
+COMPRESSED_EXTENSION = ".ocrz"
+
+# Matches the page markers written by PDFOCRProcessor.extract_text()
+PAGE_MARKER = re.compile(r"\n--- Page (\d+) ---\n")
+
+
+def split_pages(text):
+    """
+    Split OCR text into per-page sections
+
+    Each section keeps its own "--- Page N ---" marker, so joining the sections
+    gives back the original text exactly. Text before the first marker is
+    returned as page 0.
+
+    Args:
+        text (str): Full OCR text
+
+    Returns:
+        list: (page_number, section_text) tuples in document order
+    """
+    markers = list(PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(0, text)] if text else []
+
+    sections = []
+    if markers[0].start() > 0:
+        sections.append((0, text[:markers[0].start()]))
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        sections.append((int(marker.group(1)), text[marker.start():end]))
+    return sections
+
+
+def default_codec():
+    """Return the best codec available on this machine"""
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def _compressor(codec, level=None):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=level or 9).compress
+    return lambda data: zlib.compress(data, level or 6)
+
+
+def _decompressor(codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("This document is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress
+    return zlib.decompress
+
+
+def write_compressed(path, text, codec=None, level=None):
+    """
+    Write OCR text as a compressed, page-framed document
+
+    Args:
+        path (str): Output .ocrz path
+        text (str): Full OCR text
+        codec (str): "zstd" or "zlib" (default: best available)
+        level (int): Compression level (codec default if None)
+    """
+    codec_id = CODEC_NAMES[codec or default_codec()]
+    compress = _compressor(codec_id, level)
+
+    index = []
+    frames = []
+    offset = 0
+    for page_num, section in split_pages(text):
+        raw = section.encode("utf-8")
+        frame = compress(raw)
+        index.append(FRAME.pack(page_num, offset, len(frame), len(raw)))
+        frames.append(frame)
+        offset += len(frame)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, codec_id, len(frames)))
+        f.write(b"".join(index))
+        for frame in frames:
+            f.write(frame)
+    os.replace(temp_path, path)
+
+
+class CompressedDocument:
+    def __init__(self, path):
+        """
+        Open a compressed document, reading only its header and frame index
+
+        Args:
+            path (str): Path to a .ocrz file
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        magic, version, self.codec, count = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(f"Not a compressed OCR text file: {path}")
+        if version != VERSION:
+            self.file.close()
+            raise ValueError(f"Unsupported OCR text file version {version}: {path}")
+
+        index = self.file.read(FRAME.size * count)
+        self.frames = [FRAME.unpack_from(index, i * FRAME.size) for i in range(count)]
+        self.data_start = HEADER.size + FRAME.size * count
+        self._decompress = _decompressor(self.codec)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def page_numbers(self):
+        """Return the page numbers stored in this document"""
+        return [frame[0] for frame in self.frames]
+
+    def _read_frame(self, frame):
+        _, offset, compressed_length, _ = frame
+        self.file.seek(self.data_start + offset)
+        return self._decompress(self.file.read(compressed_length)).decode("utf-8")
+
+    def read_page(self, page_num):
+        """Return one page section (with its marker), or None if the page is missing"""
+        for frame in self.frames:
+            if frame[0] == page_num:
+                return self._read_frame(frame)
+        return None
+
+    def read(self):
+        """Return the full document text"""
+        return "".join(self._read_frame(frame) for frame in self.frames)
+
+
+class TextStore:
+    def __init__(self, directory="ocr_text", compress=False, codec=None):
+        """
+        Store of OCR text documents, keyed by PDF name without extension
+
+        Args:
+            directory (str): Directory holding .txt and/or .ocrz documents
+            compress (bool): Write new documents compressed
+            codec (str): "zstd" or "zlib" for new compressed documents (default: best available)
+        """
+        self.directory = directory
+        self.compress = compress
+        self.codec = codec or default_codec()
+
+    def plain_path(self, name):
+        return os.path.join(self.directory, name + PLAIN_EXTENSION)
+
+    def compressed_path(self, name):
+        return os.path.join(self.directory, name + COMPRESSED_EXTENSION)
+
+    def path(self, name):
+        """Return the on-disk path of a document (compressed preferred), or None"""
+        compressed = self.compressed_path(name)
+        if os.path.exists(compressed):
+            return compressed
+        plain = self.plain_path(name)
+        if os.path.exists(plain):
+            return plain
+        return None
+
+    def exists(self, name):
+        return self.path(name) is not None
+
+    def names(self):
+        """Return the names of all documents in the store, sorted"""
+        names = set()
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                stem, ext = os.path.splitext(file)
+                if ext.lower() in (PLAIN_EXTENSION, COMPRESSED_EXTENSION):
+                    names.add(os.path.relpath(os.path.join(root, stem), self.directory))
+        return sorted(names)
+
+    def read(self, name):
+        """Return the full text of a document"""
+        path = self.path(name)
+        if path is None:
+            raise FileNotFoundError(f"No OCR text for {name} in {self.directory}")
+        if path.endswith(COMPRESSED_EXTENSION):
+            with CompressedDocument(path) as doc:
+                return doc.read()
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def read_page(self, name, page_num):
+        """
+        Return the text of one page (with its "--- Page N ---" marker)
+
+        Compressed documents decompress only that page's frame; plain documents
+        have to be read and split in full.
+
+        Args:
+            name (str): Document name
+            page_num (int): Page number
+
+        Returns:
+            str: Page section, or None if the document has no such page
+        """
+        path = self.path(name)
+        if path is None:
+            raise FileNotFoundError(f"No OCR text for {name} in {self.directory}")
+        if path.endswith(COMPRESSED_EXTENSION):
+            with CompressedDocument(path) as doc:
+                return doc.read_page(page_num)
+        for number, section in split_pages(self.read(name)):
+            if number == page_num:
+                return section
+        return None
+
+    def page_numbers(self, name):
+        """Return the page numbers of a document"""
+        path = self.path(name)
+        if path is not None and path.endswith(COMPRESSED_EXTENSION):
+            with CompressedDocument(path) as doc:
+                return doc.page_numbers()
+        return [number for number, _ in split_pages(self.read(name))]
+
+    def write(self, name, text):
+        """Save a document in the store's configured format, replacing any other copy"""
+        os.makedirs(os.path.dirname(self.plain_path(name)), exist_ok=True)
+        if self.compress:
+            write_compressed(self.compressed_path(name), text, self.codec)
+            stale = self.plain_path(name)
+        else:
+            with open(self.plain_path(name), "w", encoding="utf-8") as f:
+                f.write(text)
+            stale = self.compressed_path(name)
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def delete(self, name):
+        """Remove every copy of a document"""
+        for path in (self.plain_path(name), self.compressed_path(name)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def migrate(source, dest=None, codec=None, keep_plain=False):
+    """
+    Convert a directory of plain .txt OCR files to compressed documents
+
+    Args:
+        source (str): Directory with .txt files
+        dest (str): Output directory (default: same as source)
+        codec (str): "zstd" or "zlib" (default: best available)
+        keep_plain (bool): Keep the .txt files after converting them
+
+    Returns:
+        tuple: (documents converted, plain bytes, compressed bytes)
+    """
+    dest = dest or source
+    source_store = TextStore(source)
+    dest_store = TextStore(dest, compress=True, codec=codec)
+
+    converted = plain_bytes = compressed_bytes = 0
+    for name in source_store.names():
+        plain_path = source_store.plain_path(name)
+        if not os.path.exists(plain_path):
+            continue
+        with open(plain_path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        compressed_path = dest_store.compressed_path(name)
+        os.makedirs(os.path.dirname(compressed_path), exist_ok=True)
+        write_compressed(compressed_path, text, dest_store.codec)
+
+        plain_bytes += os.path.getsize(plain_path)
+        compressed_bytes += os.path.getsize(compressed_path)
+        converted += 1
+        if not keep_plain:
+            os.remove(plain_path)
+
+    return converted, plain_bytes, compressed_bytes
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Manage the OCR text store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    mig = subparsers.add_parser("migrate", help="Compress plain .txt OCR files")
+    mig.add_argument("--source", default="ocr_text", help="Directory with .txt files")
+    mig.add_argument("--dest", default=None, help="Output directory (default: same as --source)")
+    mig.add_argument("--codec", choices=sorted(CODEC_NAMES), default=None,
+                     help=f"Compression codec (default: {default_codec()})")
+    mig.add_argument("--keep-plain", action="store_true", help="Keep the .txt files after converting")
+
+    page = subparsers.add_parser("page", help="Print one page of a document")
+    page.add_argument("name", help="Document name (PDF filename without extension)")
+    page.add_argument("page", type=int, help="Page number")
+    page.add_argument("--dir", default="ocr_text", help="Text store directory")
+
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        if not os.path.isdir(args.source):
+            print(f"Error: Directory not found: {args.source}")
+            return 1
+        converted, plain_bytes, compressed_bytes = migrate(args.source, args.dest, args.codec, args.keep_plain)
+        ratio = compressed_bytes / plain_bytes if plain_bytes else 0
+        logger.info(f"Compressed {converted} documents: {plain_bytes:,} -> {compressed_bytes:,} bytes "
+                    f"({ratio:.0%} of original)")
+        return 0
+
+    text = TextStore(args.dir).read_page(args.name, args.page)
+    if text is None:
+        print(f"Page {args.page} not found in {args.name}")
+        return 1
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
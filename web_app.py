@@ -6,12 +6,14 @@ Simplified version for deployment to cloud platforms
 
 import os
 import sys
-from flask import Flask, render_template, request, redirect, url_for, send_file
-from whoosh.index import open_dir, exists_in
-from whoosh.qparser import QueryParser, MultifieldParser
-from whoosh.highlight import ContextFragmenter
+from flask import Flask, render_template, request, redirect, url_for, jsonify
+from search_core import SearchCore
+from result_cache import make_cache
+from search_api import create_api
+from pdf_delivery import PDFDelivery, ContentHashes
+from page_preview import PagePreviews, PageCache, create_page_routes
+from pdf_catalog import PDFCatalog, CATALOG_FILENAME
 import logging
-import json
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,110 +22,80 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__, static_folder='static')
 
-# Load PDF path mappings
-PDF_PATHS = {}
-try:
-    if os.path.exists('pdf_mappings.json'):
-        with open('pdf_mappings.json', 'r') as f:
-            PDF_PATHS = json.load(f)
-        logger.info(f"Loaded {len(PDF_PATHS)} PDF mappings")
-    else:
-        logger.warning("pdf_mappings.json not found. PDF viewing will be disabled.")
-except Exception as e:
-    logger.error(f"Error loading PDF mappings: {e}")
+# PDF lookup table written by prepare_for_deployment.py (see pdf_catalog.py)
+PDF_CATALOG = os.path.join(app.root_path, os.environ.get("PDF_CATALOG", CATALOG_FILENAME))
+
+# Result cache size in MB (0 disables it), and an optional SQLite file to share it between workers
+CACHE_MB = float(os.environ.get("SEARCH_CACHE_MB", 64))
+CACHE_FILE = os.environ.get("SEARCH_CACHE_FILE")
+
+# PDF delivery (see pdf_delivery.py): browser/proxy cache lifetime in seconds, content
+# hashes written by prepare_for_deployment.py, and an optional front proxy offload
+# ("x-accel-redirect" for nginx, serving PDF_ACCEL_ROOT at the internal PDF_ACCEL_PREFIX)
+pdf_delivery = PDFDelivery(ContentHashes(os.path.join(app.root_path, os.environ.get("PDF_HASH_FILE", "pdf_hashes.json"))),
+                           max_age=int(os.environ.get("PDF_MAX_AGE", 86400)),
+                           offload=os.environ.get("PDF_OFFLOAD") or None,
+                           accel_prefix=os.environ.get("PDF_ACCEL_PREFIX", "/internal-pdfs/"),
+                           accel_root=os.environ.get("PDF_ACCEL_ROOT", "pdfs"))
+
+# Single-page previews (see page_preview.py), cached on disk up to PAGE_CACHE_MB
+page_previews = PagePreviews(pdf_delivery.hashes,
+                             PageCache(os.path.join(app.root_path, os.environ.get("PAGE_CACHE_DIR", "page_cache")),
+                                       float(os.environ.get("PAGE_CACHE_MB", 256))))
+
+# Queries run before serving (see gunicorn.conf.py): one per line in WARMUP_QUERIES_FILE
+# ("#" starts a comment), or these, which cover plain, phrase, fuzzy, wildcard and sorted searches
+WARMUP_QUERIES_FILE = os.path.join(app.root_path, os.environ.get("WARMUP_QUERIES_FILE", "warmup_queries.txt"))
+DEFAULT_WARMUP_QUERIES = ["kennedy", '"attorney general"', "kennedy~1", "investigat*", "report sort:date"]
 
-class PDFSearchApp:
-    def __init__(self, index_dir="search_index"):
+class PDFSearchApp(SearchCore):
+    def __init__(self, index_dir="search_index", text_dir="ocr_text"):
         """Initialize the search application"""
-        self.index_dir = index_dir
-        
-        try:
-            # Check if the directory exists
-            if not os.path.exists(index_dir):
-                logger.error(f"Search index directory not found: {index_dir}")
-                logger.info(f"Current working directory: {os.getcwd()}")
-                logger.info(f"Directory contents: {os.listdir('.')}")
-                self.ix = None
-                return
-            
-            # Check if it contains a valid Whoosh index
-            if not exists_in(index_dir):
-                logger.error(f"No valid Whoosh index found in {index_dir}")
-                self.ix = None
-                return
-                
-            # Open the search index
-            self.ix = open_dir(index_dir)
-            logger.info(f"Search index opened successfully from {index_dir}")
-            
-        except Exception as e:
-            logger.error(f"Failed to open search index: {e}")
-            self.ix = None
+        # Check if the directory exists
+        if not os.path.exists(index_dir):
+            logger.error(f"Search index directory not found: {index_dir}")
+            logger.info(f"Current working directory: {os.getcwd()}")
+            logger.info(f"Directory contents: {os.listdir('.')}")
+        super().__init__(index_dir, text_dir, cache=make_cache(CACHE_MB, CACHE_FILE))
+        self.catalog = PDFCatalog(PDF_CATALOG)
+        logger.info(f"Loaded PDF catalog of {len(self.catalog)} PDFs")
     
-    def search(self, query_text, page=1, per_page=10):
-        """Search the index for documents matching the query"""
-        if not self.ix:
-            logger.error("Search index not available")
-            return {"query": query_text, "total": 0, "results": [], "page": page, "pages": 0}
-        
-        try:
-            # Calculate offset for pagination
-            start_offset = (page - 1) * per_page
-            
-            with self.ix.searcher() as searcher:
-                # Create a parser that searches both title and content
-                parser = MultifieldParser(["title", "content"], self.ix.schema)
-                query = parser.parse(query_text)
-                
-                # Create a context fragmenter for better highlighting
-                fragmenter = ContextFragmenter(maxchars=300, surround=50)
-                
-                # Execute the search
-                results = searcher.search_page(query, page, pagelen=per_page)
-                results.fragmenter = fragmenter
-                
-                # Format results
-                formatted_results = []
-                for hit in results:
-                    # Create highlighted snippets from the content field
-                    snippets = hit.highlights("content", top=3) or "No preview available"
-                    
-                    # Find the PDF file
-                    pdf_path = hit["path"]
-                    title = hit["title"]
-                    filename = hit["filename"]
-                    
-                    # Check if this file is available in the PDF mappings
-                    has_pdf = filename in PDF_PATHS
-                    
-                    formatted_results.append({
-                        "title": title,
-                        "path": pdf_path,
-                        "filename": filename,
-                        "snippets": snippets,
-                        "score": hit.score,
-                        "has_pdf": has_pdf
-                    })
-                
-                # Return search results and pagination info
-                return {
-                    "query": query_text,
-                    "total": len(results),
-                    "total_docs": results.total,
-                    "results": formatted_results,
-                    "page": page,
-                    "pages": results.pagecount,
-                    "has_previous": results.pagenum > 1,
-                    "has_next": results.pagenum < results.pagecount
-                }
-                
-        except Exception as e:
-            logger.error(f"Search error: {e}")
-            return {"query": query_text, "total": 0, "results": [], "page": page, "pages": 0}
+    def pdf_catalog(self):
+        """Return the PDF catalog, reopened first if a new index generation was published"""
+        index = self.ix
+        return self.catalog.for_generation(index.generation() if index else None)
+    
+    def close_handles(self):
+        """Close the index files and database connections, the PDF catalog's included"""
+        super().close_handles()
+        self.catalog.close_handles()
+    
+    def format_hit(self, hit):
+        """Add whether the PDF can be viewed, and its document ID, to each result"""
+        result = super().format_hit(hit)
+        # Check if this file is available in the PDF catalog
+        result["pdf_id"] = self.pdf_catalog().doc_id_for(result["filename"], result["path"])
+        result["has_pdf"] = result["pdf_id"] is not None
+        return result
 
 # Initialize the search app
 search_app = PDFSearchApp()
 
+def warmup_queries():
+    """Return the warm-up queries"""
+    try:
+        with open(WARMUP_QUERIES_FILE, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    except FileNotFoundError:
+        return DEFAULT_WARMUP_QUERIES
+
+def warm_up():
+    """Run the warm-up queries in this process, so its first requests don't wait for the index"""
+    queries = warmup_queries()
+    seconds = search_app.warm_up(queries)
+    logger.info(f"Warmed up with {len(queries)} queries in {seconds:.2f}s (pid {os.getpid()})")
+    return seconds
+
 @app.route('/')
 def home():
     """Home page with search form"""
@@ -138,8 +110,8 @@ def search():
     if not query:
         return redirect(url_for('home'))
     
-    # Perform the search
-    results = search_app.search(query, page=page)
+    # Perform the search; snippets are fetched by the page afterwards (see /snippets)
+    results = search_app.search(query, page=page, snippets=False)
     
     return render_template(
         'results.html',
@@ -152,12 +124,37 @@ def search():
         has_next=results["has_next"]
     )
 
+@app.route('/snippets')
+def snippets():
+    """Snippets of the results in view, fetched by the results page as hit=<position>:<filename>"""
+    query = request.args.get('q', '')
+    page = int(request.args.get('page', 1))
+    hits = []
+    for value in request.args.getlist('hit'):
+        position, _, filename = value.partition(':')
+        if position.isdigit():
+            hits.append((int(position), filename))
+    return jsonify(search_app.snippets(query, hits, page=page))
+
+# JSON search API with cursor pagination (see search_api.py)
+app.register_blueprint(create_api(lambda: search_app))
+
+# Single pages of PDFs, extracted or rendered (see page_preview.py)
+app.register_blueprint(create_page_routes(lambda: page_previews, lambda filename: search_app.pdf_catalog().find_path(filename),
+                                          lambda: pdf_delivery.max_age))
+
+@app.context_processor
+def preview_links():
+    """Link matching pages to their previews when this server can render them"""
+    return {"page_previews": page_previews.available()}
+
 @app.route('/view/<path:filename>')
 def view_pdf(filename):
     """View a PDF file if available"""
-    if filename in PDF_PATHS:
+    pdf_path = search_app.pdf_catalog().find_path(filename)
+    if pdf_path:
         try:
-            return send_file(PDF_PATHS[filename], download_name=filename)
+            return pdf_delivery.send(pdf_path, os.path.basename(filename))
         except Exception as e:
             logger.error(f"Error sending PDF file: {e}")
             return f"Error: Could not retrieve the PDF file. {str(e)}", 500
@@ -180,8 +177,11 @@ def status():
         "search_index_items": os.listdir('search_index') if os.path.exists('search_index') else [],
         "templates_exist": os.path.exists('templates'),
         "template_files": os.listdir('templates') if os.path.exists('templates') else [],
-        "pdf_mappings_exist": os.path.exists('pdf_mappings.json'),
-        "index_is_valid": search_app.ix is not None
+        "pdf_catalog_exists": os.path.exists(PDF_CATALOG),
+        "pdf_count": len(search_app.catalog),
+        "index_is_valid": search_app.ix is not None,
+        "result_cache": search_app.cache.stats() if search_app.cache else None,
+        "page_cache": page_previews.cache.stats() if page_previews.available() else None
     }
     
     return render_template('status.html', status=status_info)
@@ -194,4 +194,5 @@ def page_not_found(e):
 if __name__ == "__main__":
     # Use PORT environment variable for cloud platforms
     port = int(os.environ.get("PORT", 5000))
+    warm_up()
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
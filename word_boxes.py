@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+GovDocHarvester - Word Boxes Module
+Compact binary sidecar of OCR word positions and confidences
+
+Each OCR'd document can have a "<name>.boxes" file next to its text file:
+
+    header      16 bytes   magic, version, page count, word count
+    page table  PAGE_DTYPE records (size and DPI of each OCR'd page image)
+    word table  WORD_DTYPE records (fixed width, one per recognized word)
+    strings     UTF-8 word text, newline separated, referenced by offset
+
+Coordinates are pixels in the page image Tesseract saw (after deskew), so divide
+by the page's width/height to get page-relative positions. The file is opened
+with numpy.memmap, so highlighting a hit only touches the pages it needs.
+"""
+
+import os
+import re
+import struct
+import numpy as np
+
+MAGIC = b"GDHW"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+
+PAGE_DTYPE = np.dtype([
+    ("page", "<u4"),
+    ("width", "<u2"),
+    ("height", "<u2"),
+    ("dpi", "<u2"),
+    ("reserved", "<u2"),
+    ("first_word", "<u4"),
+    ("word_count", "<u4"),
+])
+
+WORD_DTYPE = np.dtype([
+    ("page", "<u2"),
+    ("left", "<u2"),
+    ("top", "<u2"),
+    ("width", "<u2"),
+    ("height", "<u2"),
+    ("line", "<u2"),
+    ("conf", "i1"),
+    ("reserved", "u1"),
+    ("text_offset", "<u4"),
+    ("text_length", "<u2"),
+])
+
+SIDECAR_EXTENSION = ".boxes"
+
+
+def sidecar_path(text_path):
+    """Return the word box sidecar path for an OCR text file"""
+    return os.path.splitext(text_path)[0] + SIDECAR_EXTENSION
+
+
+def page_record(page_num, size, dpi, data):
+    """
+    Compact pytesseract.image_to_data() output for one page
+
+    Only recognized words are kept, so the verbose per-block/per-line rows are
+    dropped as soon as the page has been OCR'd.
+
+    Args:
+        page_num (int): 1-based page number
+        size (tuple): (width, height) of the OCR'd image in pixels
+        dpi (int): Resolution the page was rendered at
+        data (dict): Output of image_to_data(output_type=Output.DICT)
+
+    Returns:
+        dict: Page dimensions plus numpy arrays of word boxes and a list of words
+    """
+    keep = [i for i, word in enumerate(data["text"]) if word and word.strip()]
+
+    line_ids = {}
+    lines = []
+    for i in keep:
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.append(line_ids.setdefault(key, len(line_ids)))
+
+    def column(name):
+        return np.clip(np.array([int(data[name][i]) for i in keep], dtype=np.int64), 0, 0xFFFF)
+
+    return {
+        "page": page_num,
+        "width": min(int(size[0]), 0xFFFF),
+        "height": min(int(size[1]), 0xFFFF),
+        "dpi": int(dpi),
+        "left": column("left"),
+        "top": column("top"),
+        "box_width": column("width"),
+        "box_height": column("height"),
+        "line": np.clip(np.array(lines, dtype=np.int64), 0, 0xFFFF),
+        "conf": np.clip(np.array([float(data["conf"][i]) for i in keep]), -1, 100).astype(np.int8),
+        "words": [data["text"][i].strip() for i in keep],
+    }
+
+
+def write_word_boxes(path, pages):
+    """
+    Write a word box sidecar file
+
+    Args:
+        path (str): Output path (usually sidecar_path(text_path))
+        pages (list): page_record() results in page order
+    """
+    word_count = sum(len(p["words"]) for p in pages)
+    page_table = np.zeros(len(pages), dtype=PAGE_DTYPE)
+    word_table = np.zeros(word_count, dtype=WORD_DTYPE)
+    strings = bytearray()
+
+    position = 0
+    for i, page in enumerate(pages):
+        count = len(page["words"])
+        page_table[i] = (page["page"], page["width"], page["height"], page["dpi"], 0, position, count)
+
+        records = word_table[position:position + count]
+        records["page"] = min(page["page"], 0xFFFF)
+        records["left"] = page["left"]
+        records["top"] = page["top"]
+        records["width"] = page["box_width"]
+        records["height"] = page["box_height"]
+        records["line"] = page["line"]
+        records["conf"] = page["conf"]
+
+        encoded = [word.encode("utf-8")[:0xFFFF] for word in page["words"]]
+        lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+        starts = np.cumsum(lengths + 1) - (lengths + 1)
+        records["text_offset"] = len(strings) + starts
+        records["text_length"] = lengths
+        strings += b"".join(e + b"\n" for e in encoded)
+        position += count
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(pages), word_count))
+        f.write(page_table.tobytes())
+        f.write(word_table.tobytes())
+        f.write(bytes(strings))
+    os.replace(temp_path, path)
+
+
+class WordBoxes:
+    def __init__(self, path):
+        """
+        Memory-map a word box sidecar file
+
+        Args:
+            path (str): Path to a .boxes file
+        """
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic, version, _, page_count, word_count = HEADER.unpack(bytes(self._data[:HEADER.size]))
+        if magic != MAGIC:
+            raise ValueError(f"Not a word box file: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported word box file version {version}: {path}")
+
+        start = HEADER.size
+        end = start + page_count * PAGE_DTYPE.itemsize
+        self.pages = self._data[start:end].view(PAGE_DTYPE)
+        start, end = end, end + word_count * WORD_DTYPE.itemsize
+        self.words = self._data[start:end].view(WORD_DTYPE)
+        self._strings = self._data[end:]
+
+    def __len__(self):
+        return len(self.words)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the memory map"""
+        self.pages = self.words = self._strings = self._data = None
+
+    def text(self, index):
+        """Return the text of word number index"""
+        record = self.words[index]
+        start = int(record["text_offset"])
+        return bytes(self._strings[start:start + int(record["text_length"])]).decode("utf-8", errors="replace")
+
+    def page_info(self, page_num):
+        """Return the page table record for a page number, or None"""
+        matches = np.nonzero(self.pages["page"] == page_num)[0]
+        return self.pages[matches[0]] if len(matches) else None
+
+    def page_words(self, page_num, min_confidence=0):
+        """
+        Return the word records of one page
+
+        Args:
+            page_num (int): 1-based page number
+            min_confidence (int): Drop words Tesseract was less sure of than this
+
+        Returns:
+            numpy.ndarray: WORD_DTYPE records
+        """
+        info = self.page_info(page_num)
+        if info is None:
+            return self.words[:0]
+        first = int(info["first_word"])
+        words = self.words[first:first + int(info["word_count"])]
+        if min_confidence:
+            words = words[words["conf"] >= min_confidence]
+        return words
+
+    def confident(self, min_confidence):
+        """Return indices of words with at least the given confidence"""
+        return np.nonzero(self.words["conf"] >= min_confidence)[0]
+
+    def find(self, term, min_confidence=0, page_num=None):
+        """
+        Find the boxes of words matching a term (case-insensitive, whole word)
+
+        The string pool is scanned in place with one regular expression (only
+        the page's part of it when page_num is given: each page's words, and
+        their text, are stored together) and the byte offsets are mapped back
+        to word records with a binary search.
+
+        Args:
+            term (str): Word to look for
+            min_confidence (int): Skip low-confidence words
+            page_num (int): Restrict to one page
+
+        Returns:
+            list: Dicts with page, left, top, width, height, conf and text
+        """
+        first, words = 0, self.words
+        if page_num is not None:
+            info = self.page_info(page_num)
+            if info is None:
+                return []
+            first = int(info["first_word"])
+            words = self.words[first:first + int(info["word_count"])]
+        if not len(words):
+            return []
+
+        start = int(words[0]["text_offset"])
+        end = int(words[-1]["text_offset"]) + int(words[-1]["text_length"]) + 1
+        pattern = re.compile(rb"(?:^|\n)(" + re.escape(term.encode("utf-8")) + rb")(?=\n)", re.IGNORECASE)
+        offsets = np.array([m.start(1) for m in pattern.finditer(memoryview(self._strings[start:end]))],
+                           dtype=np.int64) + start
+        if not len(offsets):
+            return []
+
+        indices = np.searchsorted(words["text_offset"], offsets, side="right") - 1
+        records = words[indices]
+        keep = records["conf"] >= min_confidence
+
+        return [
+            {
+                "page": int(records[i]["page"]),
+                "left": int(records[i]["left"]),
+                "top": int(records[i]["top"]),
+                "width": int(records[i]["width"]),
+                "height": int(records[i]["height"]),
+                "conf": int(records[i]["conf"]),
+                "text": self.text(first + int(indices[i])),
+            }
+            for i in np.nonzero(keep)[0]
+        ]
+
+
+def read_page_records(path):
+    """
+    Load a sidecar back into page_record() form
+
+    Used to merge sidecars that were written for separate page ranges of the
+    same document.
+
+    Args:
+        path (str): Path to a .boxes file
+
+    Returns:
+        list: page_record()-style dicts in file order
+    """
+    with WordBoxes(path) as boxes:
+        pages = []
+        for info in boxes.pages:
+            first = int(info["first_word"])
+            words = boxes.words[first:first + int(info["word_count"])]
+            pages.append({
+                "page": int(info["page"]),
+                "width": int(info["width"]),
+                "height": int(info["height"]),
+                "dpi": int(info["dpi"]),
+                "left": np.array(words["left"]),
+                "top": np.array(words["top"]),
+                "box_width": np.array(words["width"]),
+                "box_height": np.array(words["height"]),
+                "line": np.array(words["line"]),
+                "conf": np.array(words["conf"]),
+                "words": [boxes.text(i) for i in range(first, first + len(words))],
+            })
+        return pages